@@ -0,0 +1,199 @@
+"""
+Axis filtering for the mapper: spike rejection, smoothing and hysteresis.
+
+A pedal or wheel sitting near a threshold reports noise around it, and a plain compare turns
+every crossing into a key press or release. Three stages keep that from reaching the game:
+
+  * Spike rejection. A single sample that jumps further than the axis' spike limit is held
+    back until the next sample (or SPIKE_CONFIRM seconds) shows whether the axis really went
+    there. A real move is then taken in one step, a glitch is dropped.
+  * One-Euro smoothing (Casiez et al.), an exponential low-pass whose cutoff rises with the
+    speed of the axis: heavy smoothing while it sits still, almost none while it moves fast.
+    With beta = 0 it is a plain EMA.
+  * HysteresisSwitch, a threshold with a band, so a value has to cross back past the far edge
+    of the band before the output flips again.
+
+AxisFilter keeps its per-axis state and settings in parallel arrays and handles every axis
+that moved in one pass. The event-driven loop only sees an axis when it moves, so a filtered
+value that hasn't caught up with a still axis is advanced from the timer service instead,
+like a PWM edge.
+"""
+import math
+from array import array
+
+SPIKE_CONFIRM = 0.02          # Seconds a suspicious jump waits for a second sample before it is believed
+SETTLE_INTERVAL = 0.004       # Seconds between filter steps while a still axis is being caught up with
+SETTLE_EPSILON = 0.002        # Filtered values closer than this to the raw value are snapped to it
+DERIVATE_CUTOFF = 10.0        # Hz, smoothing of the speed estimate that drives the One-Euro cutoff
+
+
+def _alpha(cutoff, dt):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class AxisFilter:
+    """ Filters a set of axes. `settings` maps an axis index to a dict with 'min_cutoff' (Hz),
+        'beta' and 'spike' (largest believable jump between two samples, 0 to disable).
+        Axes without settings are passed through unchanged. """
+    def __init__(self, num_axes, settings):
+        self.num_axes = num_axes
+        self.values = array('d', [0.0] * num_axes)     # Filtered output
+        self.enabled = 0                                # Bitmask of filtered axes
+        self.min_cutoff = array('d', [1.0] * num_axes)
+        self.beta = array('d', [0.0] * num_axes)
+        self.spike = array('d', [0.0] * num_axes)
+        for axis, setting in settings.items():
+            if axis < num_axes:
+                self.enabled |= 1 << axis
+                self.min_cutoff[axis] = setting['min_cutoff']
+                self.beta[axis] = setting.get('beta', 0.0)
+                self.spike[axis] = setting.get('spike', 0.0)
+        self._raw = array('d', [0.0] * num_axes)         # Latest accepted raw sample
+        self._speed = array('d', [0.0] * num_axes)       # Smoothed rate of change, units/s
+        self._last_time = array('d', [0.0] * num_axes)
+        self._pending = {}                               # axis -> (raw value, deadline) of an unconfirmed jump
+        self._settling = 0                               # Bitmask of axes still catching up with their raw value
+        self._next_settle = None
+        self.spikes_rejected = 0
+        self.started = False
+
+    def restart(self):
+        """ Forgets the filter state, the next update() takes the raw values as they are. """
+        self.started = False
+
+    def reset(self, raw, now):
+        """ Takes `raw` as the settled state of every axis, e.g. on start-up or after a reconnect. """
+        for axis in range(self.num_axes):
+            self.values[axis] = self._raw[axis] = raw[axis]
+            self._speed[axis] = 0.0
+            self._last_time[axis] = now
+        self._pending.clear()
+        self._settling = 0
+        self._next_settle = None
+        self.started = True
+
+    def update(self, raw, moved, now):
+        """ Feeds the raw values of the axes in bitmask `moved`. Returns the bitmask of axes
+            whose filtered value changed. """
+        if not self.started:
+            self.reset(raw, now)
+            return moved
+        changed = moved & ~self.enabled
+        for axis in _bits(changed):
+            self.values[axis] = raw[axis]
+        for axis in _bits(moved & self.enabled):
+            value = raw[axis]
+            pending = self._pending.pop(axis, None)
+            limit = self.spike[axis]
+            if pending is not None:
+                if abs(value - pending[0]) <= limit:
+                    # Confirmed: the axis really moved, take it without smoothing lag
+                    self._jump(axis, value, now)
+                    changed |= 1 << axis
+                    continue
+                self.spikes_rejected += 1
+            elif limit and abs(value - self.values[axis]) > limit:
+                self._pending[axis] = (value, now + SPIKE_CONFIRM)
+                continue
+            if self._step(axis, value, now):
+                changed |= 1 << axis
+        return changed
+
+    def next_deadline(self):
+        """ Monotonic time the filter next needs service(), or None. """
+        deadline = self._next_settle
+        for _, pending_deadline in self._pending.values():
+            if deadline is None or pending_deadline < deadline:
+                deadline = pending_deadline
+        return deadline
+
+    def service(self, now):
+        """ Confirms jumps nothing contradicted and steps still axes toward their raw value.
+            Returns the bitmask of axes whose filtered value changed. """
+        changed = 0
+        for axis, (value, deadline) in list(self._pending.items()):
+            if now >= deadline:
+                del self._pending[axis]
+                self._jump(axis, value, now)
+                changed |= 1 << axis
+        if self._next_settle is not None and now >= self._next_settle:
+            for axis in _bits(self._settling):
+                if self._step(axis, self._raw[axis], now):
+                    changed |= 1 << axis
+            self._next_settle = now + SETTLE_INTERVAL if self._settling else None
+        return changed
+
+    def _jump(self, axis, value, now):
+        self.values[axis] = self._raw[axis] = value
+        self._speed[axis] = 0.0
+        self._last_time[axis] = now
+        self._settling &= ~(1 << axis)
+
+    def _step(self, axis, value, now):
+        """ One One-Euro step toward `value`. Returns True if the output changed. """
+        self._raw[axis] = value
+        dt = now - self._last_time[axis]
+        if dt <= 0.0:
+            dt = SETTLE_INTERVAL
+        self._last_time[axis] = now
+        previous = self.values[axis]
+        speed = (value - previous) / dt
+        self._speed[axis] += _alpha(DERIVATE_CUTOFF, dt) * (speed - self._speed[axis])
+        cutoff = self.min_cutoff[axis] + self.beta[axis] * abs(self._speed[axis])
+        filtered = previous + _alpha(cutoff, dt) * (value - previous)
+        bit = 1 << axis
+        if abs(value - filtered) < SETTLE_EPSILON:
+            filtered = value
+            self._settling &= ~bit
+        else:
+            self._settling |= bit
+            if self._next_settle is None:
+                self._next_settle = now + SETTLE_INTERVAL
+        self.values[axis] = filtered
+        return filtered != previous
+
+
+def _bits(mask):
+    while mask:
+        bit = mask & -mask
+        yield bit.bit_length() - 1
+        mask ^= bit
+
+
+class HysteresisSwitch:
+    """ A threshold with a dead band. With below=True the switch is on while the value is under
+        the threshold (inverted pedals). It turns on half a band past the threshold and off half
+        a band back on the other side.
+
+    observe() is fed the unfiltered values and counts the flips a plain compare would have
+    made. `saved` is how many more that is than the switch made itself, i.e. the injections
+    that filtering and hysteresis spared the game.
+    """
+    def __init__(self, threshold, band, below=False):
+        self.sign = -1.0 if below else 1.0
+        self.threshold = threshold * self.sign
+        self.half_band = band / 2
+        self.on = False
+        self.flips = 0
+        self.raw_flips = 0
+        self._raw_on = False
+
+    def update(self, value):
+        """ Returns the output for the (filtered) `value`. """
+        value *= self.sign
+        on = value > self.threshold - self.half_band if self.on else value > self.threshold + self.half_band
+        if on != self.on:
+            self.on = on
+            self.flips += 1
+        return on
+
+    def observe(self, raw):
+        raw_on = raw * self.sign > self.threshold
+        if raw_on != self._raw_on:
+            self._raw_on = raw_on
+            self.raw_flips += 1
+
+    @property
+    def saved(self):
+        return max(0, self.raw_flips - self.flips)
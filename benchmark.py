@@ -0,0 +1,373 @@
+"""
+Benchmarks for the mapping pipeline and the speedometer render loops.
+
+The mapper runs on a trace (synthetic, or recorded with --record) replayed flat out, with
+null keyboard/mouse sinks so nothing reaches the desktop. Its clock follows the trace's
+timestamps, so PWM edges, tap releases and the axis filter fire as often as they would
+live. The gauges are driven frame by frame on an offscreen Tk window. On a machine without
+a display run it under a virtual one:
+
+    xvfb-run python benchmark.py
+
+Results go to a JSON file so two runs can be compared:
+
+    python benchmark.py --trace session.ring --output before.json
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from input_trace import TraceWriter, open_trace
+from joystick_backend import JoystickBackend, ReplayBackend
+from latency import LatencyHistogram
+import foxhole_g920 as mapper_app
+import speedometer as speedometer_app
+
+SYNTHETIC_SECONDS = 60.0
+SYNTHETIC_RATE = 250    # Samples per second, about what the G920 reports while driving
+OUTPUT_FILE = 'benchmark_results.json'
+
+
+class NullKeyboard:
+    """ Counts injected key events instead of sending them. """
+    def __init__(self):
+        self.events = 0
+
+    def press(self, key):
+        self.events += 1
+
+    def release(self, key):
+        self.events += 1
+
+
+class NullMouse(NullKeyboard):
+    def __init__(self):
+        super().__init__()
+        self.position = (0, 0)
+
+
+class IdleBackend(JoystickBackend):
+    """ A device that never moves, so the speedometer app's poll thread has something to read. """
+    def get_axis(self, i):
+        return 0.0
+
+
+class NoReschedule:
+    """ Stands in for a Tk root inside update loops, so each benchmark frame runs exactly once
+        instead of queueing the next one with after(). """
+    def __init__(self, root):
+        self.root = root
+
+    def after(self, ms, func=None, *args):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.root, name)
+
+
+def write_synthetic_trace(path, seconds=SYNTHETIC_SECONDS, rate=SYNTHETIC_RATE):
+    """ A drive that exercises every handler: weaving steering, pumping throttle, brake and clutch
+        stabs, button presses including the chord, and D-pad flicks. """
+    num_axes = 6
+    with TraceWriter(path, num_axes, 16, 1, 'synthetic drive') as writer:
+        for n in range(int(seconds * rate)):
+            t = n / rate
+            steering = math.sin(t * 0.7) * 0.8 + math.sin(t * 5.3) * 0.1
+            accelerator = 1.0 - 2.0 * max(0.0, math.sin(t * 0.4))        # Inverted, 1.0 is released
+            brake = -1.0 if (t % 9.0) > 8.5 else 1.0
+            clutch = -1.0 if (t % 13.0) > 12.7 else 1.0
+            buttons = 0
+            if (t % 3.0) < 0.2:
+                buttons |= 1 << mapper_app.BUTTON_E
+            if (t % 7.0) < 0.3:
+                buttons |= (1 << mapper_app.BUTTON_LEFT) | (1 << mapper_app.BUTTON_RIGHT)
+            if (t % 11.0) < 0.1:
+                buttons |= 1 << mapper_app.BUTTON_TOGGLE_ACCEL_KEY
+            hat = (0, 1) if (t % 5.0) < 0.05 else (0, 0)
+            writer.write(t, buttons, hat, (steering, accelerator, brake, clutch, 0.0, 0.0))
+
+
+def pedal_travel(sample):
+    """ Accelerator travel (0.0 - 1.0) from a raw trace sample. """
+    return max(0.0, min((1.0 - sample[4 + mapper_app.ACCELERATOR_AXIS]) / 2.0, 1.0))
+
+
+def _frame_stats(frame_times, cpu_seconds, frames):
+    p50, p99 = frame_times.percentiles(0.5, 0.99)
+    return {
+        'frames': frames,
+        'cpu_per_frame_us': cpu_seconds / frames * 1000000 if frames else None,
+        'frame_time_p50_us': p50 * 1000000 if p50 is not None else None,
+        'frame_time_p99_us': p99 * 1000000 if p99 is not None else None,
+        'frame_time_max_us': frame_times.max * 1000000 if frames else None,
+    }
+
+
+def _allocations(run):
+    """ Runs `run` again under tracemalloc and reports what it allocated. """
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    collections_before = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'gc_gen0_collections': gc.get_stats()[0]['collections'] - collections_before,
+        'allocated_blocks_delta': sys.getallocatedblocks() - blocks_before,
+        'traced_peak_bytes': peak,
+        'traced_retained_bytes': current,
+    }
+
+
+class TraceClock:
+    """ Mapper clock for the benchmark: the trace time the replay has reached, however fast
+        it actually runs. """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def bench_mapper(trace_path, input_mode='event', steering_mode='threshold', throttle_mode='threshold'):
+    """ Feeds every sample of the trace through InputMapper's event or poll path, one burst per
+        sample, and times each burst from handling to injection. Between samples the loop also
+        wakes for every timer, PWM edge and filter step that falls due, as the live loop does. """
+    _, samples = open_trace(trace_path)
+    sample_times = [sample[0] for sample in samples]
+
+    def make_mapper():
+        keyboard, mouse = NullKeyboard(), NullMouse()
+        backend = ReplayBackend(trace_path, speed=0)
+        channel = mapper_app.UiStateChannel(target_speed=0.0, is_forward=True, brake=False)
+        clock = TraceClock()
+        mapper = mapper_app.InputMapper(channel, (1920, 1080), input_mode=input_mode,
+                                        steering_mode=steering_mode, throttle_mode=throttle_mode,
+                                        backend=backend, keyboard=keyboard, mouse=mouse, calibration_path=None,
+                                        clock=clock)
+        return mapper, backend, keyboard, mouse
+
+    def run(mapper, backend, frame_times=None):
+        """ Returns (events handled, samples that changed something, frames, timer wake-ups). """
+        clock = mapper.clock
+        events_processed = 0
+        changes = 0
+        frames = 0
+        wakeups = 0
+        if input_mode != 'poll':
+            backend.start_events()
+        for sample_time in sample_times:
+            deadline = mapper._next_deadline()
+            while deadline is not None and deadline < sample_time:
+                clock.now = deadline
+                start = time.perf_counter()
+                mapper._service_timers()
+                mapper.outputs.flush()
+                if frame_times is not None:
+                    frame_times.record(time.perf_counter() - start, 0.0)
+                wakeups += 1
+                deadline = mapper._next_deadline()
+            clock.now = sample_time
+            start = time.perf_counter()
+            if input_mode == 'poll':
+                backend.pump()
+                mapper._poll_once()
+                changes += 1
+            else:
+                events = backend.wait_events(0)
+                if events:
+                    mapper._handle_events(events)
+                    events_processed += len(events)
+                    changes += 1
+            mapper._service_timers()
+            mapper.outputs.flush()
+            if frame_times is not None:
+                frame_times.record(time.perf_counter() - start, 0.0)
+            frames += 1
+        return events_processed, changes, frames + wakeups, wakeups
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        mapper, backend, keyboard, mouse = make_mapper()
+        frame_times = LatencyHistogram('frame', window=float('inf'))
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        events_processed, changes, frames, wakeups = run(mapper, backend, frame_times)
+        cpu_seconds = time.process_time() - cpu_start
+        wall_seconds = time.perf_counter() - wall_start
+        timers_fired = mapper.timers.fired
+        pwm_edges = sum(channel.stats.edges for channel in mapper.pwm.channels)
+        mapper.pwm.stop(mapper.clock())
+        mapper.outputs.release_all()
+
+        again = make_mapper()
+        allocations = _allocations(lambda: run(again[0], again[1]))
+        again[0].pwm.stop(again[0].clock())
+
+    injected = keyboard.events + mouse.events
+    # The poll path has no events, every sample is read in full
+    processed = events_processed if input_mode != 'poll' else changes
+    result = {
+        'input_mode': input_mode,
+        'steering': steering_mode,
+        'throttle': throttle_mode,
+        'input_changes': changes,
+        'events': processed,
+        'wall_seconds': wall_seconds,
+        'events_per_second': processed / wall_seconds if wall_seconds else None,
+        'injected_events': injected,
+        'injections_per_input_change': injected / changes if changes else None,
+        'timer_wakeups': wakeups,
+        'timers_fired': timers_fired,
+        'pwm_edges': pwm_edges,
+    }
+    result.update(_frame_stats(frame_times, cpu_seconds, frames))
+    result.update(allocations)
+    return result
+
+
+class SimulatedClock:
+    """ Frame clock for the gauges, so each benchmark frame covers one UPDATE_MS of simulated
+        time however fast it actually runs. """
+    def __init__(self, frame_seconds):
+        self.now = time.monotonic()  # Continues from any frame the gauge already ran
+        self.frame_seconds = frame_seconds
+
+    def tick(self):
+        self.now += self.frame_seconds
+
+    def __call__(self):
+        return self.now
+
+
+def bench_gauges(trace_path, root, renderers=('canvas', 'sprite')):
+    """ Renders one speedometer frame per trace sample for both gauges, with each renderer. """
+    import tkinter as tk
+    _, samples = open_trace(trace_path)
+    targets = [pedal_travel(sample) for sample in samples]
+    results = {}
+
+    def bench_gauge(gauge, set_target):
+        gauge.root = NoReschedule(root)
+        gauge.clock = clock = SimulatedClock(mapper_app.UPDATE_MS / 1000)
+
+        def render(frame_times=None):
+            for travel in targets:
+                start = time.perf_counter()
+                clock.tick()
+                set_target(travel)
+                gauge.update_speed()
+                root.update_idletasks()
+                if frame_times is not None:
+                    frame_times.record(time.perf_counter() - start, 0.0)
+
+        result = _bench_frames(render, len(targets))
+        if hasattr(gauge.renderer, 'frames'):
+            result['sprite_cache_hits'] = gauge.renderer.hits
+            result['sprite_cache_misses'] = gauge.renderer.misses
+        return result
+
+    for renderer in renderers:
+        # The mapper's gauge, which gets its target from the UI channel
+        canvas = tk.Canvas(root, width=mapper_app.CANVAS_SIZE, height=mapper_app.CANVAS_SIZE)
+        canvas.pack()
+        label = tk.Label(root, text="0.0 m/s")
+        label.place(relx=0.5, rely=0.45, anchor='center')
+        gauge = mapper_app.ModernSpeedometer(root, canvas, label, renderer)
+        results[f'g920_speedometer/{renderer}'] = bench_gauge(
+            gauge, lambda travel: setattr(gauge, 'target_speed', travel * mapper_app.MAX_SPEED))
+        gauge.running = False
+        canvas.destroy()
+        label.destroy()
+
+        # speedometer.py's app, reading a trigger instead; its poll thread is stopped so the
+        # benchmark sets the trigger for every frame
+        app = speedometer_app.ModernSpeedometerApp(root, backend=IdleBackend(), gauge=renderer)
+        app.running = False
+        app.poll_thread.join()
+        app.running = True
+        results[f'speedometer_app/{renderer}'] = bench_gauge(app, lambda travel: setattr(app, 'trigger_value', travel))
+        app.running = False
+        app.canvas.destroy()
+        app.digital_label.destroy()
+    return results
+
+
+def _bench_frames(render, frames):
+    frame_times = LatencyHistogram('frame', window=float('inf'))
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    render(frame_times)
+    wall_seconds = time.perf_counter() - wall_start
+    result = {'wall_seconds': wall_seconds, 'frames_per_second': frames / wall_seconds if wall_seconds else None}
+    result.update(_frame_stats(frame_times, time.process_time() - cpu_start, frames))
+    result.update(_allocations(render))
+    return result
+
+
+def _offscreen_root():
+    import tkinter as tk
+    root = tk.Tk()
+    # Mapped (so Tk really draws) but placed off every monitor
+    root.geometry(f'{mapper_app.CANVAS_SIZE + 20}x{mapper_app.CANVAS_SIZE + 100}+-10000+-10000')
+    root.overrideredirect(True)
+    root.update()
+    return root
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the input mapper and the speedometer render loops")
+    parser.add_argument('--trace', help="trace or ring file to replay (default: a synthetic drive)")
+    parser.add_argument('--seconds', type=float, default=SYNTHETIC_SECONDS, help="length of the synthetic drive")
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f"JSON results file (default: {OUTPUT_FILE})")
+    parser.add_argument('--skip-gauges', action='store_true', help="only benchmark the mapper, no display needed")
+    args = parser.parse_args()
+
+    trace_path = args.trace
+    if not trace_path:
+        trace_path = os.path.join(tempfile.gettempdir(), 'foxhole_benchmark_synthetic.trace')
+        write_synthetic_trace(trace_path, args.seconds)
+    info, _ = open_trace(trace_path)
+
+    results = {
+        'trace': os.path.basename(trace_path),
+        'device': info.name,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'mapper': {},
+    }
+    for input_mode, steering, throttle in [('event', 'threshold', 'threshold'),
+                                           ('poll', 'threshold', 'threshold'),
+                                           ('event', 'pwm', 'pwm')]:
+        name = f"{input_mode}/{steering}/{throttle}"
+        print(f"Mapper {name}...")
+        results['mapper'][name] = bench_mapper(trace_path, input_mode, steering, throttle)
+
+    if not args.skip_gauges:
+        print("Speedometers...")
+        root = _offscreen_root()
+        results['gauges'] = bench_gauges(trace_path, root)
+        root.destroy()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    for name, result in results['mapper'].items():
+        print(f"  {name:<26} {result['events_per_second']:>10.0f} events/s  "
+              f"{result['cpu_per_frame_us']:>7.1f} us CPU/frame  "
+              f"{result['injections_per_input_change']:.3f} injections/change  "
+              f"{result['gc_gen0_collections']} gen0 GCs")
+    for name, result in results.get('gauges', {}).items():
+        print(f"  {name:<26} {result['frames_per_second']:>10.0f} frames/s  "
+              f"{result['cpu_per_frame_us']:>7.1f} us CPU/frame  "
+              f"{result['gc_gen0_collections']} gen0 GCs")
+    print(f"Results written to {args.output}")
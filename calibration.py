@@ -0,0 +1,175 @@
+"""
+Axis calibration from a short guided session.
+
+Instead of confirming axis numbers with a tester script and hand-tuning thresholds, run
+
+    python foxhole_g920.py --calibrate
+
+and follow the prompts: leave everything alone for a moment, then move each axis end to end.
+From the samples each axis gets its rest position, the raw values at both ends of its travel,
+its noise floor (the furthest the value wanders while nobody touches it) and whether it is
+inverted (a pedal that reads high at rest). The result is written to a JSON calibration
+profile that the mapper loads at start-up.
+
+With a profile, pedal thresholds sit just past the measured noise instead of at a fixed
+position, which gives the earliest press that noise can't trigger, and the response curves
+span the travel the pedals really have. Run the session again when the pedals wear.
+"""
+import json
+import time
+from array import array
+
+REST_SECONDS = 2.0       # Sampling time while nothing is touched
+SWEEP_SECONDS = 4.0      # Sampling time per axis while it is moved end to end
+SAMPLE_INTERVAL = 0.005  # Seconds between samples
+NOISE_MARGIN = 1.5       # Thresholds sit this many noise floors away from rest
+MIN_NOISE_GAP = 0.01     # ...and never closer than this, in raw units
+MIN_TRAVEL = 0.2         # An axis that moved less than this during its sweep is left uncalibrated
+MIN_SIDE_TRAVEL = 0.1    # A centered axis has to move at least this far to each side of rest
+MAX_DEADZONE = 0.5       # Largest share of the travel a calibrated deadzone may take up
+
+
+class AxisCalibration:
+    """ What a session measured for one axis, all in raw axis units. """
+    def __init__(self, rest, low, high, noise, inverted, centered=False):
+        self.rest = rest
+        self.low = low
+        self.high = high
+        self.noise = noise
+        self.inverted = inverted
+        self.centered = centered
+
+    @classmethod
+    def measure(cls, rest_samples, sweep_samples, centered=False):
+        """ Works out the calibration from samples taken at rest and during a sweep. Returns
+            None if the axis didn't travel well past its noise (see usable). """
+        rest = sum(rest_samples) / len(rest_samples)
+        noise = max(abs(value - rest) for value in rest_samples)
+        low = min(min(sweep_samples), rest)
+        high = max(max(sweep_samples), rest)
+        # A pedal is inverted if it rests nearer the top of its range than the bottom
+        inverted = not centered and high - rest < rest - low
+        calibration = cls(rest, low, high, noise, inverted, centered)
+        return calibration if calibration.usable else None
+
+    @property
+    def usable(self):
+        """ True if the axis travelled well past its noise, on both sides of rest for a centered
+            axis. A profile entry that isn't is ignored rather than trusted. """
+        if self.centered:
+            spans = (self.high - self.rest, self.rest - self.low)
+            least = MIN_SIDE_TRAVEL
+        else:
+            spans = (max(self.high - self.rest, self.rest - self.low),)  # Travel from rest
+            least = MIN_TRAVEL
+        return all(span >= least and self.gap < span * MAX_DEADZONE for span in spans)
+
+    @property
+    def gap(self):
+        """ Distance from rest that noise alone never reaches. """
+        return max(self.noise * NOISE_MARGIN, MIN_NOISE_GAP)
+
+    def threshold(self, band):
+        """ The raw threshold for a HysteresisSwitch with hysteresis `band`, placed so that even
+            its release edge lies beyond the noise. The switch needs below=self.inverted. """
+        offset = self.gap + band / 2
+        return self.rest - offset if self.inverted else self.rest + offset
+
+    def curve_settings(self, settings):
+        """ A copy of the ResponseCurve settings for this axis with the measured range, center,
+            direction and a deadzone just past the noise. """
+        settings = dict(settings)
+        if self.centered:
+            settings.update(low=self.low, high=self.high, center=self.rest,
+                            deadzone=self._deadzone(min(self.high - self.rest, self.rest - self.low)))
+        else:
+            # Travel is measured from rest, so the resting end of the range is the rest position
+            low, high = (self.low, self.rest) if self.inverted else (self.rest, self.high)
+            settings.update(low=low, high=high, invert=self.inverted, deadzone=self._deadzone(high - low))
+        return settings
+
+    def _deadzone(self, span):
+        """ The noise gap as a share of `span`, never more than MAX_DEADZONE. """
+        if span <= 0.0:
+            return MAX_DEADZONE
+        return min(self.gap / span, MAX_DEADZONE)
+
+    def describe(self):
+        kind = 'centered' if self.centered else 'inverted' if self.inverted else 'normal'
+        return (f"rest {self.rest:+.3f}, range {self.low:+.3f} to {self.high:+.3f}, noise {self.noise:.4f}, {kind}")
+
+    def to_dict(self):
+        return {'rest': self.rest, 'low': self.low, 'high': self.high, 'noise': self.noise,
+                'inverted': self.inverted, 'centered': self.centered}
+
+
+def sample_axes(backend, axes, seconds):
+    """ Reads `axes` from a joystick backend for `seconds`. Returns one array of samples per axis. """
+    samples = {axis: array('d') for axis in axes}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        backend.pump()
+        if backend.connected:
+            for axis in axes:
+                samples[axis].append(backend.get_axis(axis))
+        time.sleep(SAMPLE_INTERVAL)
+    return samples
+
+
+def run_session(backend, steps, centered_axes=()):
+    """ Guides the user through a calibration session on the console.
+
+    `steps` is a list of (instruction, axis) pairs, one sweep per axis. Returns a dict of
+    axis -> AxisCalibration for the axes that could be calibrated.
+    """
+    axes = [axis for _, axis in steps if axis < backend.get_numaxes()]
+    input("Let go of the wheel and take your feet off the pedals, then press Enter...")
+    print(f"Measuring rest positions and noise for {REST_SECONDS:g} s, don't touch anything.")
+    rest = sample_axes(backend, axes, REST_SECONDS)
+    if not all(rest[axis] for axis in axes):
+        print("The device was disconnected while measuring, calibration aborted.")
+        return {}
+
+    calibrations = {}
+    for instruction, axis in steps:
+        if axis not in rest:
+            print(f"Axis {axis} doesn't exist on this device, skipped.")
+            continue
+        input(f"{instruction}. Press Enter, then keep going for {SWEEP_SECONDS:g} s...")
+        sweep = sample_axes(backend, [axis], SWEEP_SECONDS)[axis]
+        calibration = AxisCalibration.measure(rest[axis], sweep, axis in centered_axes) if sweep else None
+        if calibration is None:
+            print(f"  Axis {axis} didn't move far enough (both ways, for the wheel), it keeps the settings in the script.")
+            continue
+        calibrations[axis] = calibration
+        print(f"  Axis {axis}: {calibration.describe()}")
+    return calibrations
+
+
+def save_profile(path, name, calibrations):
+    profile = {'name': name, 'axes': {str(axis): calibration.to_dict()
+                                      for axis, calibration in sorted(calibrations.items())}}
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=4)
+        f.write('\n')
+
+
+def load_profile(path):
+    """ Reads a calibration profile. Returns a dict of axis -> AxisCalibration, empty if there
+        is no usable profile. """
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+        calibrations = {int(axis): AxisCalibration(**values) for axis, values in profile.get('axes', {}).items()}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Could not load calibration profile {path}: {e}")
+        print("Using the thresholds in the script.")
+        return {}
+    for axis, calibration in list(calibrations.items()):
+        if not calibration.usable:
+            print(f"Ignoring the calibration of axis {axis} in {path}, its measured travel is too small.")
+            del calibrations[axis]
+    print(f"Loaded calibration for '{profile.get('name', path)}' from {path}")
+    return calibrations
@@ -3,12 +3,30 @@ from pynput.keyboard import Controller as KeyboardController, Key
 from pynput.mouse import Controller as MouseController, Button
 import time
 import sys
+import argparse
+import json
+from array import array
+from functools import partial
 import tkinter as tk
 import math
 import threading
 import os
+import gc
+import multiprocessing
 from PIL import Image, ImageTk
-import pyautogui
+from joystick_backend import PygameBackend, ReplayBackend, FusedBackend, AXIS_MOTION, BUTTON_DOWN, BUTTON_UP, HAT_MOTION
+from pwm import PwmChannel, PwmScheduler, enable_high_resolution_timer, disable_high_resolution_timer
+from input_trace import RingRecorder
+from telemetry_bus import TelemetryWriter, TelemetryReader, BUS_PATH
+from latency import LatencyMonitor
+from speed_physics import SpeedModel, MAX_SPEED
+from axis_filter import AxisFilter, HysteresisSwitch
+from response_curve import compile_curves, run_curve_view
+from calibration import load_profile, save_profile, run_session
+from timers import TimerQueue, Cooldown
+from macros import Macro, MacroPlayer
+from gauge_render import GaugeRenderer, SpriteGaugeRenderer, IDLE_UPDATE_MS
+from overlay_server import OverlayServer, OVERLAY_HOST, OVERLAY_PORT, OVERLAY_RATE
 
 # --- GLOBAL CONFIGURATION (for both mapper and speedometer) ---
 JOYSTICK_INDEX = 0
@@ -17,9 +35,10 @@ CENTER_X = CANVAS_SIZE / 2
 CENTER_Y = CANVAS_SIZE / 2
 RADIUS = CANVAS_SIZE * 0.4
 ARC_WIDTH = 15
-MAX_SPEED = 17.4  # m/s (Maximum speed for the speedometer)
+# MAX_SPEED (m/s, full scale of the speedometer) is set in speed_physics.py, the overlays share it
 UPDATE_MS = 16    # Speedometer update frequency in ms
-SPEED_STEP = 0.1  # For speedometer smoothing
+SPEED_ACCELERATION = 6.25  # m/s^2 the needle rises toward the pedal target
+SPEED_DECELERATION = 6.25  # m/s^2 the needle falls toward a lower target
 
 # Gauge Arc Geometry
 ARC_START_ANGLE = 225
@@ -36,6 +55,9 @@ ARC_BG_COLOR = DEEP_ORANGE_DARK
 TICK_COLOR = DEEP_ORANGE_MAIN
 NUMBER_COLOR = DEEP_ORANGE_MAIN
 DIGITAL_SPEED_COLOR = DEEP_ORANGE_BRIGHT
+GAUGE_COLORS = {'bg': BG_COLOR, 'arc_bg': ARC_BG_COLOR, 'tick': TICK_COLOR, 'number': NUMBER_COLOR,
+                'fill': DEEP_ORANGE_MAIN}
+GAUGE_RENDERER = 'canvas'  # 'canvas' draws Tk primitives, 'sprite' shows pre-rendered anti-aliased PIL frames
 
 # Fonts
 MAIN_FONT = "Segoe UI"
@@ -45,6 +67,7 @@ NUMBER_FONT_SIZE = 12
 # --- G920 Specific Configuration (for input mapper) ---
 # IMPORTANT: Confirm these values using the separate 'wheel_tester.py' script
 # (the one that prints axis and button numbers as you move the wheel/pedals).
+# The axis thresholds below don't need hand-tuning: run this script with --calibrate once.
 
 # Shifter Button Mapping
 SHIFTER_BUTTON_F = 14
@@ -61,6 +84,33 @@ BUTTON_T = 1  # Changed to Button 1
 BUTTON_END = 10  # Button 10 for End key
 BUTTON_SPRINT = 0  # Button 0 for sprint toggle (left shift)
 BUTTON_L = 11  # New: Button 11 for 'L' key
+BUTTON_E_ALT = 12  # Button 12 for 'e' key
+BUTTON_HANDBRAKE = 13  # Button 13 for spacebar, brake indicator and handbrake sound
+
+# Vehicle mapping file. Pass --mapping to use a different one without editing this script.
+# If it can't be read, DEFAULT_BUTTON_BINDINGS (built from the constants above) is used.
+MAPPING_FILE = os.path.join('mappings', 'default.json')
+DEFAULT_BUTTON_BINDINGS = {
+    BUTTON_SPRINT: {'type': 'key', 'key': 'shift'},
+    BUTTON_T: {'type': 'key', 'key': 't'},
+    BUTTON_E: {'type': 'key', 'key': 'e'},
+    BUTTON_CTRL_Q: {'type': 'chord', 'keys': ['ctrl_l', 'q']},
+    BUTTON_RIGHT: {'type': 'key', 'key': 'right'},
+    BUTTON_LEFT: {'type': 'key', 'key': 'left'},
+    BUTTON_TOGGLE_DPAD: {'type': 'toggle', 'action': 'dpad_mode'},
+    BUTTON_M: {'type': 'key', 'key': 'm'},
+    BUTTON_RMB: {'type': 'mouse', 'button': 'right'},
+    BUTTON_LMB: {'type': 'mouse', 'button': 'left'},
+    BUTTON_END: {'type': 'key', 'key': 'end'},
+    BUTTON_L: {'type': 'key', 'key': 'l'},
+    BUTTON_E_ALT: {'type': 'key', 'key': 'e'},
+    BUTTON_HANDBRAKE: {'type': 'action', 'action': 'handbrake'},
+    SHIFTER_BUTTON_F: {'type': 'key', 'key': 'f'},
+    BUTTON_TOGGLE_ACCEL_KEY: {'type': 'toggle', 'action': 'gear'},
+}
+DEFAULT_CHORD_BINDINGS = [
+    {'buttons': [BUTTON_RIGHT, BUTTON_LEFT], 'type': 'tap', 'key': 'e'},  # Gate open
+]
 
 # Wheel Axis Mapping
 STEERING_AXIS = 0
@@ -72,21 +122,159 @@ CLUTCH_AXIS = 3      # Clutch pedal - Will be mapped to 'E' key
 DPAD_HAT_INDEX = 0 # Typically 0 for the first D-pad/hat
 DPAD_MOUSE_SENSITIVITY = 10 # Pixels to move mouse per D-pad press per update cycle. Adjust as needed.
 
-# Thresholds for Input Activation (ADJUST THESE TO FINE-TUNE FEEL)
+# Input Engine
+INPUT_MODE = 'event'          # 'event' blocks on pygame joystick events, 'poll' is the old fixed-rate loop
+POLL_INTERVAL = 0.01          # Seconds between reads in 'poll' mode
+EVENT_WAIT_TIMEOUT_MS = 250   # Longest the event engine blocks before re-checking for shutdown
+RECORD_RING_SAMPLES = 2000000 # Samples kept by --record before the oldest are overwritten (~2 h of steady driving)
+LATENCY_READOUT_MS = 500      # Refresh interval of the on-screen latency readout
+MAPPER_PROCESS_START_TIMEOUT = 10.0  # Seconds to wait for --mapper-process to open the wheel
+TAP_HOLD_TIME = 0.05          # Seconds a 'tap' binding holds its key, long enough for the game to see it ('hold_ms' overrides)
+STEERING_AXIS_BIT = 1 << STEERING_AXIS
+ACCELERATOR_AXIS_BIT = 1 << ACCELERATOR_AXIS
+PEDAL_AXES_MASK = (1 << BRAKE_AXIS) | (1 << CLUTCH_AXIS)
+ALL_AXES_MASK = STEERING_AXIS_BIT | ACCELERATOR_AXIS_BIT | PEDAL_AXES_MASK
+
+# Steering and Throttle Output
+STEERING_MODE = 'threshold'    # 'threshold' holds A/D past STEERING_THRESHOLD, 'pwm' pulses them in proportion to wheel angle
+THROTTLE_MODE = 'threshold'    # 'threshold' holds W/S past ACCELERATOR_THRESHOLD, 'pwm' pulses them in proportion to pedal travel
+PWM_CARRIER_HZ = 10.0          # PWM periods per second. Higher is smoother but needs shorter key presses
+PWM_MIN_PULSE = 0.02           # Shortest press/gap in seconds the game reliably notices (about one frame)
+PWM_SWITCH_INTERVAL = 0.001    # GIL switch interval while PWM runs, so the input thread gets back in quickly
+STEERING_PWM_SATURATION = 0.9  # Wheel deflection where A/D become fully held
+STEERING_PWM_GAMMA = 1.5       # Response curve. 1.0 is linear, higher gives finer control near center
+THROTTLE_PWM_DEADZONE = 0.05   # Pedal travel (0.0 - 1.0) ignored at the top of the stroke
+THROTTLE_PWM_SATURATION = 0.95 # Pedal travel where W/S become fully held
+THROTTLE_PWM_GAMMA = 1.0
+
+# Thresholds for Input Activation (ADJUST THESE TO FINE-TUNE FEEL, a calibration profile replaces the pedal ones)
 STEERING_DEADZONE = 0.05
 STEERING_THRESHOLD = 0.2
 ACCELERATOR_THRESHOLD = 0.8  # For INVERTED LOGIC: value is HIGH (e.g., 0.99) when released, LOW (e.g., -0.99) when pressed.
                              # Threshold should be HIGHER than pressed, LOWER than released.
 BRAKE_THRESHOLD = 0.8        # For INVERTED LOGIC: value is HIGH (e.g., 0.99) when released, LOW (e.g., -0.99) when pressed.
                              # Adjust this value based on your desired activation point.
+CLUTCH_THRESHOLD = -0.2      # Clutch counts as pressed below this
+
+# Axis filtering (axis_filter.py), so noise around a threshold doesn't chatter keys
+AXIS_FILTERING = True        # Spike rejection and smoothing. Hysteresis always applies
+STEERING_HYSTERESIS = 0.04   # Width of the band around STEERING_THRESHOLD: A/D go on at 0.22 and off at 0.18
+PEDAL_HYSTERESIS = 0.04      # Same for the accelerator and clutch thresholds
+# min_cutoff: Hz, lower smooths more while the axis is still. beta: how fast smoothing opens up
+# when it moves. spike: largest believable jump between two samples, 0 disables spike rejection.
+AXIS_FILTERS = {
+    STEERING_AXIS:    {'min_cutoff': 1.0, 'beta': 10.0, 'spike': 0.8},
+    ACCELERATOR_AXIS: {'min_cutoff': 1.0, 'beta': 10.0, 'spike': 0.8},
+    BRAKE_AXIS:       {'min_cutoff': 1.0, 'beta': 10.0, 'spike': 0.8},
+    CLUTCH_AXIS:      {'min_cutoff': 1.0, 'beta': 10.0, 'spike': 0.8},
+}
+
+# Response curves (response_curve.py), compiled into lookup tables at start-up. Steering is shaped
+# to -1.0 - 1.0, the accelerator to pedal travel 0.0 - 1.0. The shaped values set the PWM duty
+# cycles and the speedometer target. Check them with --curves.
+# The on/off thresholds above stay in raw axis units: a curve only relabels where a threshold
+# crossing happens, so a switch on shaped values would flip at the same pedal position, just
+# quantized to the table. The brake and clutch only drive such switches and have no curve.
+# Keys: deadzone, saturation, gamma, s_curve (0.0 - 1.0), invert, pedal
+AXIS_CURVES = {
+    STEERING_AXIS:    {'deadzone': STEERING_DEADZONE, 'saturation': STEERING_PWM_SATURATION, 'gamma': STEERING_PWM_GAMMA},
+    ACCELERATOR_AXIS: {'pedal': True, 'invert': True, 'deadzone': THROTTLE_PWM_DEADZONE,
+                       'saturation': THROTTLE_PWM_SATURATION, 'gamma': THROTTLE_PWM_GAMMA},
+}
+AXIS_NAMES = {STEERING_AXIS: 'Steering', ACCELERATOR_AXIS: 'Accelerator', BRAKE_AXIS: 'Brake', CLUTCH_AXIS: 'Clutch'}
+
+# Calibration profile written by --calibrate and loaded at start-up (calibration.py). For every
+# axis in it, the measured rest position, range, direction and noise floor replace the pedal
+# thresholds, the steering center and the curve ranges and deadzones above.
+CALIBRATION_FILE = os.path.join('mappings', 'calibration.json')
+CALIBRATION_STEPS = [
+    ("Turn the wheel all the way left and all the way right, a few times", STEERING_AXIS),
+    ("Press the accelerator all the way down and let it up, a few times", ACCELERATOR_AXIS),
+    ("Press the brake all the way down and let it up, a few times", BRAKE_AXIS),
+    ("Press the clutch all the way down and let it up, a few times", CLUTCH_AXIS),
+]
+
+def axis_curve_settings(calibrations):
+    """ AXIS_CURVES with the ranges and deadzones of calibrated axes filled in. """
+    return {axis: calibrations[axis].curve_settings(settings) if axis in calibrations else settings
+            for axis, settings in AXIS_CURVES.items()}
+
+def calibrate(backend, path):
+    """ Runs the guided calibration session and writes the profile to `path`. """
+    print(f"--- Calibrating {backend.get_name()} ---")
+    centered_axes = [axis for axis, settings in AXIS_CURVES.items() if not settings.get('pedal')]
+    calibrations = run_session(backend, CALIBRATION_STEPS, centered_axes)
+    if not calibrations:
+        print("Nothing was calibrated, no profile written.")
+        return
+    save_profile(path, backend.get_name(), calibrations)
+    print(f"Calibration profile written to {path}, the mapper loads it on start-up.")
+
+def parse_key(name):
+    """ Turns a key name from a mapping file ('e', 'shift', 'ctrl_l') into something pynput can press. """
+    if len(name) == 1:
+        return name
+    return Key[name]
+
+def parse_output(name):
+    """ Like parse_key, but also takes mouse buttons as 'mouse_left', 'mouse_right'... """
+    if name.startswith('mouse_'):
+        return Button[name[len('mouse_'):]]
+    return parse_key(name)
+
+def load_mapping(path):
+    """ Reads a vehicle mapping file. Falls back to the built-in bindings if it can't be read. """
+    try:
+        with open(path) as f:
+            mapping = json.load(f)
+        buttons = {int(button): binding for button, binding in mapping.get('buttons', {}).items()}
+        chords = mapping.get('chords', [])
+        print(f"Loaded mapping '{mapping.get('name', path)}' from {path}")
+    except (OSError, ValueError) as e:
+        print(f"Could not load mapping {path}: {e}")
+        print("Using the built-in button bindings.")
+        mapping = {'name': 'built-in'}
+        buttons = dict(DEFAULT_BUTTON_BINDINGS)
+        chords = list(DEFAULT_CHORD_BINDINGS)
+    mapping['buttons'] = buttons
+    mapping['chords'] = chords
+    return mapping
+
+# What a malformed binding raises while it is compiled or described. It is skipped, not fatal.
+BINDING_ERRORS = (KeyError, ValueError, AttributeError, TypeError)
+
+def describe_binding(binding):
+    """ One-line description of a binding for the startup info. Bindings that don't compile
+        were skipped by the mapper and are shown as such. """
+    try:
+        return _describe_binding(binding)
+    except BINDING_ERRORS as e:
+        return f"skipped ({e})"
+
+def _describe_binding(binding):
+    kind = binding.get('type')
+    if kind == 'chord':
+        return ' + '.join(binding['keys'])
+    if kind == 'mouse':
+        return f"{binding['button'].capitalize()} Mouse Button"
+    if kind == 'tap':
+        repeat = f", every {binding['repeat_ms']} ms while held" if binding.get('repeat_ms') else ''
+        return f"Tap '{binding['key']}'{repeat}"
+    if kind in ('toggle', 'action'):
+        return f"{kind.capitalize()} {binding['action']}"
+    if kind == 'macro':
+        return Macro(binding, parse_output, TAP_HOLD_TIME).describe()
+    return f"'{binding.get('key')}'"
 
 class ModernSpeedometer:
-    def __init__(self, root, canvas, digital_label):
+    def __init__(self, root, canvas, digital_label, renderer=GAUGE_RENDERER):
         self.root = root
         self.canvas = canvas
         self.digital_label = digital_label
         self.current_speed = 0.0
         self.target_speed = 0.0 # This will be set by the G920MasterApp
+        self.speed_model = SpeedModel(MAX_SPEED, SPEED_ACCELERATION, SPEED_DECELERATION)
+        self.clock = time.monotonic  # The benchmarks swap in simulated time
         self.running = True
 
         self.first_person_mode = True  # Toggle this dynamically later if needed
@@ -94,19 +282,29 @@ class ModernSpeedometer:
         self.camera_tap_cooldown = 0.2  # Seconds between taps
         self.last_camera_tap_time = time.time()
 
-        self.draw_static_elements()
-
-        self.fill_arc = self.canvas.create_arc(
-            CENTER_X - RADIUS, CENTER_Y - RADIUS,
-            CENTER_X + RADIUS, CENTER_Y + RADIUS,
-            start=ARC_START_ANGLE,
-            extent=0,
-            outline=DEEP_ORANGE_MAIN,
-            width=ARC_WIDTH,
-            style=tk.ARC
-        )
+        if renderer == 'sprite':
+            # The whole face is one PIL-rendered image, swapped per fill level
+            self.fill_arc = None
+            self.renderer = SpriteGaugeRenderer(self.canvas, self.digital_label, MAX_SPEED, CANVAS_SIZE, RADIUS,
+                                                ARC_WIDTH, ARC_START_ANGLE, ARC_EXTENT, GAUGE_COLORS,
+                                                MAIN_FONT, NUMBER_FONT_SIZE)
+        else:
+            self.draw_static_elements()
+
+            self.fill_arc = self.canvas.create_arc(
+                CENTER_X - RADIUS, CENTER_Y - RADIUS,
+                CENTER_X + RADIUS, CENTER_Y + RADIUS,
+                start=ARC_START_ANGLE,
+                extent=0,
+                outline=DEEP_ORANGE_MAIN,
+                width=ARC_WIDTH,
+                style=tk.ARC
+            )
+            self.renderer = GaugeRenderer(self.canvas, self.fill_arc, self.digital_label, MAX_SPEED, RADIUS, ARC_EXTENT)
 
         self.digital_label.lift() # Ensure label is on top
+        self.idle = False
+        self._after_id = None
 
     def get_angle_deg_from_speed(self, speed):
         if MAX_SPEED <= 0: return ARC_START_ANGLE
@@ -157,24 +355,223 @@ class ModernSpeedometer:
         if not self.running:
             return
 
-        speed_diff = self.target_speed - self.current_speed
-        change = max(-SPEED_STEP, min(SPEED_STEP, speed_diff))
-
-        # Smoothed deceleration logic for speed
-        if abs(speed_diff) < SPEED_STEP / 2 and self.target_speed < 0.05: # Use target_speed to check if pedal is released
-            self.current_speed *= 0.95
+        # Fixed-timestep speed smoothing, independent of how often this frame actually runs
+        self.speed_model.target = self.target_speed
+        self.current_speed = self.speed_model.advance(self.clock())
+        self.renderer.render(self.current_speed)
+
+        # Tick slowly while the needle is parked, wake() brings the full rate back
+        self.idle = self.speed_model.at_rest()
+        self._after_id = self.root.after(IDLE_UPDATE_MS if self.idle else UPDATE_MS, self.update_speed)
+
+    def wake(self):
+        """ Called when the target speed changes, so an idle gauge reacts on this frame. """
+        if self.idle and self.running and self._after_id:
+            self.root.after_cancel(self._after_id)
+            self.update_speed()
+
+class UiStateChannel:
+    """ Carries display state (gear, brake, speed target) from the input thread to the Tk thread.
+
+    The input thread is the only writer. It never mutates a published snapshot, it publishes a
+    new dict instead, so the Tk thread can read the latest one without a lock. The Tk thread
+    drains once per frame and only sees the newest value of each field, so a burst of updates
+    between two frames costs one widget update instead of one per input event.
+
+    When latency is measured, the input thread sets `stamp` to the time it read the input it is
+    handling, and every new snapshot carries it as 'input_time'.
+    """
+    def __init__(self, **initial_state):
+        self._published = dict(initial_state)
+        self._drained = self._published
+        self._applied = dict(initial_state)
+        self.stamp = None
+
+    def publish(self, field, value):
+        """ Input thread only. Does nothing if the field already has this value. """
+        published = self._published
+        if published.get(field) != value:
+            snapshot = dict(published)
+            snapshot[field] = value
+            if self.stamp is not None:
+                snapshot['input_time'] = self.stamp
+            self._published = snapshot
+
+    def latest(self):
+        """ The newest published snapshot. Read-only, it may be shared with other threads. """
+        return self._published
+
+    def drain(self):
+        """ Tk thread only. Returns {field: value} for the fields that changed since the last drain. """
+        snapshot = self._published
+        if snapshot is self._drained:
+            return {}
+        self._drained = snapshot
+        changes = {field: value for field, value in snapshot.items() if self._applied.get(field) != value}
+        self._applied.update(changes)
+        return changes
+
+class TelemetryUiChannel:
+    """ UI end of a mapper running in another process (MapperProcess). Same drain() as
+        UiStateChannel, read from the mapper's telemetry bus. Like UiStateChannel it only sees
+        the newest state each frame, and its 'input_time' is when that state was published. """
+    def __init__(self, path, **initial_state):
+        self.reader = TelemetryReader(path)
+        self._snapshot = None
+        self._applied = dict(initial_state)
+
+    def drain(self):
+        snapshot = self.reader.read()
+        if snapshot is None or snapshot is self._snapshot:
+            return {}
+        self._snapshot = snapshot
+        state = {'target_speed': snapshot.target_speed, 'is_forward': snapshot.is_forward, 'brake': snapshot.brake}
+        changes = {field: value for field, value in state.items() if self._applied.get(field) != value}
+        if changes:
+            self._applied.update(changes)
+            changes['input_time'] = snapshot.timestamp
+        return changes
+
+MODIFIER_KEYS = {Key.shift, Key.shift_l, Key.shift_r, Key.ctrl, Key.ctrl_l, Key.ctrl_r,
+                 Key.alt, Key.alt_l, Key.alt_r, Key.alt_gr, Key.cmd}
+
+class OutputReconciler:
+    """ Single owner of every injected key and mouse button.
+
+    Each mapping stage (a button binding, steering, the camera, the D-pad...) declares what it
+    wants held under its own source name. An output stays down while any source holds it, so
+    stages can no longer release each other's keys. Nothing reaches pynput until flush(), which
+    the input loop calls once per frame: it sends only the net press/release difference, so a
+    key that is dropped and re-held within one frame never causes an OS injection.
+    Only the input thread may use this.
+    """
+    def __init__(self, keyboard, mouse):
+        self.keyboard = keyboard
+        self.mouse = mouse
+        self.active = set()    # Outputs currently held down at the OS level
+        self.injections = 0    # pynput calls made so far
+        self._sources = {}     # source -> set of outputs it holds
+        self._holders = {}     # output -> number of sources holding it
+        self._dirty = set()    # outputs whose holder count changed since the last flush
+
+    def hold(self, source, output):
+        held = self._sources.get(source)
+        if held is None:
+            held = self._sources[source] = set()
+        if output not in held:
+            held.add(output)
+            self._holders[output] = self._holders.get(output, 0) + 1
+            self._dirty.add(output)
+
+    def drop(self, source, output):
+        held = self._sources.get(source)
+        if held and output in held:
+            held.discard(output)
+            self._holders[output] -= 1
+            self._dirty.add(output)
+
+    def set_held(self, source, output, on):
+        if on:
+            self.hold(source, output)
         else:
-            self.current_speed += change
-        self.current_speed = max(0.0, min(self.current_speed, MAX_SPEED))
-
-        self.digital_label.config(text=f"{self.current_speed:.1f} m/s")
-
-        speed_ratio = max(0, min(self.current_speed / MAX_SPEED, 1.0)) if MAX_SPEED > 0 else 0
-        new_extent = -speed_ratio * ARC_EXTENT
-        self.canvas.itemconfigure(self.fill_arc, extent=new_extent)
-
-        self.digital_label.lift()
-        self.root.after(UPDATE_MS, self.update_speed)
+            self.drop(source, output)
+
+    def holds(self, source, output):
+        held = self._sources.get(source)
+        return held is not None and output in held
+
+    def drop_source(self, source):
+        for output in list(self._sources.get(source, ())):
+            self.drop(source, output)
+
+    def flush(self):
+        if self._dirty:
+            holders = self._holders
+            releases = [output for output in self._dirty if output in self.active and not holders[output]]
+            presses = [output for output in self._dirty if output not in self.active and holders[output]]
+            self._dirty.clear()
+            # Modifiers go down first and come up last, so chords like Ctrl+Q come out in order
+            releases.sort(key=lambda output: output in MODIFIER_KEYS)
+            presses.sort(key=lambda output: output not in MODIFIER_KEYS)
+            for output in releases:
+                self.active.discard(output)
+                self._inject(output, False)
+            for output in presses:
+                self.active.add(output)
+                self._inject(output, True)
+
+    def release_all(self):
+        for source in list(self._sources):
+            self.drop_source(source)
+        self.flush()
+
+    def _inject(self, output, pressed):
+        self.injections += 1
+        # print(f"{'Pressed' if pressed else 'Released'}: {output}") # Uncomment for debugging injected input
+        device = self.mouse if isinstance(output, Button) else self.keyboard
+        if pressed:
+            device.press(output)
+        else:
+            device.release(output)
+
+class TimedTap:
+    """ A key that is pressed for `hold` seconds and let go by a timer, so the game sees it even
+        when press and release would otherwise land in the same frame. With `repeat` it taps
+        again every `repeat` seconds while the binding stays down, and a `cooldown` drops taps
+        that come too soon after the last one. Runs on the input thread's TimerQueue. """
+    def __init__(self, outputs, timers, source, output, hold=TAP_HOLD_TIME, repeat=0.0, cooldown=0.0):
+        self.outputs = outputs
+        self.source = source
+        self.output = output
+        self.hold = hold
+        self.cooldown = Cooldown(cooldown)
+        self.clock = timers.clock
+        self.release_timer = timers.timer(outputs.drop, source, output)
+        self.repeat_timer = timers.timer(self.tap, interval=repeat) if repeat else None
+
+    def press(self):
+        """ Taps now and, with a repeat interval, keeps tapping until release(). """
+        if self.tap() and self.repeat_timer:
+            self.repeat_timer.start(self.clock() + self.repeat_timer.interval)
+
+    def release(self):
+        """ Stops repeating. A tap in progress still gets its full hold time. """
+        if self.repeat_timer:
+            self.repeat_timer.cancel()
+
+    def tap(self):
+        now = self.clock()
+        if not self.cooldown.ready(now):
+            return False
+        self.outputs.hold(self.source, self.output)
+        self.release_timer.start(now + self.hold)
+        return True
+
+    def cancel(self):
+        """ Lets go of the key at once and forgets any pending release or repeat. """
+        self.release()
+        self.release_timer.cancel()
+        self.outputs.drop(self.source, self.output)
+
+class CursorController:
+    """ Warps the mouse pointer through pynput. The screen size is looked up once at startup,
+        and unlike pyautogui there is no PAUSE sleep after each move, so a warp never holds
+        up the input thread. """
+    def __init__(self, mouse, screen_size):
+        self.mouse = mouse
+        self.screen_width, self.screen_height = screen_size
+
+    def warp(self, x, y):
+        self.mouse.position = (int(x), int(y))
+
+    def center(self):
+        self.warp(self.screen_width // 2, self.screen_height // 2)
+
+    def top_center(self):
+        self.warp(self.screen_width // 2, 0)
+
+    def bottom_center(self):
+        self.warp(self.screen_width // 2, self.screen_height - 1)
 
 class GearIndicator:
     def __init__(self, root):
@@ -209,6 +606,7 @@ class GearIndicator:
         self.brake_label = tk.Label(self.brake_window, image=self.brake_img, bg=BG_COLOR)
         self.brake_label.pack(expand=True)
         self.brake_label.pack_forget()  # Hide icon initially
+        self.brake_shown = False
 
     def update_gear(self, is_forward):
         self.gear_label.config(
@@ -217,15 +615,21 @@ class GearIndicator:
         )
 
     def set_brake_indicator(self, on):
-        if self.brake_img is None:
+        if self.brake_img is None or on == self.brake_shown:
             return
+        self.brake_shown = on
         if on:
             self.brake_label.pack(expand=True)
         else:
             self.brake_label.pack_forget()
 
 class G920MasterApp:
-    def __init__(self, root):
+    """ Tk side of the mapper: speedometer, gear and brake windows. All joystick handling and
+        key injection lives in InputMapper, which reports back through a UiStateChannel. """
+    def __init__(self, root, input_mode=INPUT_MODE, mapping_path=MAPPING_FILE, steering_mode=STEERING_MODE,
+                 throttle_mode=THROTTLE_MODE, backend=None, record_path=None, latency=None,
+                 latency_readout=False, latency_dump=None, gauge=GAUGE_RENDERER, telemetry_path=None,
+                 mapper=None, calibration_path=CALIBRATION_FILE):
         self.root = root
         self.root.title("G920 Input Mapper with Speedometer")
         self.root.geometry(f'{CANVAS_SIZE + 20}x{CANVAS_SIZE + 100}')
@@ -238,56 +642,22 @@ class G920MasterApp:
         # Position the gear window to the right of the speedometer
         self.gear_window.geometry(f'+{CANVAS_SIZE + 40}+20')
 
-        # First-person camera control variables
-        self.first_person_mode = True  # Enable first-person camera control
-        self.last_camera_direction = None
-        self.last_camera_tap_time = 0
-        self.camera_tap_cooldown = 0.05  # 50ms cooldown between camera direction changes
-        self.camera_hold_time = 0.05  # How long to hold the camera key (50ms)
-
-        # Transmission state
-        self.is_forward = True  # True for Drive, False for Reverse
-        self._last_button_15 = False  # Track button 15 state for toggle
-        self._last_button_6 = False  # Track button 6 state for toggle
-        self._last_button_11 = False  # Track button 11 state for 'L' key
-
-        # Initialize Pygame and Joystick
-        pygame.init()
-        pygame.joystick.init()
-
-        if pygame.joystick.get_count() == 0:
-            print("Error: No joystick found. Please ensure your G920 is plugged in and recognized.")
-            self.joystick = None
+        # --- Input mapper (runs on its own thread, never touches Tk), unless a MapperProcess is given ---
+        if mapper is not None:
+            self.ui_channel = mapper.ui_channel
+            self.mapper = mapper
+            if latency:
+                latency.histograms = [latency.ui]  # The other stages are measured in the mapper process
         else:
-            try:
-                self.joystick = pygame.joystick.Joystick(JOYSTICK_INDEX)
-                self.joystick.init()
-                print(f"Connected to: {self.joystick.get_name()}")
-                print(f"Number of Axes: {self.joystick.get_numaxes()}, Number of Buttons: {self.joystick.get_numbuttons()}, Number of Hats: {self.joystick.get_numhats()}")
-            except pygame.error as e:
-                print(f"Error initializing joystick at index {JOYSTICK_INDEX}: {e}")
-                print("Please check your JOYSTICK_INDEX or if the wheel is connected correctly.")
-                self.joystick = None
-
-        self.keyboard = KeyboardController()
-        self.mouse = MouseController()
-
-        self.simulated_states = {
-            'f': False, 'a': False, 'd': False, 'w': False, 's': False,
-            Key.space: False, # Brake now uses Key.space
-            ',': False, 'e': False, 'm': False, 't': False,
-            'l': False,  # Add 'l' to simulated states
-            'lmb': False, # Left Mouse Button state
-            'rmb': False, # Right Mouse Button state
-            'ctrl_q': False,
-            Key.left: False,  # Track left arrow state
-            Key.right: False,  # Track right arrow state
-            Key.end: False,  # Track End key state
-            Key.shift: False  # Track shift state
-        }
-        self.current_accelerator_key = 'w'
-        self.dpad_as_wasd = False  # New: Track D-pad mode
-        self._sprint_toggle_pressed = False  # Track sprint button state
+            self.ui_channel = UiStateChannel(target_speed=0.0, is_forward=True, brake=False)
+            screen_size = (root.winfo_screenwidth(), root.winfo_screenheight())
+            self.mapper = InputMapper(self.ui_channel, screen_size, input_mode=input_mode,
+                                      mapping_path=mapping_path, steering_mode=steering_mode,
+                                      throttle_mode=throttle_mode, backend=backend, record_path=record_path,
+                                      latency=latency, telemetry_path=telemetry_path,
+                                      calibration_path=calibration_path)
+        self.latency = latency
+        self.latency_dump = latency_dump
 
         # --- Speedometer UI Setup ---
         self.digital_label = tk.Label(root, text="0.0 m/s",
@@ -299,7 +669,14 @@ class G920MasterApp:
                                  bg=BG_COLOR, highlightthickness=0)
         self.canvas.pack(pady=(20, 0))
 
-        self.speedometer = ModernSpeedometer(root, self.canvas, self.digital_label)
+        self.speedometer = ModernSpeedometer(root, self.canvas, self.digital_label, gauge)
+
+        # --- Optional latency readout under the speedometer ---
+        self.latency_label = None
+        if latency and latency_readout:
+            self.latency_label = tk.Label(root, text="", justify='left', font=("Consolas", 9),
+                                          fg=DEEP_ORANGE_MAIN, bg=BG_COLOR)
+            self.latency_label.place(relx=0.02, rely=0.98, anchor='sw')
 
         # --- Handbrake sound ---
         pygame.mixer.init()
@@ -308,417 +685,964 @@ class G920MasterApp:
             self.handbrake_sound = pygame.mixer.Sound(os.path.join('assets', 'handbrake.mp3'))
         except Exception as e:
             print(f"Could not load handbrake.mp3: {e}")
-        self._last_button_13 = False
 
         # --- Start Input Polling and Speedometer Update ---
         self.running = True
+        self.mapper.start()
+        self.speedometer.update_speed() # Start the speedometer's own update loop
+        self.apply_ui_updates()
+        if self.latency_label:
+            self.update_latency_readout()
+
+        self.mapper.print_startup_info()
+
+    def apply_ui_updates(self):
+        """ Applies whatever the input thread published since the last frame. """
+        if not self.running:
+            return
+
+        changes = self.ui_channel.drain()
+        if 'target_speed' in changes:
+            self.speedometer.target_speed = changes['target_speed']
+            self.speedometer.wake()
+        if 'is_forward' in changes:
+            self.gear_indicator.update_gear(changes['is_forward'])
+        if 'brake' in changes:
+            self.gear_indicator.set_brake_indicator(changes['brake'])
+            if changes['brake'] and self.handbrake_sound:
+                self.handbrake_sound.play()
+        if 'input_time' in changes and self.latency:
+            now = time.monotonic()
+            self.latency.ui.record(now - changes['input_time'], now)
+
+        self.root.after(UPDATE_MS, self.apply_ui_updates)
+
+    def update_latency_readout(self):
+        if not self.running:
+            return
+        self.latency_label.config(text=self.latency.readout())
+        self.root.after(LATENCY_READOUT_MS, self.update_latency_readout)
+
+    def stop(self):
+        print("Stopping application...")
+        self.running = False
+        self.speedometer.running = False # Stop speedometer's update loop
+        self.mapper.stop()
+        if self.latency and isinstance(self.mapper, MapperProcess):
+            # The mapper process reports (and dumps) its own stages, this side only has the UI one
+            print(f"UI process latency:\n{self.latency.report()}")
+        elif self.latency and self.latency_dump:
+            self.latency.dump(self.latency_dump)
+            print(f"Latency figures written to {self.latency_dump}")
+        self.gear_window.destroy()  # Close the gear indicator window
+        self.root.destroy()
+        sys.exit(0)
+
+class OverlayState:
+    """ Headless stand-in for the Tk windows: turns what the input thread published into the
+        overlay's state, on the overlay server's thread. """
+    def __init__(self, ui_channel, latency=None):
+        self.ui_channel = ui_channel
+        self.latency = latency
+        self.speed_model = SpeedModel(MAX_SPEED, SPEED_ACCELERATION, SPEED_DECELERATION)
+        self.is_forward = True
+        self.brake = False
+
+    def __call__(self, now):
+        changes = self.ui_channel.drain()
+        if 'target_speed' in changes:
+            self.speed_model.target = changes['target_speed']
+        self.is_forward = changes.get('is_forward', self.is_forward)
+        self.brake = changes.get('brake', self.brake)
+        if 'input_time' in changes and self.latency:
+            self.latency.ui.record(now - changes['input_time'], now)
+        return {'speed': round(self.speed_model.advance(now), 1), 'gear': 'D' if self.is_forward else 'R',
+                'brake': self.brake, 'max_speed': MAX_SPEED}
+
+def run_headless(args, backend, latency):
+    """ Runs the mapper with the browser overlay instead of the Tk windows. """
+    probe = tk.Tk()  # Only to read the screen size for cursor warps
+    probe.withdraw()
+    screen_size = (probe.winfo_screenwidth(), probe.winfo_screenheight())
+    probe.destroy()
+
+    ui_channel = UiStateChannel(target_speed=0.0, is_forward=True, brake=False)
+    mapper = InputMapper(ui_channel, screen_size, input_mode=args.input_mode, mapping_path=args.mapping,
+                         steering_mode=args.steering, throttle_mode=args.throttle, backend=backend,
+                         record_path=args.record, latency=latency, telemetry_path=args.telemetry,
+                         calibration_path=args.calibration)
+    server = OverlayServer(OverlayState(ui_channel, latency), host=args.overlay_host,
+                           port=args.overlay_port, rate=args.overlay_rate)
+    mapper.start()
+    mapper.print_startup_info()
+    try:
+        server.run()
+    finally:
+        print("Stopping application...")
+        mapper.stop()
+        if latency and args.latency_dump:
+            latency.dump(args.latency_dump)
+            print(f"Latency figures written to {args.latency_dump}")
+
+class InputMapper:
+    """ Reads the wheel and injects keyboard/mouse input on a background thread. """
+    def __init__(self, ui_channel, screen_size, input_mode=INPUT_MODE, mapping_path=MAPPING_FILE,
+                 steering_mode=STEERING_MODE, throttle_mode=THROTTLE_MODE, backend=None, record_path=None,
+                 latency=None, keyboard=None, mouse=None, telemetry_path=None, axis_filtering=AXIS_FILTERING,
+                 calibration_path=CALIBRATION_FILE, clock=time.monotonic):
+        self.ui = ui_channel
+        self.clock = clock  # Drives PWM, timers and the axis filter, the benchmark swaps in trace time
+        self.input_mode = input_mode
+        self.steering_mode = steering_mode
+        self.throttle_mode = throttle_mode
+
+        # First-person camera control variables
+        self.first_person_mode = True  # Enable first-person camera control
+        self.last_camera_direction = None
+        self.camera_tap_cooldown = 0.05  # 50ms cooldown between camera direction changes
+        self.camera_hold_time = 0.05  # How long to hold the camera key (50ms)
+
+        # Transmission state
+        self.is_forward = True  # True for Drive, False for Reverse
+
+        # Open the wheel, unless a backend (e.g. a trace replay) was handed in
+        if backend is None:
+            backend = PygameBackend.open(JOYSTICK_INDEX)
+            if backend is None:
+                print("Please check your JOYSTICK_INDEX or if the G920 is connected correctly.")
+        self.joystick = backend
+
+        # Injected input goes to pynput unless other sinks are given (the benchmarks use null ones)
+        self.keyboard = keyboard if keyboard is not None else KeyboardController()
+        self.mouse = mouse if mouse is not None else MouseController()
+        self.cursor = CursorController(self.mouse, screen_size)
+
+        self.outputs = OutputReconciler(self.keyboard, self.mouse)
+
+        # --- PWM outputs, serviced by the input loop between joystick events ---
+        self.pwm = PwmScheduler()
+        self.steering_pwm = None
+        self._steering_pwm_key = 'a'
+        if steering_mode == 'pwm':
+            self.steering_pwm = self.pwm.add(
+                PwmChannel('steering', PWM_CARRIER_HZ, PWM_MIN_PULSE, self._on_steering_pwm))
+        self.throttle_pwm = None
+        if throttle_mode == 'pwm':
+            self.throttle_pwm = self.pwm.add(
+                PwmChannel('throttle', PWM_CARRIER_HZ, PWM_MIN_PULSE, self._on_throttle_pwm))
+        self.current_accelerator_key = 'w'
+        self.dpad_as_wasd = False  # New: Track D-pad mode
+
+        # --- Timed taps, repeats and cooldowns, serviced by the input loop like the PWM edges ---
+        self.timers = TimerQueue(clock)
+        camera_cooldown = Cooldown(self.camera_tap_cooldown)  # Shared, it spaces out direction changes
+        self.camera_taps = {}
+        for direction, key in (('left', Key.left), ('right', Key.right)):
+            tap = TimedTap(self.outputs, self.timers, 'camera', key, self.camera_hold_time)
+            tap.cooldown = camera_cooldown
+            self.camera_taps[direction] = tap
+
+        # --- Button mapping, compiled into one (press, release) entry per button index ---
+        self.mapping = load_mapping(mapping_path)
+        self.button_bindings = self.mapping['buttons']
+        self.skipped_bindings = {}  # ('button', number) or ('chord', position) -> why it didn't compile
+        self.on_button_press, self.on_button_release = self.compile_button_table(self.button_bindings)
+        self.chord_table = self.compile_chord_table(self.mapping['chords'])
+
+        # --- Joystick state snapshot: one bit per button, one slot per axis ---
+        self.button_mask = 0
+        num_axes = self.joystick.get_numaxes() if self.joystick else 0
+        self.axis_values = array('d', [0.0] * max(num_axes, CLUTCH_AXIS + 1))
+        self.hat_value = (0, 0)
+
+        # --- Calibration profile, measured axis ranges and noise floors (empty without one) ---
+        self.calibration = load_profile(calibration_path) if calibration_path else {}
+
+        # --- Axis filtering: the handlers read filtered_axes, recording and telemetry the raw values ---
+        self.axis_filter = AxisFilter(len(self.axis_values), AXIS_FILTERS) if axis_filtering else None
+        self.filtered_axes = self.axis_filter.values if self.axis_filter else self.axis_values
+        steering = self.calibration.get(STEERING_AXIS)
+        self.steering_center = steering.rest if steering else 0.0
+        self.steer_left = HysteresisSwitch(self.steering_center - STEERING_THRESHOLD, STEERING_HYSTERESIS, below=True)
+        self.steer_right = HysteresisSwitch(self.steering_center + STEERING_THRESHOLD, STEERING_HYSTERESIS)
+        self.accelerator_threshold, below = self._pedal_threshold(ACCELERATOR_AXIS, ACCELERATOR_THRESHOLD)
+        self.accelerator_switch = HysteresisSwitch(self.accelerator_threshold, PEDAL_HYSTERESIS, below=below)
+        self.clutch_threshold, below = self._pedal_threshold(CLUTCH_AXIS, CLUTCH_THRESHOLD)
+        self.clutch_switch = HysteresisSwitch(self.clutch_threshold, PEDAL_HYSTERESIS, below=below)
+        self.brake_threshold, _ = self._pedal_threshold(BRAKE_AXIS, BRAKE_THRESHOLD)
+        # Only the switches that drive an output in these modes are observed and counted: PWM
+        # throttle never reads the accelerator switch, PWM steering only uses the steering ones
+        # for the camera
+        self.axis_switches = []
+        if not self.steering_pwm or self.first_person_mode:
+            self.axis_switches.append((STEERING_AXIS, (self.steer_left, self.steer_right)))
+        if not self.throttle_pwm:
+            self.axis_switches.append((ACCELERATOR_AXIS, (self.accelerator_switch,)))
+        self.axis_switches.append((CLUTCH_AXIS, (self.clutch_switch,)))
+
+        # --- Response curves, one lookup table per axis ---
+        self.curves = compile_curves(axis_curve_settings(self.calibration))
+        self.steering_curve = self.curves[STEERING_AXIS]
+        self.accelerator_curve = self.curves[ACCELERATOR_AXIS]
+
+        # --- Optional raw input recording into a memory-mapped ring file ---
+        self.recorder = None
+        if record_path and self.joystick:
+            self.recorder = RingRecorder(record_path, len(self.axis_values), self.joystick.get_numbuttons(),
+                                         self.joystick.get_numhats(), self.joystick.get_name(),
+                                         RECORD_RING_SAMPLES)
+            print(f"Recording inputs to {record_path}")
+
+        # --- Optional telemetry bus, so other processes can follow the wheel without opening it ---
+        self.telemetry = None
+        if telemetry_path and self.joystick:
+            self.telemetry = TelemetryWriter(telemetry_path, len(self.axis_values), self.joystick.get_numbuttons(),
+                                             self.joystick.get_numhats(), self.joystick.get_name())
+            print(f"Publishing telemetry to {telemetry_path}")
+
+        # --- Optional latency instrumentation (a LatencyMonitor, shared with the Tk side) ---
+        self.latency = latency
+
+        self.device_connected = True  # As last seen by the input loop, see _check_connection()
+        self.running = False
+        self.input_poll_thread = None
+
+    def _pedal_threshold(self, axis, threshold):
+        """ (raw threshold, below) for a pedal switch: just past the measured noise if the axis
+            is calibrated, else the inverted-pedal constant from the top of the script. """
+        calibration = self.calibration.get(axis)
+        if calibration is None:
+            return threshold, True
+        return calibration.threshold(PEDAL_HYSTERESIS), calibration.inverted
+
+    def start(self):
+        self.running = True
+        if self.pwm.channels:
+            enable_high_resolution_timer()
+            sys.setswitchinterval(PWM_SWITCH_INTERVAL)
         self.input_poll_thread = threading.Thread(target=self.poll_inputs, daemon=True)
         self.input_poll_thread.start()
-        self.speedometer.update_speed() # Start the speedometer's own update loop
 
-        self.print_startup_info()
+    def stop(self):
+        self.running = False
+
+        # Give the input polling thread a moment to finish
+        if self.input_poll_thread and self.input_poll_thread.is_alive():
+            self.input_poll_thread.join(timeout=EVENT_WAIT_TIMEOUT_MS / 1000)
+
+        # Release any potentially pressed simulated keys/buttons
+        print("Releasing any potentially pressed simulated keys/buttons...")
+        self.pwm.stop(self.clock())
+        self.outputs.release_all()
+        if self.pwm.channels:
+            disable_high_resolution_timer()
+            print("PWM timing:")
+            print(self.pwm.report())
+
+        if self.recorder:
+            print(f"Recorded {self.recorder.count} input samples")
+            self.recorder.close()
+        if self.telemetry:
+            self.telemetry.close()
+        if self.timers.fired:
+            print("Timers:")
+            print(self.timers.report())
+        saved = sum(switch.saved for _, switches in self.axis_switches for switch in switches)
+        spikes = self.axis_filter.spikes_rejected if self.axis_filter else 0
+        print(f"Axis filtering saved {saved} key injections and rejected {spikes} spikes")
+        if self.latency:
+            print("Input latency:")
+            print(self.latency.report())
+        if self.joystick:
+            self.joystick.close()
+        if pygame.get_init():
+            pygame.quit()
 
     def print_startup_info(self):
         print(f"\n--- G920 Input Mapper with Speedometer Active ---")
-        print(f"  Mapping: Shifter Button {SHIFTER_BUTTON_F}   -> 'F'")
+        print(f"  Mapping File: {self.mapping['name']}")
+        for button in sorted(self.button_bindings):
+            error = self.skipped_bindings.get(('button', button))
+            description = f"skipped ({error})" if error else describe_binding(self.button_bindings[button])
+            print(f"  Mapping: Button {button:<3} -> {description}")
+        for position, chord in enumerate(self.mapping['chords']):
+            if not isinstance(chord.get('buttons'), list):
+                print(f"  Mapping: Chord -> skipped (no 'buttons' list)")
+                continue
+            error = self.skipped_bindings.get(('chord', position))
+            buttons = ' + '.join(str(button) for button in chord['buttons'])
+            print(f"  Mapping: Buttons {buttons} -> {f'skipped ({error})' if error else describe_binding(chord)}")
         print(f"  Mapping: Steering Left (Axis {STEERING_AXIS}) -> 'A'")
         print(f"  Mapping: Steering Right (Axis {STEERING_AXIS}) -> 'D'")
-        print(f"  Mapping: Accelerator (Axis {ACCELERATOR_AXIS}) -> INVERTED '{self.current_accelerator_key}' (toggle with Button {BUTTON_TOGGLE_ACCEL_KEY})")
+        print(f"  Mapping: Accelerator (Axis {ACCELERATOR_AXIS}) -> INVERTED '{self.current_accelerator_key}' (toggle with the gear binding)")
         print(f"  Mapping: Brake Pedal (Axis {BRAKE_AXIS})       -> 'E' key and Spacebar")
         print(f"  Mapping: Clutch Pedal (Axis {CLUTCH_AXIS})     -> 'E' key")
-        print(f"  Mapping: Button {BUTTON_LEFT}    -> Left Arrow")
-        print(f"  Mapping: Button {BUTTON_RIGHT}   -> Right Arrow")
-        print(f"  Mapping: Button {BUTTON_E}        -> 'e'")
-        print(f"  Mapping: Button {BUTTON_M}        -> 'm'")
-        print(f"  Mapping: Button {BUTTON_LMB}      -> Left Mouse Button")
-        print(f"  Mapping: Button {BUTTON_RMB}      -> Right Mouse Button")
-        print(f"  Mapping: Button {BUTTON_CTRL_Q}   -> Control + Q")
-        print(f"  Mapping: Button {BUTTON_T}        -> 'T'")
-        print(f"  Mapping: Button {BUTTON_END}      -> 'End'")
-        print(f"  Mapping: Button {BUTTON_TOGGLE_DPAD} -> Toggle D-pad between WASD and Mouse Movement")
-        print(f"  Mapping: Button {BUTTON_SPRINT}   -> Left Shift (Sprint)")
-        print(f"  Mapping: Button {BUTTON_L}        -> 'L'")
         print(f"  Mapping: D-pad (Hat {DPAD_HAT_INDEX})  -> Mouse Movement (Sensitivity: {DPAD_MOUSE_SENSITIVITY})")
-        print(f"  Steering Threshold: {STEERING_THRESHOLD}, Steering Deadzone: {STEERING_DEADZONE}")
-        print(f"  Accelerator Threshold: {ACCELERATOR_THRESHOLD}")
-        print(f"  Brake Threshold: {BRAKE_THRESHOLD}")
+        if self.calibration:
+            for axis, calibration in sorted(self.calibration.items()):
+                print(f"  Calibrated {AXIS_NAMES.get(axis, f'Axis {axis}')}: {calibration.describe()}")
+        else:
+            print("  Calibration: none, using the thresholds in the script (run with --calibrate)")
+        print(f"  Steering Threshold: {STEERING_THRESHOLD} around {self.steering_center:+.3f} (hysteresis {STEERING_HYSTERESIS}), "
+              f"Steering Deadzone: {self.steering_curve.deadzone:.3g}")
+        if self.steering_pwm:
+            print(f"  Steering PWM: {PWM_CARRIER_HZ} Hz, duty cycle from the steering curve")
+        if self.throttle_pwm:
+            print(f"  Throttle PWM: {PWM_CARRIER_HZ} Hz, duty cycle from the accelerator curve")
+        print(f"  Accelerator Threshold: {self.accelerator_threshold:.3f} (hysteresis {PEDAL_HYSTERESIS})")
+        print(f"  Brake Threshold: {self.brake_threshold:.3f}")
+        print(f"  Clutch Threshold: {self.clutch_threshold:.3f} (hysteresis {PEDAL_HYSTERESIS})")
+        for axis, curve in sorted(self.curves.items()):
+            print(f"  {AXIS_NAMES.get(axis, f'Axis {axis}')} Curve: {curve.describe()}")
+        print(f"  Axis Filtering: {'spike rejection and smoothing' if self.axis_filter else 'off'}")
         print("\nPress Ctrl+C in this window or close the Tkinter window to stop the script.")
         print("------------------------------------\n")
 
-    def press_key(self, key_to_press):
-        if key_to_press == Key.space:
-            if not self.simulated_states[Key.space]:
-                self.keyboard.press(Key.space)
-                self.simulated_states[Key.space] = True
-        elif key_to_press in self.simulated_states and not self.simulated_states[key_to_press]:
-            self.keyboard.press(key_to_press)
-            self.simulated_states[key_to_press] = True
-            # print(f"Pressed: {key_to_press}") # Uncomment for debugging key presses
-
-    def release_key(self, key_to_release):
-        if key_to_release == Key.space:
-            if self.simulated_states[Key.space]:
-                self.keyboard.release(Key.space)
-                self.simulated_states[Key.space] = False
-        elif key_to_release in self.simulated_states and self.simulated_states[key_to_release]:
-            self.keyboard.release(key_to_release)
-            self.simulated_states[key_to_release] = False
-            # print(f"Released: {key_to_release}") # Uncomment for debugging key releases
+    def hold_all(self, source, outputs):
+        for output in outputs:
+            self.outputs.hold(source, output)
+
+    def drop_all(self, source, outputs):
+        for output in outputs:
+            self.outputs.drop(source, output)
+
+    def compile_button_table(self, bindings):
+        """ Turns button bindings into two lists indexed by button number, so each button
+            edge costs a single lookup no matter how many bindings there are. """
+        num_buttons = self.joystick.get_numbuttons() if self.joystick else 0
+        size = max([num_buttons] + [button + 1 for button in bindings])
+        on_press = [self._no_action] * size
+        on_release = [self._no_action] * size
+        for button, binding in bindings.items():
+            try:
+                on_press[button], on_release[button] = self._compile_binding(binding, ('button', button))
+            except BINDING_ERRORS as e:
+                print(f"Skipping binding for button {button} ({binding}): {e}")
+                self.skipped_bindings[('button', button)] = e
+        return on_press, on_release
+
+    def compile_chord_table(self, chords):
+        """ Turns chord bindings into (button mask, on_press, on_release) entries. A chord fires
+            when the last of its buttons goes down and releases when any of them comes up. """
+        table = []
+        for position, chord in enumerate(chords):
+            try:
+                chord_mask = 0
+                for button in chord['buttons']:
+                    chord_mask |= 1 << button
+                table.append((chord_mask,) + self._compile_binding(chord, ('chord', chord_mask)))
+            except BINDING_ERRORS as e:
+                print(f"Skipping chord {chord}: {e}")
+                self.skipped_bindings[('chord', position)] = e
+        return table
+
+    def _compile_binding(self, binding, source):
+        """ Returns (on_press, on_release) callables. Held outputs are owned by `source`. """
+        kind = binding['type']
+        if kind == 'key':
+            key = parse_key(binding['key'])
+            return partial(self.outputs.hold, source, key), partial(self.outputs.drop, source, key)
+        if kind == 'chord':
+            keys = [parse_key(name) for name in binding['keys']]
+            return partial(self.hold_all, source, keys), partial(self.drop_all, source, keys)
+        if kind == 'mouse':
+            button = Button[binding['button']]
+            return partial(self.outputs.hold, source, button), partial(self.outputs.drop, source, button)
+        if kind == 'tap':
+            tap = TimedTap(self.outputs, self.timers, source, parse_key(binding['key']),
+                           binding.get('hold_ms', TAP_HOLD_TIME * 1000) / 1000, binding.get('repeat_ms', 0) / 1000,
+                           binding.get('cooldown_ms', 0) / 1000)
+            return tap.press, tap.release
+        if kind == 'macro':
+            player = MacroPlayer(Macro(binding, parse_output, TAP_HOLD_TIME), self.outputs, self.timers, source)
+            return player.press, player.release
+        if kind == 'toggle':
+            return getattr(self, f"_toggle_{binding['action']}"), self._no_action
+        if kind == 'action':
+            action = getattr(self, f"_action_{binding['action']}")
+            return partial(action, True), partial(action, False)
+        raise ValueError(f"unknown binding type '{kind}'")
+
+    def _no_action(self):
+        pass
 
     def poll_inputs(self):
+        """ Input thread entry point. Runs the event-driven engine unless polling was requested. """
+        if self.input_mode == 'poll':
+            self._run_poll_loop()
+        else:
+            self._run_event_loop()
+
+    def _run_poll_loop(self):
+        """ Legacy fallback: samples every button, axis and hat every POLL_INTERVAL seconds. """
+        latency = self.latency
         while self.running:
+            read_time = None
             if self.joystick:
-                pygame.event.pump() # Process internal Pygame events for buttons and hats
-
-                # --- Button Handling ---
-                for i in range(self.joystick.get_numbuttons()):
-                    if self.joystick.get_button(i): # Button is currently pressed
-                        if i == BUTTON_TOGGLE_ACCEL_KEY:
-                            if not self._last_button_15:  # Only toggle on press, not hold
-                                self.is_forward = not self.is_forward
-                                self.current_accelerator_key = 'w' if self.is_forward else 's'
-                                self.gear_indicator.update_gear(self.is_forward)
-                                print(f"Transmission toggled to {'Drive' if self.is_forward else 'Reverse'}")
-                            self._last_button_15 = True
-                        elif i == BUTTON_TOGGLE_DPAD:
-                            if not self._last_button_6:
-                                self.dpad_as_wasd = not self.dpad_as_wasd
-                                print(f"D-pad mode toggled to {'WASD' if self.dpad_as_wasd else 'Arrow/Cursor'} mode")
-                            self._last_button_6 = True
-                        elif i == BUTTON_L:
-                            if not self._last_button_11:
-                                print("Button 11 pressed - 'L' key")
-                                if not self.simulated_states['l']:
-                                    self.keyboard.press('l')
-                                    self.simulated_states['l'] = True
-                            self._last_button_11 = True
-                        elif i == SHIFTER_BUTTON_F:
-                            self.press_key('f')
-                        elif i == BUTTON_LEFT:
-                            if not self.simulated_states[Key.left]:
-                                print(f"Button {BUTTON_LEFT} pressed - Left Arrow")
-                                self.press_key(Key.left)
-                                self.simulated_states[Key.left] = True
-                        elif i == BUTTON_RIGHT:
-                            if not self.simulated_states[Key.right]:
-                                print(f"Button {BUTTON_RIGHT} pressed - Right Arrow")
-                                self.press_key(Key.right)
-                                self.simulated_states[Key.right] = True
-                        elif i == BUTTON_E:
-                            self.press_key('e')
-                        elif i == BUTTON_M:
-                            self.press_key('m')
-                        elif i == BUTTON_T:
-                            self.press_key('t')
-                        elif i == BUTTON_END:
-                            if not self.simulated_states[Key.end]:
-                                self.press_key(Key.end)
-                                self.simulated_states[Key.end] = True
-                        elif i == BUTTON_LMB:
-                            if not self.simulated_states['lmb']:
-                                self.mouse.press(Button.left)
-                                self.simulated_states['lmb'] = True
-                        elif i == BUTTON_RMB:
-                            if not self.simulated_states['rmb']:
-                                self.mouse.press(Button.right)
-                                self.simulated_states['rmb'] = True
-                        elif i == BUTTON_CTRL_Q:
-                            if not self.simulated_states['ctrl_q']:
-                                self.keyboard.press(Key.ctrl_l)
-                                self.keyboard.press('q')
-                                self.simulated_states['ctrl_q'] = True
-                        elif i == BUTTON_SPRINT:
-                            if not self._sprint_toggle_pressed:
-                                self._sprint_toggle_pressed = True
-                                print("Sprint pressed - Left Shift")
-                                self.press_key(Key.shift)
-                        elif i == 12:
-                            if not self.simulated_states.get('e_button_12', False):
-                                print("Button 12 pressed - E key")
-                                self.keyboard.press('e')
-                                self.simulated_states['e_button_12'] = True
-                        elif i == 0:  # Button 0 centers the cursor
-                            if not self.simulated_states.get('center_cursor', False):
-                                screen_width, screen_height = pyautogui.size()
-                                pyautogui.moveTo(screen_width // 2, screen_height // 2)
-                                print("Button 0 pressed - Cursor centered")
-                                self.simulated_states['center_cursor'] = True
-                    else: # Button is currently released
-                        if i == BUTTON_TOGGLE_ACCEL_KEY:
-                            self._last_button_15 = False
-                        elif i == BUTTON_TOGGLE_DPAD:
-                            self._last_button_6 = False
-                        elif i == BUTTON_L:
-                            if self._last_button_11:
-                                print("Button 11 released - 'L' key")
-                                if self.simulated_states['l']:
-                                    self.keyboard.release('l')
-                                    self.simulated_states['l'] = False
-                            self._last_button_11 = False
-                        elif i == SHIFTER_BUTTON_F:
-                            self.release_key('f')
-                        elif i == BUTTON_LEFT:
-                            if self.simulated_states[Key.left]:
-                                print(f"Button {BUTTON_LEFT} released - Left Arrow")
-                                self.keyboard.release(Key.left)
-                                self.simulated_states[Key.left] = False
-                        elif i == BUTTON_RIGHT:
-                            if self.simulated_states[Key.right]:
-                                print(f"Button {BUTTON_RIGHT} released - Right Arrow")
-                                self.keyboard.release(Key.right)
-                                self.simulated_states[Key.right] = False
-                        elif i == BUTTON_E:
-                            self.release_key('e')
-                        elif i == BUTTON_M:
-                            self.release_key('m')
-                        elif i == BUTTON_T:
-                            self.release_key('t')
-                        elif i == BUTTON_END:
-                            if self.simulated_states[Key.end]:
-                                self.release_key(Key.end)
-                                self.simulated_states[Key.end] = False
-                        elif i == BUTTON_LMB:
-                            if self.simulated_states['lmb']:
-                                self.mouse.release(Button.left)
-                                self.simulated_states['lmb'] = False
-                        elif i == BUTTON_RMB:
-                            if self.simulated_states['rmb']:
-                                self.mouse.release(Button.right)
-                                self.simulated_states['rmb'] = False
-                        elif i == BUTTON_CTRL_Q:
-                            if self.simulated_states['ctrl_q']:
-                                self.keyboard.release('q')
-                                self.keyboard.release(Key.ctrl_l)
-                                self.simulated_states['ctrl_q'] = False
-                        elif i == BUTTON_SPRINT:
-                            if self._sprint_toggle_pressed:
-                                self._sprint_toggle_pressed = False
-                                print("Sprint released - Left Shift")
-                                self.release_key(Key.shift)
-                        elif i == 12:
-                            if self.simulated_states.get('e_button_12', False):
-                                print("Button 12 released - E key")
-                                self.keyboard.release('e')
-                                self.simulated_states['e_button_12'] = False
-                        elif i == 0:
-                            if self.simulated_states.get('center_cursor', False):
-                                self.simulated_states['center_cursor'] = False
-
-                # --- Gate open tap only when BOTH button 4 and 5 are pressed ---
-                gate_open_prev = getattr(self, '_gate_open_prev', False)
-                button4_down = self.joystick.get_button(4)
-                button5_down = self.joystick.get_button(5)
-                gate_open_now = button4_down and button5_down
-                if gate_open_now and not gate_open_prev:
-                    print("Buttons 4 and 5 tapped together - E key (gate open)")
-                    self.keyboard.press('e')
-                    self.keyboard.release('e')
-                self._gate_open_prev = gate_open_now
-
-                # --- Axis Handling (Steering, Accelerator, Brake) ---
+                self.joystick.pump() # Process internal Pygame events, and reconnects
                 try:
-                    # Steering
-                    steering_value = self.joystick.get_axis(STEERING_AXIS)
-                    if steering_value < -STEERING_THRESHOLD:
-                        self.press_key('a')
-                    elif self.simulated_states['a']:
-                        self.release_key('a')
-
-                    if steering_value > STEERING_THRESHOLD:
-                        self.press_key('d')
-                    elif self.simulated_states['d']:
-                        self.release_key('d')
-
-                    if abs(steering_value) < STEERING_DEADZONE:
-                        self.release_key('a')
-                        self.release_key('d')
-
-                    # First-person camera control
-                    if self.first_person_mode:
-                        now = time.time()
-                        steering_intensity = steering_value
-
-                        if steering_intensity < -STEERING_THRESHOLD:
-                            if self.last_camera_direction != 'left' and now - self.last_camera_tap_time > self.camera_tap_cooldown:
-                                self.press_key(Key.left)
-                                self.release_key(Key.right)
-                                self.last_camera_direction = 'left'
-                                self.last_camera_tap_time = now
-                                # Schedule key release after short hold time
-                                self.root.after(int(self.camera_hold_time * 1000), lambda: self.release_key(Key.left))
-                        elif steering_intensity > STEERING_THRESHOLD:
-                            if self.last_camera_direction != 'right' and now - self.last_camera_tap_time > self.camera_tap_cooldown:
-                                self.press_key(Key.right)
-                                self.release_key(Key.left)
-                                self.last_camera_direction = 'right'
-                                self.last_camera_tap_time = now
-                                # Schedule key release after short hold time
-                                self.root.after(int(self.camera_hold_time * 1000), lambda: self.release_key(Key.right))
-                        else:
-                            # Steering centered: release both
-                            if self.last_camera_direction is not None:
-                                self.release_key(Key.left)
-                                self.release_key(Key.right)
-                                self.last_camera_direction = None
-
-                    # Accelerator Pedal (INVERTED LOGIC)
-                    accelerator_value = self.joystick.get_axis(ACCELERATOR_AXIS)
-                    normalized_accel_for_speedometer = (accelerator_value + 1.0) / 2.0
-
-                    if accelerator_value <= ACCELERATOR_THRESHOLD:
-                        self.press_key(self.current_accelerator_key)
-                        self.speedometer.target_speed = (1.0 - normalized_accel_for_speedometer) * MAX_SPEED
-                    else:
-                        self.release_key(self.current_accelerator_key)
-                        self.speedometer.target_speed = (1.0 - normalized_accel_for_speedometer) * MAX_SPEED
-
-                    # Get pedal values
-                    brake_value = self.joystick.get_axis(BRAKE_AXIS)
-                    clutch_value = self.joystick.get_axis(CLUTCH_AXIS)
-                    
-                    # Only print if values have changed significantly
-                    if not hasattr(self, '_last_brake_value'):
-                        self._last_brake_value = brake_value
-                        self._last_clutch_value = clutch_value
-                        print(f"Initial pedal values - Brake: {brake_value:.3f}, Clutch: {clutch_value:.3f}")
-                    elif abs(brake_value - self._last_brake_value) > 0.01 or abs(clutch_value - self._last_clutch_value) > 0.01:
-                        print(f"Pedal values changed - Brake: {brake_value:.3f}, Clutch: {clutch_value:.3f}")
-                        self._last_brake_value = brake_value
-                        self._last_clutch_value = clutch_value
-                    
-                    # Only use clutch pedal for 'E' key
-                    clutch_pressed = clutch_value < -0.2
-                    
-                    # Trigger 'E' only with clutch pedal
-                    if clutch_pressed:
-                        if not self.simulated_states['e']:
-                            print(f"Clutch pressed - 'E' key")
-                            self.keyboard.press('e')
-                            self.simulated_states['e'] = True
-                    else:
-                        if self.simulated_states['e']:
-                            print(f"Clutch released - 'E' key")
-                            self.keyboard.release('e')
-                            self.simulated_states['e'] = False
-
-                    # Button 13 for spacebar and brake indicator
-                    button_13_down = self.joystick.get_button(13)
-                    if button_13_down:
-                        if not self.simulated_states[Key.space]:
-                            print("Button 13 pressed - SPACEBAR")
-                            self.keyboard.press(Key.space)
-                            self.simulated_states[Key.space] = True
-                    else:
-                        if self.simulated_states[Key.space]:
-                            print("Button 13 released - SPACEBAR")
-                            self.keyboard.release(Key.space)
-                            self.simulated_states[Key.space] = False
-                    # Always update brake indicator based on button 13 state
-                    self.gear_indicator.set_brake_indicator(button_13_down)
-                    # Play handbrake sound on press (transition)
-                    if button_13_down and not self._last_button_13:
-                        if self.handbrake_sound:
-                            self.handbrake_sound.play()
-                    self._last_button_13 = button_13_down
-
-                    # --- D-pad (Hat) Handling ---
-                    if self.joystick.get_numhats() > DPAD_HAT_INDEX:
-                        hat_value = self.joystick.get_hat(DPAD_HAT_INDEX)
-                        # hat_value is (x, y) where x=-1 (left), 0 (center), 1 (right)
-                        # and y=-1 (down), 0 (center), 1 (up)
-
-                        if self.dpad_as_wasd:
-                            # WASD mode
-                            if hat_value[0] < 0:  # Left
-                                self.press_key('a')
-                            else:
-                                self.release_key('a')
-                            
-                            if hat_value[0] > 0:  # Right
-                                self.press_key('d')
-                            else:
-                                self.release_key('d')
-                            
-                            if hat_value[1] > 0:  # Up
-                                self.press_key('w')
-                            else:
-                                self.release_key('w')
-                            
-                            if hat_value[1] < 0:  # Down
-                                self.press_key('s')
-                            else:
-                                self.release_key('s')
-                        else:
-                            # Arrow/Cursor mode
-                            if hat_value[0] < 0:  # Left
-                                if not self.simulated_states[Key.left]:
-                                    print("D-pad Left - Left Arrow")
-                                    self.press_key(Key.left)
-                            else:
-                                if self.simulated_states[Key.left]:
-                                    self.release_key(Key.left)
-                            
-                            if hat_value[0] > 0:  # Right
-                                if not self.simulated_states[Key.right]:
-                                    print("D-pad Right - Right Arrow")
-                                    self.press_key(Key.right)
-                            else:
-                                if self.simulated_states[Key.right]:
-                                    self.release_key(Key.right)
-                            
-                            if hat_value[1] != 0:  # Up or Down
-                                screen_width, screen_height = pyautogui.size()
-                                if hat_value[1] > 0:  # Up
-                                    print("D-pad Up - Moving cursor to top center")
-                                    pyautogui.moveTo(screen_width // 2, 0)  # Top center
-                                else:  # Down
-                                    print("D-pad Down - Moving cursor to bottom center")
-                                    pyautogui.moveTo(screen_width // 2, screen_height)  # Bottom center
-
+                    if self._check_connection():
+                        if latency:
+                            read_time = self._stamp_input()
+                        self._poll_once()
+                        self._record_sample()
+                        if latency:
+                            latency.decision.record(time.monotonic() - read_time, read_time)
                 except IndexError:
                     print(f"Error: Axis or Hat number out of range for joystick. Check your constants.")
                     self.joystick = None # Disable joystick polling
                 except pygame.error as e:
                     print(f"Pygame input error: {e}")
-                    self.joystick = None # Disable joystick polling
+                    self.joystick.mark_lost() # Released on the next pass, then reopened
+
+            self._service_timers()
+            self._flush_outputs(read_time)
+            delay = self._wait_timeout_ms(POLL_INTERVAL * 1000) / 1000
+            wake_time = time.monotonic() + delay
+            time.sleep(delay) # Small delay for input polling thread
+            if latency:
+                self._measure_oversleep(wake_time)
+
+    def _run_event_loop(self):
+        """ Blocks on joystick events and only handles the inputs that changed. """
+        latency = self.latency
+        # Sync the initial state once, the event queue only reports changes from here on
+        if self.joystick:
+            try:
+                self.joystick.start_events()
+                self.joystick.pump()
+                self._poll_once()
+                self._record_sample()
+                self.outputs.flush()
+            except IndexError as e:
+                print(f"Error reading initial joystick state: {e}")
+                self.joystick = None
+            except pygame.error as e:
+                print(f"Error reading initial joystick state: {e}")
+                self.joystick.mark_lost()
+
+        while self.running:
+            if not self.joystick:
+                time.sleep(POLL_INTERVAL)
+                continue
 
-            time.sleep(0.01) # Small delay for input polling thread
+            # Wake up for the next pending key release, otherwise only so that stop() is
+            # noticed while the wheel sits idle
+            try:
+                timeout_ms = self._wait_timeout_ms(EVENT_WAIT_TIMEOUT_MS)
+                wait_start = time.monotonic() if latency else None
+                events = self.joystick.wait_events(timeout_ms)
+                read_time = None
+                if not self._check_connection():
+                    events = None
+                if events:
+                    if latency:
+                        read_time = self._stamp_input()
+                    self._handle_events(events)
+                    self._record_sample()
+                    if latency:
+                        latency.decision.record(time.monotonic() - read_time, read_time)
+                elif latency:
+                    self._measure_oversleep(wait_start + timeout_ms / 1000)
+                self._service_timers()
+                self._flush_outputs(read_time)
+            except IndexError:
+                print(f"Error: Axis or Hat number out of range for joystick. Check your constants.")
+                self.joystick = None # Disable joystick handling
+            except pygame.error as e:
+                print(f"Pygame input error: {e}")
+                self.joystick.mark_lost() # Released on the next pass, then reopened
+
+    def _check_connection(self):
+        """ Follows the backend's connected flag: releases everything when the wheel goes away and
+            picks its full state back up when it returns. Returns True while it is connected. """
+        connected = self.joystick.connected
+        if connected != self.device_connected:
+            self.device_connected = connected
+            if connected:
+                print("Wheel reconnected - mapping resumed")
+                self._poll_once()
+                self._record_sample()
+            else:
+                self._release_device()
+        return connected
+
+    def _release_device(self):
+        """ The wheel is gone: let go of every key and button it was holding. """
+        print("Wheel disconnected - all keys released, waiting for it to come back")
+        self._apply_button_mask(0)  # Bindings see their releases, e.g. the handbrake indicator
+        self.pwm.stop(self.clock())
+        self.timers.cancel_all()
+        self.last_camera_direction = None
+        self.hat_value = (0, 0)
+        if self.axis_filter:
+            self.axis_filter.restart()
+        self.outputs.release_all()
+        self.ui.publish('target_speed', 0.0)
+        self._record_sample()
+
+    def _stamp_input(self):
+        """ Marks the time the current input was read, for the latency stages that follow. """
+        read_time = time.monotonic()
+        self.ui.stamp = read_time
+        return read_time
+
+    def _flush_outputs(self, read_time=None):
+        """ Injects the frame's output changes, timing them against `read_time` when given. """
+        if read_time is None:
+            self.outputs.flush()
+            return
+        injections = self.outputs.injections
+        self.outputs.flush()
+        if self.outputs.injections != injections:
+            now = time.monotonic()
+            self.latency.injection.record(now - read_time, now)
+
+    def _measure_oversleep(self, wake_time):
+        """ Records how far past `wake_time` the loop actually woke up. Early wake-ups (events
+            for another device) say nothing about timer accuracy and are skipped. """
+        now = time.monotonic()
+        if now >= wake_time:
+            self.latency.loop.record(now - wake_time, now)
+
+    def _record_sample(self):
+        """ Writes the current raw joystick state to the ring file and the telemetry bus, if enabled. """
+        if self.recorder:
+            self.recorder.record(self.clock(), self.button_mask, self.hat_value, self.axis_values)
+        if self.telemetry:
+            state = self.ui.latest()
+            self.telemetry.publish(self.clock(), self.button_mask, self.hat_value, self.axis_values,
+                                   state['target_speed'], state['is_forward'], state['brake'])
+
+    def _next_deadline(self):
+        """ Clock time the next timer, PWM edge or axis filter step is due, or None. """
+        deadline = self.pwm.next_deadline()
+        timer_deadline = self.timers.next_deadline()
+        if timer_deadline is not None and (deadline is None or timer_deadline < deadline):
+            deadline = timer_deadline
+        if self.axis_filter:
+            filter_deadline = self.axis_filter.next_deadline()
+            if filter_deadline is not None and (deadline is None or filter_deadline < deadline):
+                deadline = filter_deadline
+        return deadline
+
+    def _wait_timeout_ms(self, longest_ms):
+        """ How long the input loop may block before _service_timers() has work to do. """
+        deadline = self._next_deadline()
+        if deadline is None:
+            return longest_ms
+        remaining_ms = (deadline - self.clock()) * 1000
+        return max(1, min(longest_ms, math.ceil(remaining_ms)))
+
+    def _service_timers(self):
+        """ Fires due timers (tap releases and repeats), flips due PWM edges and lets the axis
+            filter catch up with axes that stopped moving. Runs on the input thread. """
+        now = self.clock()
+        self.timers.service(now)
+        if self.axis_filter:
+            changed = self.axis_filter.service(now)
+            if changed:
+                self._apply_axes(changed)
+                # The handlers may have changed the speed or gear, publish it like any other input
+                self._record_sample()
+        self.pwm.service(now)
+
+    def _handle_events(self, events):
+        """ Applies one burst of queued joystick events. Axis motion is collapsed to its latest value. """
+        axes = self.axis_values
+        moved_axes = 0  # Bitmask of axis indices that moved during this burst
+
+        for event in events:
+            if event.type == AXIS_MOTION:
+                axes[event.index] = event.value
+                moved_axes |= 1 << event.index
+            elif event.type == BUTTON_DOWN:
+                self._apply_button_mask(self.button_mask | (1 << event.index))
+            elif event.type == BUTTON_UP:
+                self._apply_button_mask(self.button_mask & ~(1 << event.index))
+            elif event.type == HAT_MOTION:
+                if event.index == DPAD_HAT_INDEX and event.value != self.hat_value:
+                    self.hat_value = event.value
+                    self._handle_hat(event.value)
+
+        if moved_axes:
+            self._apply_axes(self._filter_axes(moved_axes))
+
+    def _filter_axes(self, moved):
+        """ Runs the raw values of the axes in bitmask `moved` through the filter. Returns the
+            bitmask of filtered values that changed. """
+        raw = self.axis_values
+        for axis, switches in self.axis_switches:
+            if moved >> axis & 1:
+                for switch in switches:
+                    switch.observe(raw[axis])
+        if self.axis_filter:
+            return self.axis_filter.update(raw, moved, self.clock())
+        return moved
+
+    def _apply_axes(self, moved):
+        """ Runs the handlers of the axes in bitmask `moved`, on their filtered values. """
+        axes = self.filtered_axes
+        if moved & STEERING_AXIS_BIT:
+            self._handle_steering(axes[STEERING_AXIS])
+        if moved & ACCELERATOR_AXIS_BIT:
+            self._handle_accelerator(axes[ACCELERATOR_AXIS])
+        if moved & PEDAL_AXES_MASK:
+            self._handle_pedals(axes[BRAKE_AXIS], axes[CLUTCH_AXIS])
+
+    def _poll_once(self):
+        """ Reads and applies the full joystick state (one cycle of the polling loop). """
+        joystick = self.joystick
+
+        # --- Button Handling (one bitmask for the whole device, edges come from the XOR) ---
+        get_button = joystick.get_button
+        mask = 0
+        for i in range(joystick.get_numbuttons()):
+            if get_button(i):
+                mask |= 1 << i
+        self._apply_button_mask(mask)
+
+        # --- Axis Handling (Steering, Accelerator, Brake) ---
+        axes = self.axis_values
+        for i in range(len(axes)):
+            axes[i] = joystick.get_axis(i)
+        self._apply_axes(self._filter_axes(ALL_AXES_MASK))
+
+        # --- D-pad (Hat) Handling, only when the hat moved ---
+        if joystick.get_numhats() > DPAD_HAT_INDEX:
+            hat_value = joystick.get_hat(DPAD_HAT_INDEX)
+            if hat_value != self.hat_value:
+                self.hat_value = hat_value
+                self._handle_hat(hat_value)
+
+    def _apply_button_mask(self, mask):
+        """ Diffs a new button bitmask against the previous one and fires the bindings
+            for every button and chord that changed. """
+        previous = self.button_mask
+        changed = mask ^ previous
+        if not changed:
+            return
+        self.button_mask = mask
+
+        released = changed & previous
+        while released:
+            bit = released & -released
+            self.on_button_release[bit.bit_length() - 1]()
+            released ^= bit
+
+        pressed = changed & mask
+        while pressed:
+            bit = pressed & -pressed
+            self.on_button_press[bit.bit_length() - 1]()
+            pressed ^= bit
+
+        for chord_mask, on_press, on_release in self.chord_table:
+            if changed & chord_mask:
+                was_down = previous & chord_mask == chord_mask
+                is_down = mask & chord_mask == chord_mask
+                if is_down and not was_down:
+                    on_press()
+                elif was_down and not is_down:
+                    on_release()
+
+    def _toggle_gear(self):
+        self.is_forward = not self.is_forward
+        self.current_accelerator_key = 'w' if self.is_forward else 's'
+        self.ui.publish('is_forward', self.is_forward)
+        self._handle_accelerator(self.filtered_axes[ACCELERATOR_AXIS])  # Swap w/s if the pedal is down
+        print(f"Transmission toggled to {'Drive' if self.is_forward else 'Reverse'}")
+
+    def _toggle_dpad_mode(self):
+        self.dpad_as_wasd = not self.dpad_as_wasd
+        self.outputs.drop_source('dpad')
+        self._handle_hat(self.hat_value)
+        print(f"D-pad mode toggled to {'WASD' if self.dpad_as_wasd else 'Arrow/Cursor'} mode")
+
+    def _action_center_cursor(self, pressed):
+        if pressed:
+            self.cursor.center()
+            print("Cursor centered")
+
+    def _handle_steering(self, steering_value):
+        if self.steering_pwm:
+            # Pulse A or D with a duty cycle that follows the wheel angle
+            key = 'a' if steering_value < 0 else 'd'
+            if key != self._steering_pwm_key:
+                self.outputs.drop('steering', self._steering_pwm_key)
+                self._steering_pwm_key = key
+                self.outputs.set_held('steering', key, self.steering_pwm.on)
+            self.steering_pwm.set_duty(abs(self.steering_curve(steering_value)), self.clock())
+        steer_left = self.steer_left.update(steering_value)
+        steer_right = self.steer_right.update(steering_value)
+        if not self.steering_pwm:
+            self.outputs.set_held('steering', 'a', steer_left)
+            self.outputs.set_held('steering', 'd', steer_right)
+
+        # First-person camera control: one short tap of the arrow key per direction change
+        if self.first_person_mode:
+            direction = 'left' if steer_left else 'right' if steer_right else None
+            if direction is None:
+                # Steering centered: release both
+                if self.last_camera_direction is not None:
+                    for tap in self.camera_taps.values():
+                        tap.cancel()
+                    self.last_camera_direction = None
+            elif direction != self.last_camera_direction:
+                other = self.camera_taps['right' if direction == 'left' else 'left']
+                if self.camera_taps[direction].tap():
+                    other.cancel()
+                    self.last_camera_direction = direction
+
+    def _on_steering_pwm(self, channel, on):
+        self.outputs.set_held('steering', self._steering_pwm_key, on)
+
+    def _handle_accelerator(self, accelerator_value):
+        # Accelerator Pedal (INVERTED LOGIC, the curve turns it into shaped pedal travel)
+        pedal_travel = self.accelerator_curve(accelerator_value)
+
+        key = self.current_accelerator_key
+        if self.throttle_pwm:
+            # Pulse W/S with a duty cycle that follows pedal travel
+            self.throttle_pwm.set_duty(pedal_travel, self.clock())
+            self.outputs.set_held('accelerator', key, self.throttle_pwm.on)
+        else:
+            self.outputs.set_held('accelerator', key, self.accelerator_switch.update(accelerator_value))
+        self.outputs.drop('accelerator', 's' if key == 'w' else 'w')
+        self.ui.publish('target_speed', pedal_travel * MAX_SPEED)
+
+    def _on_throttle_pwm(self, channel, on):
+        self.outputs.set_held('accelerator', self.current_accelerator_key, on)
+
+    def _handle_pedals(self, brake_value, clutch_value):
+        # Only print if values have changed significantly
+        if not hasattr(self, '_last_brake_value'):
+            self._last_brake_value = brake_value
+            self._last_clutch_value = clutch_value
+            print(f"Initial pedal values - Brake: {brake_value:.3f}, Clutch: {clutch_value:.3f}")
+        elif abs(brake_value - self._last_brake_value) > 0.01 or abs(clutch_value - self._last_clutch_value) > 0.01:
+            print(f"Pedal values changed - Brake: {brake_value:.3f}, Clutch: {clutch_value:.3f}")
+            self._last_brake_value = brake_value
+            self._last_clutch_value = clutch_value
+
+        # Only use clutch pedal for 'E' key
+        clutch_pressed = self.clutch_switch.update(clutch_value)
+
+        # Trigger 'E' only with clutch pedal
+        if clutch_pressed != self.outputs.holds('clutch', 'e'):
+            print(f"Clutch {'pressed' if clutch_pressed else 'released'} - 'E' key")
+            self.outputs.set_held('clutch', 'e', clutch_pressed)
+
+    def _action_handbrake(self, pressed):
+        # Handbrake button for spacebar, brake indicator and sound (the UI plays it)
+        if pressed:
+            print("Handbrake pressed - SPACEBAR")
+        else:
+            print("Handbrake released - SPACEBAR")
+        self.outputs.set_held('handbrake', Key.space, pressed)
+        self.ui.publish('brake', pressed)
+
+    def _handle_hat(self, hat_value):
+        # Called on hat changes only, so holding a direction warps the cursor once
+        # hat_value is (x, y) where x=-1 (left), 0 (center), 1 (right)
+        # and y=-1 (down), 0 (center), 1 (up)
+
+        if self.dpad_as_wasd:
+            # WASD mode
+            self.outputs.set_held('dpad', 'a', hat_value[0] < 0)  # Left
+            self.outputs.set_held('dpad', 'd', hat_value[0] > 0)  # Right
+            self.outputs.set_held('dpad', 'w', hat_value[1] > 0)  # Up
+            self.outputs.set_held('dpad', 's', hat_value[1] < 0)  # Down
+        else:
+            # Arrow/Cursor mode
+            if hat_value[0] < 0:  # Left
+                print("D-pad Left - Left Arrow")
+            elif hat_value[0] > 0:  # Right
+                print("D-pad Right - Right Arrow")
+            self.outputs.set_held('dpad', Key.left, hat_value[0] < 0)
+            self.outputs.set_held('dpad', Key.right, hat_value[0] > 0)
+
+            if hat_value[1] > 0:  # Up
+                print("D-pad Up - Moving cursor to top center")
+                self.cursor.top_center()
+            elif hat_value[1] < 0:  # Down
+                print("D-pad Down - Moving cursor to bottom center")
+                self.cursor.bottom_center()
+
+def open_backend(replay=None, replay_speed=1.0, devices=None):
+    """ The joystick backend the command line asks for, or None for the wheel at JOYSTICK_INDEX. """
+    if replay:
+        return ReplayBackend(replay, speed=replay_speed)
+    if devices:
+        return FusedBackend.open(devices)
+    return None
+
+def raise_process_priority():
+    """ Asks the OS to schedule this process ahead of normal ones. Best effort. """
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            HIGH_PRIORITY_CLASS = 0x80
+            kernel32 = ctypes.windll.kernel32
+            return bool(kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), HIGH_PRIORITY_CLASS))
+        except (AttributeError, OSError):
+            return False
+    try:
+        os.nice(-5)
+        return True
+    except (AttributeError, OSError):
+        return False
+
+def _run_mapper_process(options, screen_size, bus_path, started, go, stop):
+    """ Entry point of the mapper process: InputMapper with no Tk in the same interpreter. """
+    priority = raise_process_priority()
+    backend = open_backend(options.pop('replay'), options.pop('replay_speed'), options.pop('devices'))
+    latency = LatencyMonitor() if options.pop('latency') else None
+    latency_dump = options.pop('latency_dump')
+    ui_channel = UiStateChannel(target_speed=0.0, is_forward=True, brake=False)
+    mapper = InputMapper(ui_channel, screen_size, backend=backend, latency=latency, telemetry_path=bus_path,
+                         **options)
+    started.send(mapper.telemetry is not None)
+    try:
+        go.wait()
+        mapper.start()
+        mapper.print_startup_info()
+        print(f"Input mapper running in process {os.getpid()}{' at raised priority' if priority else ''}")
+        # Everything allocated so far lives for the whole session, keep the collector off it
+        gc.freeze()
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mapper.stop()
+        if latency and latency_dump:
+            latency.dump(latency_dump)
+            print(f"Latency figures written to {latency_dump}")
+
+class MapperProcess:
+    """ Runs InputMapper in a child process, away from Tk, PIL and the mixer and their hold on
+        the GIL. The child publishes to a telemetry bus and the UI reads it back through
+        `ui_channel`; nothing else crosses between the two while driving.
+
+    Stands in for InputMapper in G920MasterApp: start(), stop() and print_startup_info().
+    """
+    def __init__(self, screen_size, bus_path=BUS_PATH, **options):
+        context = multiprocessing.get_context('spawn')  # The same on every platform, no forked Tk state
+        receiver, sender = context.Pipe(duplex=False)
+        self._go = context.Event()
+        self._stop = context.Event()
+        self.process = context.Process(target=_run_mapper_process, name='input-mapper', daemon=True,
+                                       args=(options, screen_size, bus_path, sender, self._go, self._stop))
+        self.process.start()
+        sender.close()
+        try:
+            publishing = receiver.poll(MAPPER_PROCESS_START_TIMEOUT) and receiver.recv()
+        except (EOFError, OSError):
+            # The child died before it could answer, its traceback is already on the console
+            self.process.join(timeout=1)
+            print(f"Error: the input mapper process failed to start (exit code {self.process.exitcode}), "
+                  f"the wheel won't be mapped")
+            publishing = False
+        receiver.close()
+        if publishing:
+            self.ui_channel = TelemetryUiChannel(bus_path, target_speed=0.0, is_forward=True, brake=False)
+        else:
+            # No wheel in the child, so there is never anything to show
+            self.ui_channel = UiStateChannel(target_speed=0.0, is_forward=True, brake=False)
+
+    def start(self):
+        self._go.set()
 
     def stop(self):
-        print("Stopping application...")
-        self.running = False
-        self.speedometer.running = False # Stop speedometer's update loop
+        self._stop.set()
+        self.process.join(timeout=EVENT_WAIT_TIMEOUT_MS / 1000 + 2)
+        if self.process.is_alive():
+            self.process.terminate()
 
-        # Give the input polling thread a moment to finish
-        if self.input_poll_thread.is_alive():
-            self.input_poll_thread.join(timeout=0.1)
+    def print_startup_info(self):
+        """ The child prints the mapping itself once it is running. """
 
-        # Release any potentially pressed simulated keys/buttons
-        print("Releasing any potentially pressed simulated keys/buttons...")
-        for state_name, is_pressed in self.simulated_states.items():
-            if is_pressed:
-                if state_name == 'lmb':
-                    self.mouse.release(Button.left)
-                elif state_name == 'rmb':
-                    self.mouse.release(Button.right)
-                elif state_name == 'ctrl_q':
-                    self.keyboard.release('q')
-                    self.keyboard.release(Key.ctrl_l)
-                elif state_name == Key.space:
-                    self.keyboard.release(Key.space)
-                else:
-                    self.keyboard.release(state_name)
-
-        if pygame.joystick.get_init():
-            pygame.joystick.quit()
-        if pygame.get_init():
-            pygame.quit()
-        self.gear_window.destroy()  # Close the gear indicator window
-        self.root.destroy()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Foxhole input mapper for the Logitech G920")
+    parser.add_argument('--input-mode', choices=['event', 'poll'], default=INPUT_MODE,
+                        help="'event' waits for joystick events (default), 'poll' uses the old fixed-rate loop")
+    parser.add_argument('--mapping', default=MAPPING_FILE,
+                        help=f"vehicle mapping file to load (default: {MAPPING_FILE})")
+    parser.add_argument('--steering', choices=['threshold', 'pwm'], default=STEERING_MODE,
+                        help="'threshold' holds A/D past a fixed angle, 'pwm' pulses them in proportion to wheel angle")
+    parser.add_argument('--throttle', choices=['threshold', 'pwm'], default=THROTTLE_MODE,
+                        help="'threshold' holds W/S past a fixed pedal position, 'pwm' pulses them in proportion to pedal travel")
+    parser.add_argument('--gauge', choices=['canvas', 'sprite'], default=GAUGE_RENDERER,
+                        help="'canvas' draws the speedometer with Tk shapes, 'sprite' with pre-rendered anti-aliased images")
+    parser.add_argument('--devices', metavar='LAYOUT',
+                        help="read several devices (wheel, pedals, shifter, button box) as one, routed by a device layout file")
+    parser.add_argument('--replay', metavar='TRACE',
+                        help="read inputs from a recorded trace file instead of the wheel")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="trace playback speed, 0 plays it as fast as possible (default: 1.0)")
+    parser.add_argument('--latency', action='store_true',
+                        help="measure input-to-injection latency and loop jitter, printed on exit")
+    parser.add_argument('--latency-readout', action='store_true',
+                        help="also show the latency figures under the speedometer (implies --latency)")
+    parser.add_argument('--latency-dump', metavar='FILE',
+                        help="write the latency figures to a JSON file on exit (implies --latency)")
+    parser.add_argument('--record', metavar='RING',
+                        help="record every raw input sample to a memory-mapped ring file (readable live with input_trace.py)")
+    parser.add_argument('--telemetry', metavar='BUS', nargs='?', const=BUS_PATH,
+                        help=f"publish the wheel state to a shared-memory telemetry bus for other overlays (default: {BUS_PATH})")
+    parser.add_argument('--mapper-process', action='store_true',
+                        help="run the input mapper in its own process so the speedometer windows can't slow it down")
+    parser.add_argument('--headless', action='store_true',
+                        help="no Tk windows, serve the speedometer as a browser overlay for OBS instead")
+    parser.add_argument('--overlay-host', default=OVERLAY_HOST,
+                        help=f"address the overlay server listens on (default: {OVERLAY_HOST})")
+    parser.add_argument('--overlay-port', type=int, default=OVERLAY_PORT,
+                        help=f"overlay server port (default: {OVERLAY_PORT})")
+    parser.add_argument('--overlay-rate', type=float, default=OVERLAY_RATE,
+                        help=f"overlay updates per second (default: {OVERLAY_RATE})")
+    parser.add_argument('--curves', action='store_true',
+                        help="don't map anything, plot the axis response curves with the live wheel position on them")
+    parser.add_argument('--calibrate', action='store_true',
+                        help="don't map anything, measure the axes in a short guided session and write a calibration profile")
+    parser.add_argument('--calibration', metavar='PROFILE', default=CALIBRATION_FILE,
+                        help=f"calibration profile to load, or to write with --calibrate (default: {CALIBRATION_FILE})")
+    args = parser.parse_args()
+
+    if args.calibrate or args.curves:
+        backend = open_backend(args.replay, args.replay_speed, args.devices) or PygameBackend.open(JOYSTICK_INDEX)
+        if backend is None:
+            sys.exit(1)
+    if args.calibrate:
+        try:
+            calibrate(backend, args.calibration)
+        except KeyboardInterrupt:
+            print("Calibration cancelled.")
+        finally:
+            backend.close()
+        sys.exit(0)
+    if args.curves:
+        curves = compile_curves(axis_curve_settings(load_profile(args.calibration)))
+        run_curve_view(backend, [(axis, AXIS_NAMES.get(axis, f'Axis {axis}'), curve) for axis, curve in sorted(curves.items())])
         sys.exit(0)
 
-if __name__ == "__main__":
+    latency = LatencyMonitor() if args.latency or args.latency_readout or args.latency_dump else None
+    if args.headless:
+        backend = open_backend(args.replay, args.replay_speed, args.devices)
+        run_headless(args, backend, latency)
+        sys.exit(0)
     root = tk.Tk()
-    app = G920MasterApp(root)
+    backend = mapper = None
+    if args.mapper_process:
+        mapper = MapperProcess((root.winfo_screenwidth(), root.winfo_screenheight()), args.telemetry or BUS_PATH,
+                               input_mode=args.input_mode, mapping_path=args.mapping, steering_mode=args.steering,
+                               throttle_mode=args.throttle, record_path=args.record, replay=args.replay,
+                               replay_speed=args.replay_speed, devices=args.devices, latency=latency is not None,
+                               latency_dump=args.latency_dump, calibration_path=args.calibration)
+    else:
+        backend = open_backend(args.replay, args.replay_speed, args.devices)
+    app = G920MasterApp(root, input_mode=args.input_mode, mapping_path=args.mapping,
+                        steering_mode=args.steering, throttle_mode=args.throttle, backend=backend,
+                        record_path=args.record, latency=latency, latency_readout=args.latency_readout,
+                        latency_dump=args.latency_dump, gauge=args.gauge, telemetry_path=args.telemetry,
+                        mapper=mapper, calibration_path=args.calibration)
     root.protocol("WM_DELETE_WINDOW", app.stop)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,182 @@
+"""
+Dirty-checked drawing for the speedometer gauges.
+
+Every canvas or label call is a Tcl round trip and makes Tk redraw the window, which OBS then
+has to capture again. GaugeRenderer quantizes the speed to what the gauge can actually show,
+the fill arc to whole pixels along its length and the readout to one decimal, and only talks
+to Tk when one of those changes.
+
+SpriteGaugeRenderer draws the gauge with PIL instead of canvas primitives: the face is
+rendered once, supersampled for smooth edges, and each fill level becomes a complete frame
+image shown with a single canvas call. Frames are kept in a small LRU cache.
+"""
+import math
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont, ImageTk
+
+IDLE_UPDATE_MS = 100     # Gauge tick interval while the needle is at rest
+SPRITE_SUPERSAMPLE = 3   # The face and arc are drawn this many times larger, then scaled down
+SPRITE_CACHE_FRAMES = 24 # Frame images kept, about 1 MB each at the default canvas size
+SPRITE_EDGE_OVERLAP = 1  # Degrees each incremental update repaints past the old fill edge
+
+
+class GaugeRenderer:
+    def __init__(self, canvas, fill_arc, digital_label, max_speed, radius, arc_extent):
+        self.canvas = canvas
+        self.fill_arc = fill_arc
+        self.digital_label = digital_label
+        self.max_speed = max_speed
+        self.arc_extent = arc_extent
+        self.arc_pixels = max(1, round(radius * math.radians(arc_extent)))  # Length of the full arc
+        self._arc_step = None
+        self._text_step = None
+
+    def render(self, speed):
+        """ Shows `speed`. Returns True if anything on screen changed. """
+        ratio = max(0.0, min(speed / self.max_speed, 1.0)) if self.max_speed > 0 else 0.0
+        changed = False
+
+        arc_step = round(ratio * self.arc_pixels)
+        if arc_step != self._arc_step:
+            self._arc_step = arc_step
+            self.draw_arc(arc_step)
+            changed = True
+
+        text_step = round(speed * 10)
+        if text_step != self._text_step:
+            self._text_step = text_step
+            self.digital_label.config(text=f"{text_step / 10:.1f} m/s")
+            changed = True
+        return changed
+
+    def draw_arc(self, arc_step):
+        self.canvas.itemconfigure(self.fill_arc, extent=-arc_step * self.arc_extent / self.arc_pixels)
+
+
+def _load_font(name, size):
+    for candidate in (name, name.replace(' ', '').lower(), 'segoeui', 'arial', 'DejaVuSans'):
+        try:
+            return ImageFont.truetype(candidate + '.ttf' if not candidate.endswith('.ttf') else candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def _polar(center, radius, angle_deg):
+    """ Point on a circle, with Tk's angle convention (counter-clockwise from 3 o'clock). """
+    angle = math.radians(angle_deg)
+    return center + radius * math.cos(angle), center - radius * math.sin(angle)
+
+
+def render_gauge_face(size, radius, arc_width, max_speed, start_angle, arc_extent, colors, font, font_size):
+    """ The static gauge (background arc, ticks every 2 m/s and their numbers) as an RGB image,
+        laid out the same as the canvas version. `colors` has 'bg', 'arc_bg', 'tick' and 'number'. """
+    scale = SPRITE_SUPERSAMPLE
+    image = Image.new('RGB', (size * scale, size * scale), colors['bg'])
+    draw = ImageDraw.Draw(image)
+    center, r = size * scale / 2, radius * scale
+    # PIL draws wide arcs inward from the box, Tk centers them on the radius
+    outer = r + arc_width * scale / 2
+    box = (center - outer, center - outer, center + outer, center + outer)
+    # PIL angles run clockwise, Tk's counter-clockwise
+    draw.arc(box, -start_angle, -start_angle + arc_extent, fill=colors['arc_bg'], width=arc_width * scale)
+
+    number_font = _load_font(font, font_size * scale)
+    tick_length = 30 * scale
+    for speed in range(0, int(max_speed) + 1, 2):
+        angle = start_angle - speed / max_speed * arc_extent
+        draw.line([_polar(center, r, angle), _polar(center, r - tick_length, angle)], fill=colors['tick'], width=2 * scale)
+        draw.text(_polar(center, r + 25 * scale, angle), str(speed), fill=colors['number'], font=number_font, anchor='mm')
+    end_angle = start_angle - arc_extent
+    draw.line([_polar(center, r, end_angle), _polar(center, r - tick_length * 0.7, end_angle)],
+              fill=colors['tick'], width=2 * scale)
+    return image.resize((size, size), Image.LANCZOS)
+
+
+def render_fill_ring(size, radius, arc_width, start_angle, arc_extent, color):
+    """ The fill arc at full extent as an RGBA image, so partial fills are just masked copies. """
+    scale = SPRITE_SUPERSAMPLE
+    ring = Image.new('RGBA', (size * scale, size * scale), (0, 0, 0, 0))
+    center, outer = size * scale / 2, (radius + arc_width / 2) * scale
+    ImageDraw.Draw(ring).arc((center - outer, center - outer, center + outer, center + outer), -start_angle,
+                             -start_angle + arc_extent, fill=color, width=arc_width * scale)
+    return ring.resize((size, size), Image.LANCZOS)
+
+
+class SpriteGaugeRenderer(GaugeRenderer):
+    """ Shows the gauge as one canvas image that is swapped for each fill level.
+
+    A frame that isn't cached is built from the last one rendered by copying only the sector
+    between the two fill levels, from either the full or the empty gauge. So a miss while the
+    needle moves costs about as much as the needle moved, not a whole-gauge composite.
+    """
+    def __init__(self, canvas, digital_label, max_speed, size, radius, arc_width, start_angle, arc_extent,
+                 colors, font, font_size, cache_frames=SPRITE_CACHE_FRAMES):
+        self.face = render_gauge_face(size, radius, arc_width, max_speed, start_angle, arc_extent,
+                                      colors, font, font_size)
+        ring = render_fill_ring(size, radius, arc_width, start_angle, arc_extent, colors['fill'])
+        self.full = self.face.copy()
+        self.full.paste(ring, (0, 0), ring)
+        self.size = size
+        self.start_angle = start_angle
+        self.outer_radius = radius + arc_width / 2 + 1
+        self.inner_radius = radius - arc_width / 2 - 1
+        self.cache_frames = max(2, cache_frames)  # The frame on screen must never be evicted
+        self.frames = OrderedDict()               # arc step -> PhotoImage, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self._image = self.face.copy()            # Last rendered frame, and the step it shows
+        self._image_step = 0
+        image_item = canvas.create_image(0, 0, anchor='nw')
+        super().__init__(canvas, image_item, digital_label, max_speed, radius, arc_extent)
+
+    def draw_arc(self, arc_step):
+        frame = self.frames.get(arc_step)
+        if frame is not None:
+            self.frames.move_to_end(arc_step)
+            self.hits += 1
+        else:
+            frame = self.frames[arc_step] = ImageTk.PhotoImage(self._render_frame(arc_step))
+            self.misses += 1
+            if len(self.frames) > self.cache_frames:
+                self.frames.popitem(last=False)
+        self.canvas.itemconfigure(self.fill_arc, image=frame)
+
+    def _render_frame(self, arc_step):
+        # Updated in place, PhotoImage takes its own copy of the pixels
+        image = self._image
+        low, high = sorted((self._image_step, arc_step))
+        if low != high:
+            # PIL angles run clockwise from 3 o'clock, the fill grows clockwise from start_angle
+            degrees_per_step = self.arc_extent / self.arc_pixels
+            start = -self.start_angle + low * degrees_per_step
+            end = -self.start_angle + high * degrees_per_step
+            # Reach back a little over the old edge, which is already in the state being
+            # painted, so no pixels along it are left stale
+            if arc_step > self._image_step:
+                source = self.full
+                start = max(-self.start_angle, start - SPRITE_EDGE_OVERLAP)
+            else:
+                source = self.face
+                end = min(-self.start_angle + self.arc_extent, end + SPRITE_EDGE_OVERLAP)
+            box = self._sector_box(start, end)
+            wedge = Image.new('L', (box[2] - box[0], box[3] - box[1]), 0)
+            ImageDraw.Draw(wedge).pieslice((-box[0], -box[1], self.size - 1 - box[0], self.size - 1 - box[1]),
+                                           start, end, fill=255)
+            image.paste(source.crop(box), box[:2], wedge)
+        self._image_step = arc_step
+        return image
+
+    def _sector_box(self, start, end):
+        """ Pixel box around the part of the arc between two PIL angles. """
+        center = self.size / 2
+        angles = [start, end] + [a for a in range(math.ceil(start / 90) * 90, int(end) + 1, 90)]
+        xs, ys = [], []
+        for angle in angles:
+            cos, sin = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+            for r in (self.inner_radius, self.outer_radius):
+                xs.append(center + r * cos)
+                ys.append(center + r * sin)
+        return (max(0, int(min(xs)) - 1), max(0, int(min(ys)) - 1),
+                min(self.size, math.ceil(max(xs)) + 2), min(self.size, math.ceil(max(ys)) + 2))
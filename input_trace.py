@@ -0,0 +1,207 @@
+"""
+Compact binary joystick traces.
+
+A trace file is a fixed header followed by fixed-size samples, one per input change:
+
+    header: magic 'FXTR', format version, axis count, button count, hat count, device name
+    sample: timestamp in seconds, button bitmask, hat x, hat y, one float32 per axis
+
+A ring file (magic 'FXRB') has the same header and samples, plus a capacity and a running
+sample count right after the header. It is preallocated and memory-mapped by RingRecorder,
+which overwrites the oldest samples once it is full. Sample n lives in slot n % capacity.
+Other processes can map the same file and follow it live with RingReader.
+
+ReplayBackend (joystick_backend.py) plays either kind back in place of a real wheel.
+Run this file directly to print or follow one:
+
+    python input_trace.py session.ring --follow
+"""
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+TRACE_MAGIC = b'FXTR'
+RING_MAGIC = b'FXRB'
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct('<4sHHHH32s')
+RING_CAPACITY = struct.Struct('<I')
+RING_CAPACITY_OFFSET = TRACE_HEADER.size
+RING_COUNT = struct.Struct('<Q')
+RING_COUNT_OFFSET = RING_CAPACITY_OFFSET + RING_CAPACITY.size  # 8-byte aligned
+RING_HEADER_SIZE = RING_COUNT_OFFSET + RING_COUNT.size
+
+TraceInfo = namedtuple('TraceInfo', 'num_axes num_buttons num_hats name')
+
+
+def sample_struct(num_axes):
+    """ Layout of one sample: timestamp, button mask, hat x, hat y, axes. """
+    return struct.Struct(f'<dQbb{num_axes}f')
+
+
+def pack_header(num_axes, num_buttons, num_hats, name='', magic=TRACE_MAGIC):
+    return TRACE_HEADER.pack(magic, TRACE_VERSION, num_axes, num_buttons, num_hats,
+                             name.encode('utf-8')[:32])
+
+
+def unpack_header(data):
+    magic, version, num_axes, num_buttons, num_hats, name = TRACE_HEADER.unpack_from(data)
+    if magic not in (TRACE_MAGIC, RING_MAGIC):
+        raise ValueError("not an input trace file")
+    if version != TRACE_VERSION:
+        raise ValueError(f"unsupported trace version {version}")
+    return TraceInfo(num_axes, num_buttons, num_hats, name.rstrip(b'\0').decode('utf-8', 'replace'))
+
+
+class TraceWriter:
+    """ Appends samples to a trace file. Meant for offline use (synthetic traces, conversions),
+        the live recorder doesn't do Python file I/O per sample. """
+    def __init__(self, path, num_axes, num_buttons, num_hats, name=''):
+        self.sample = sample_struct(num_axes)
+        self.file = open(path, 'wb')
+        self.file.write(pack_header(num_axes, num_buttons, num_hats, name))
+
+    def write(self, timestamp, button_mask, hat, axes):
+        self.file.write(self.sample.pack(timestamp, button_mask, hat[0], hat[1], *axes))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RingRecorder:
+    """ Records samples into a preallocated, memory-mapped ring file.
+
+    record() only packs into the mapping: no Python file I/O, nothing that outlives the
+    call and no growth however long the session runs. The OS writes the pages back in the
+    background. The sample is written before the count that publishes it, so a reader
+    never sees a slot counted that hasn't been filled in.
+    """
+    def __init__(self, path, num_axes, num_buttons, num_hats, name='', capacity=1 << 20):
+        self.sample = sample_struct(num_axes)
+        self.capacity = capacity
+        self.count = 0
+        size = RING_HEADER_SIZE + capacity * self.sample.size
+        with open(path, 'w+b') as f:
+            f.truncate(size)
+            self.buffer = mmap.mmap(f.fileno(), size)
+        self.buffer[:TRACE_HEADER.size] = pack_header(num_axes, num_buttons, num_hats, name, RING_MAGIC)
+        RING_CAPACITY.pack_into(self.buffer, RING_CAPACITY_OFFSET, capacity)
+        RING_COUNT.pack_into(self.buffer, RING_COUNT_OFFSET, 0)
+        self._pack_sample = self.sample.pack_into
+        self._pack_count = RING_COUNT.pack_into
+        self._sample_size = self.sample.size
+
+    def record(self, timestamp, button_mask, hat, axes):
+        count = self.count
+        self._pack_sample(self.buffer, RING_HEADER_SIZE + (count % self.capacity) * self._sample_size,
+                          timestamp, button_mask, hat[0], hat[1], *axes)
+        self.count = count + 1
+        self._pack_count(self.buffer, RING_COUNT_OFFSET, count + 1)
+
+    def close(self):
+        if not self.buffer.closed:
+            self.buffer.flush()
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RingReader:
+    """ Follows a ring file while another process records into it. """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.info = unpack_header(self.buffer)
+        if self.buffer[:4] != RING_MAGIC:
+            raise ValueError("not a ring trace file")
+        self.sample = sample_struct(self.info.num_axes)
+        self.capacity, = RING_CAPACITY.unpack_from(self.buffer, RING_CAPACITY_OFFSET)
+        self.position = 0  # Count of the next sample to read
+        self.dropped = 0   # Samples overwritten before they were read
+
+    def written(self):
+        return RING_COUNT.unpack_from(self.buffer, RING_COUNT_OFFSET)[0]
+
+    def read(self):
+        """ Returns the samples recorded since the last call, oldest first. """
+        count = self.written()
+        oldest = max(self.position, count - self.capacity)
+        self.dropped += oldest - self.position
+        samples = [self.sample.unpack_from(self.buffer, RING_HEADER_SIZE + (n % self.capacity) * self.sample.size)
+                   for n in range(oldest, count)]
+        # Anything the writer lapped while we were copying is garbage, including the slot it
+        # may be halfway through right now
+        overwritten = self.written() + 1 - self.capacity - oldest
+        if overwritten > 0:
+            del samples[:overwritten]
+            self.dropped += overwritten
+        self.position = count
+        return samples
+
+    def close(self):
+        self.buffer.close()
+
+
+def open_trace(path):
+    """ Returns (TraceInfo, iterator of (timestamp, button_mask, hat_x, hat_y, *axes) tuples).
+        The file is memory-mapped, so long traces don't have to fit in memory. Ring files are
+        read oldest sample first, as they were when opened. """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    info = unpack_header(data)
+    sample = sample_struct(info.num_axes)
+    if data[:4] == RING_MAGIC:
+        capacity, = RING_CAPACITY.unpack_from(data, RING_CAPACITY_OFFSET)
+        count, = RING_COUNT.unpack_from(data, RING_COUNT_OFFSET)
+        body = memoryview(data)[RING_HEADER_SIZE:RING_HEADER_SIZE + capacity * sample.size]
+        if count <= capacity:
+            return info, sample.iter_unpack(body[:count * sample.size])
+        split = (count % capacity) * sample.size
+        return info, itertools.chain(sample.iter_unpack(body[split:]), sample.iter_unpack(body[:split]))
+    body = memoryview(data)[TRACE_HEADER.size:]
+    body = body[:len(body) - len(body) % sample.size]
+    return info, sample.iter_unpack(body)
+
+
+def _format_sample(sample):
+    timestamp, button_mask, hat_x, hat_y = sample[:4]
+    axes = ' '.join(f'{value:+.3f}' for value in sample[4:])
+    return f"{timestamp:12.4f}  buttons {button_mask:#06x}  hat ({hat_x:+d},{hat_y:+d})  axes {axes}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a recorded input trace")
+    parser.add_argument('path', help="trace or ring file")
+    parser.add_argument('--follow', action='store_true', help="keep printing samples as a live recorder writes them")
+    parser.add_argument('--interval', type=float, default=0.1, help="seconds between checks with --follow")
+    args = parser.parse_args()
+
+    if args.follow:
+        reader = RingReader(args.path)
+        print(f"{reader.info.name}: {reader.info.num_axes} axes, ring of {reader.capacity} samples")
+        try:
+            while True:
+                for sample in reader.read():
+                    print(_format_sample(sample))
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print(f"{reader.position} samples written, {reader.dropped} overwritten before they were read")
+    else:
+        info, samples = open_trace(args.path)
+        print(f"{info.name}: {info.num_axes} axes, {info.num_buttons} buttons, {info.num_hats} hats, "
+              f"{os.path.getsize(args.path)} bytes")
+        for sample in samples:
+            print(_format_sample(sample))
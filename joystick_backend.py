@@ -0,0 +1,659 @@
+"""
+Joystick backends for the mapper and the speedometer.
+
+Both scripts read a device through the same small interface: the get_* methods pygame's
+Joystick already has, pump() for polling loops and wait_events() for the event-driven loop.
+PygameBackend wraps a real device and reopens it when it is unplugged and plugged back in.
+FusedBackend merges several joysticks (wheel, separate pedals, a button box...) into one
+logical device. ReplayBackend plays back a trace file (input_trace.py),
+so the whole pipeline can run on a machine with no wheel plugged in. TelemetryBackend follows
+the snapshot another process publishes on a telemetry bus (telemetry_bus.py).
+"""
+import json
+import os
+import time
+from collections import namedtuple
+
+import pygame
+
+from input_trace import open_trace
+from telemetry_bus import TelemetryReader
+
+# InputEvent types
+AXIS_MOTION = 0
+BUTTON_DOWN = 1
+BUTTON_UP = 2
+HAT_MOTION = 3
+
+InputEvent = namedtuple('InputEvent', 'type index value')
+
+BUS_POLL_INTERVAL = 0.002  # Seconds between checks of a telemetry bus for a new snapshot
+RECONNECT_BACKOFF_MIN = 0.05  # Seconds before the first retry to reopen a lost device
+RECONNECT_BACKOFF_MAX = 2.0   # Longest gap between retries
+
+DEVICE_EVENT_TYPES = [pygame.JOYDEVICEADDED, pygame.JOYDEVICEREMOVED]
+PYGAME_EVENT_TYPES = [pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYHATMOTION] + DEVICE_EVENT_TYPES
+
+
+class JoystickBackend:
+    """ Interface shared by all backends. State getters follow pygame's Joystick.
+        `connected` is False while the device is unplugged, the getters mean nothing then. """
+    connected = True
+
+    def get_name(self):
+        raise NotImplementedError
+
+    def get_numaxes(self):
+        raise NotImplementedError
+
+    def get_numbuttons(self):
+        raise NotImplementedError
+
+    def get_numhats(self):
+        raise NotImplementedError
+
+    def get_axis(self, i):
+        raise NotImplementedError
+
+    def get_button(self, i):
+        raise NotImplementedError
+
+    def get_hat(self, i):
+        raise NotImplementedError
+
+    def start_events(self):
+        """ Called once from the thread that will call wait_events(). """
+
+    def pump(self):
+        """ Brings the get_* state up to date, for polling loops. """
+
+    def wait_events(self, timeout_ms):
+        """ Blocks for up to timeout_ms and returns the InputEvents that arrived (may be empty). """
+        raise NotImplementedError
+
+    def mark_lost(self):
+        """ Called when reading the device failed. Backends that can reopen it do so later. """
+
+    def close(self):
+        pass
+
+
+def _matches(joystick, match):
+    """ True if `match` is the joystick's GUID or part of its name (case-insensitive). """
+    guid = joystick.get_guid() if hasattr(joystick, 'get_guid') else None
+    return guid == match or match.lower() in joystick.get_name().lower()
+
+
+class PygameBackend(JoystickBackend):
+    """ A pygame joystick. When it is unplugged, `connected` drops to False and it is
+        reopened, by GUID or else by name, as soon as pygame reports a matching device again.
+        Retries back off from RECONNECT_BACKOFF_MIN to RECONNECT_BACKOFF_MAX in case the
+        device shows up but can't be opened yet.
+
+        Without a joystick, the backend starts out disconnected and attaches to the first
+        device that `match` finds (as for find()) once it is plugged in. """
+    def __init__(self, joystick=None, match=None):
+        self.match = match  # Set until a device that wasn't there at start has been found
+        self.exclude = ()   # Instance ids other backends have open, never taken for this device
+        self._backoff = RECONNECT_BACKOFF_MIN
+        self._retry_at = None
+        if joystick is None:
+            self.name = match
+            self.guid = None
+            self.instance_id = None
+            self.connected = False
+            self._retry_at = time.monotonic()
+            return
+        self._attach(joystick)
+        self.name = joystick.get_name()
+        self.guid = joystick.get_guid() if hasattr(joystick, 'get_guid') else None
+        self.connected = True
+
+    def _attach(self, joystick):
+        self.joystick = joystick
+        self.instance_id = joystick.get_instance_id()
+        # The state getters go straight to pygame
+        self.get_name = joystick.get_name
+        self.get_numaxes = joystick.get_numaxes
+        self.get_numbuttons = joystick.get_numbuttons
+        self.get_numhats = joystick.get_numhats
+        self.get_axis = joystick.get_axis
+        self.get_button = joystick.get_button
+        self.get_hat = joystick.get_hat
+
+    @classmethod
+    def open(cls, index):
+        """ Initializes pygame and opens the joystick at `index`. Returns None if there isn't one. """
+        # Keep joystick events flowing while the game window has focus
+        os.environ.setdefault('SDL_JOYSTICK_ALLOW_BACKGROUND_EVENTS', '1')
+        pygame.init()
+        pygame.joystick.init()
+
+        if pygame.joystick.get_count() == 0:
+            print("Error: No joystick found. Please ensure your controller is plugged in and recognized.")
+            return None
+        try:
+            joystick = pygame.joystick.Joystick(index)
+            joystick.init()
+        except pygame.error as e:
+            print(f"Error initializing joystick at index {index}: {e}")
+            return None
+        print(f"Connected to: {joystick.get_name()}")
+        print(f"Number of Axes: {joystick.get_numaxes()}, Number of Buttons: {joystick.get_numbuttons()}, Number of Hats: {joystick.get_numhats()}")
+        return cls(joystick)
+
+    @classmethod
+    def find(cls, match, exclude=()):
+        """ Opens the first device whose GUID is `match` or whose name contains it (case-insensitive),
+            skipping the instance ids in `exclude`. Returns None if there is no such device. """
+        for index in range(pygame.joystick.get_count()):
+            try:
+                joystick = pygame.joystick.Joystick(index)
+                joystick.init()
+            except pygame.error:
+                continue
+            if joystick.get_instance_id() not in exclude and _matches(joystick, match):
+                return cls(joystick)
+        return None
+
+    def start_events(self):
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(PYGAME_EVENT_TYPES)
+
+    def pump(self):
+        for event in pygame.event.get(DEVICE_EVENT_TYPES):
+            self._device_event(event)
+        self._retry_if_due()
+
+    def wait_events(self, timeout_ms):
+        if not self.connected and self._retry_at is not None:
+            timeout_ms = max(1, min(timeout_ms, round((self._retry_at - time.monotonic()) * 1000)))
+        event = pygame.event.wait(timeout_ms)
+        if event.type == pygame.NOEVENT:
+            self._retry_if_due()
+            return []
+        events = []
+        for event in [event] + pygame.event.get():
+            if event.type in DEVICE_EVENT_TYPES:
+                self._device_event(event)
+                continue
+            if not self.connected or getattr(event, 'instance_id', self.instance_id) != self.instance_id:
+                continue
+            if event.type == pygame.JOYAXISMOTION:
+                events.append(InputEvent(AXIS_MOTION, event.axis, event.value))
+            elif event.type == pygame.JOYBUTTONDOWN:
+                events.append(InputEvent(BUTTON_DOWN, event.button, 1))
+            elif event.type == pygame.JOYBUTTONUP:
+                events.append(InputEvent(BUTTON_UP, event.button, 0))
+            elif event.type == pygame.JOYHATMOTION:
+                events.append(InputEvent(HAT_MOTION, event.hat, event.value))
+        return events
+
+    def _device_event(self, event):
+        if event.type == pygame.JOYDEVICEREMOVED:
+            if self.connected and event.instance_id == self.instance_id:
+                print(f"Joystick disconnected: {self.name}")
+                self.mark_lost()
+        elif event.type == pygame.JOYDEVICEADDED and not self.connected:
+            self._reopen([event.device_index])
+
+    def mark_lost(self):
+        if not self.connected:
+            return
+        self.connected = False
+        try:
+            self.joystick.quit()
+        except pygame.error:
+            pass
+        self._backoff = RECONNECT_BACKOFF_MIN
+        self._retry_at = time.monotonic() + self._backoff
+
+    def _retry_if_due(self):
+        """ Rescans for the device in case its JOYDEVICEADDED was missed or it couldn't be opened. """
+        if not self.connected and time.monotonic() >= self._retry_at:
+            if not self._reopen(range(pygame.joystick.get_count())):
+                self._backoff = min(self._backoff * 2, RECONNECT_BACKOFF_MAX)
+                self._retry_at = time.monotonic() + self._backoff
+
+    def _reopen(self, device_indices):
+        """ Reattaches to the first of `device_indices` that is this device. Returns True on success. """
+        by_name = None
+        for index in device_indices:
+            try:
+                joystick = pygame.joystick.Joystick(index)
+                joystick.init()
+            except pygame.error:
+                continue
+            if joystick.get_instance_id() in self.exclude:
+                continue
+            if self.match is not None:
+                if _matches(joystick, self.match):
+                    break
+                continue
+            if self.guid is not None and hasattr(joystick, 'get_guid') and joystick.get_guid() == self.guid:
+                break
+            if by_name is None and joystick.get_name() == self.name:
+                by_name = joystick
+        else:
+            joystick = by_name
+            if joystick is None:
+                return False
+        self._attach(joystick)
+        self.connected = True
+        if self.match is not None:
+            self.match = None
+            self.name = joystick.get_name()
+            self.guid = joystick.get_guid() if hasattr(joystick, 'get_guid') else None
+            print(f"Joystick connected: {self.name}")
+        else:
+            print(f"Joystick reconnected: {self.name}")
+        return True
+
+    def close(self):
+        if pygame.joystick.get_init():
+            pygame.joystick.quit()
+
+
+class FusedDevice:
+    """ One member of a FusedBackend: a device, its entry in the layout and where its inputs go
+        in the logical device. The routes map a device index to a logical index. While the
+        device isn't plugged in its axes read as `rest` (device axis -> value, 0.0 if not given). """
+    def __init__(self, backend, entry):
+        self.backend = backend
+        self.entry = entry
+        self.rest = {int(device_index): value for device_index, value in entry.get('rest', {}).items()}
+        self.down = set()  # Device buttons currently pressed
+        self.route()
+
+    def route(self, limits=(None, None, None)):
+        """ Builds the routes from the layout entry. An omitted route table needs the device's
+            own counts, so it stays empty until the device is attached; `limits` (logical axes,
+            buttons, hats) then cuts it to the logical device. """
+        backend = self.backend
+        counts = ((backend.get_numaxes(), backend.get_numbuttons(), backend.get_numhats())
+                  if backend.connected else (0, 0, 0))
+        routes = []
+        for kind, count, limit in zip(('axes', 'buttons', 'hats'), counts, limits):
+            table = _routes(self.entry.get(kind), count)
+            if limit is not None:
+                table = {device_index: logical for device_index, logical in table.items() if logical < limit}
+            routes.append(table)
+        self.axes, self.buttons, self.hats = routes
+        self.routed = backend.connected
+
+
+def _routes(spec, count):
+    """ A route table from a device entry: omitted means every index maps to itself. """
+    if spec is None:
+        return {i: i for i in range(count)}
+    return {int(device_index): logical for device_index, logical in spec.items()}
+
+
+class FusedBackend(JoystickBackend):
+    """ Several joysticks read as one logical device.
+
+    A device layout file names each device and routes its axes, buttons and hats to logical
+    indices, so e.g. separate pedals can feed the accelerator and brake axes the mapper expects
+    and a button box can add buttons 16 and up. A logical button is down while any button
+    routed to it is; an axis or hat takes the value of whichever device moved it last.
+
+    All devices share pygame's one event queue, so a single wait_events() serves them all:
+    more hardware means more entries in a dict lookup, not more threads or polling loops.
+    The logical device is sized from the whole layout, and a member that is unplugged, or
+    wasn't there at start, reads as at rest: its axes at their `rest` values, its buttons up
+    and its hats centered. The others keep working, and each member is picked up on its own
+    when it is plugged in (see PygameBackend). The whole device only counts as disconnected
+    while every member is.
+    """
+    def __init__(self, members):
+        self.members = members
+        self.num_axes = max([logical + 1 for member in members for logical in member.axes.values()] + [0])
+        self.num_buttons = max([logical + 1 for member in members for logical in member.buttons.values()] + [0])
+        self.num_hats = max([logical + 1 for member in members for logical in member.hats.values()] + [0])
+        if self.num_buttons > 64:
+            raise ValueError("logical buttons must be numbered below 64")
+        self.axes = [0.0] * self.num_axes
+        self.hats = [(0, 0)] * self.num_hats
+        self.button_counts = [0] * self.num_buttons  # Pressed device buttons routed to each logical one
+        self._by_instance = {}
+        self._refresh()
+
+    @classmethod
+    def open(cls, path):
+        """ Initializes pygame and opens every device in the layout file at `path` that is plugged
+            in, the others are picked up later. Returns None if none of them are plugged in. """
+        with open(path) as f:
+            layout = json.load(f)
+        os.environ.setdefault('SDL_JOYSTICK_ALLOW_BACKGROUND_EVENTS', '1')
+        pygame.init()
+        pygame.joystick.init()
+
+        members = []
+        for entry in layout['devices']:
+            backend = PygameBackend.find(entry['match'], {member.backend.instance_id for member in members
+                                                          if member.backend.connected})
+            if backend is None:
+                print(f"Device '{entry['match']}' from {path} not found, it reads as at rest until it is plugged in")
+                backend = PygameBackend(match=entry['match'])
+            else:
+                print(f"Connected to: {backend.name}")
+            members.append(FusedDevice(backend, entry))
+        if not any(member.backend.connected for member in members):
+            print(f"Error: None of the devices in {path} are plugged in.")
+            return None
+        fused = cls(members)
+        print(f"Logical device '{layout.get('name', path)}': {fused.num_axes} axes, "
+              f"{fused.num_buttons} buttons, {fused.num_hats} hats from {len(members)} devices")
+        return fused
+
+    @property
+    def connected(self):
+        return any(member.backend.connected for member in self.members)
+
+    def get_name(self):
+        return ' + '.join(member.backend.name for member in self.members)
+
+    def get_numaxes(self):
+        return self.num_axes
+
+    def get_numbuttons(self):
+        return self.num_buttons
+
+    def get_numhats(self):
+        return self.num_hats
+
+    def get_axis(self, i):
+        return self.axes[i]
+
+    def get_button(self, i):
+        return 1 if self.button_counts[i] else 0
+
+    def get_hat(self, i):
+        return self.hats[i]
+
+    def _refresh(self):
+        """ Re-reads every member, for polling and after a member comes or goes. Members that
+            aren't connected read as at rest. Returns the events that lead to the new state. """
+        limits = (self.num_axes, self.num_buttons, self.num_hats)
+        readings = []
+        for member in self.members:
+            backend = member.backend
+            if backend.connected:
+                try:
+                    if not member.routed:
+                        member.route(limits)
+                    readings.append((member,
+                                     [(logical, backend.get_axis(device_index)) for device_index, logical in member.axes.items()],
+                                     [(logical, backend.get_hat(device_index)) for device_index, logical in member.hats.items()],
+                                     {device_index for device_index in member.buttons if backend.get_button(device_index)}))
+                    continue
+                except pygame.error:
+                    backend.mark_lost()
+            member.down = set()
+
+        axes = list(self.axes)
+        hats = list(self.hats)
+        for member in self.members:
+            if not member.backend.connected:
+                for device_index, logical in member.axes.items():
+                    axes[logical] = member.rest.get(device_index, 0.0)
+                for logical in member.hats.values():
+                    hats[logical] = (0, 0)
+        # Connected members go last, so an axis shared with an absent device follows the live one
+        for member, member_axes, member_hats, down in readings:
+            for logical, value in member_axes:
+                axes[logical] = value
+            for logical, value in member_hats:
+                hats[logical] = value
+            member.down = down
+        counts = [0] * self.num_buttons
+        for member in self.members:
+            for device_index in member.down:
+                counts[member.buttons[device_index]] += 1
+
+        events = []
+        for i, count in enumerate(counts):
+            if bool(count) != bool(self.button_counts[i]):
+                events.append(InputEvent(BUTTON_DOWN if count else BUTTON_UP, i, 1 if count else 0))
+        for i, value in enumerate(axes):
+            if value != self.axes[i]:
+                events.append(InputEvent(AXIS_MOTION, i, value))
+        for i, value in enumerate(hats):
+            if value != self.hats[i]:
+                events.append(InputEvent(HAT_MOTION, i, value))
+        self.axes = axes
+        self.hats = hats
+        self.button_counts = counts
+        self._by_instance = {member.backend.instance_id: member for member in self.members if member.backend.connected}
+        claimed = frozenset(self._by_instance)
+        for member in self.members:
+            member.backend.exclude = claimed
+        return events
+
+    def _device_event(self, event):
+        """ Passes a device event to every member. Returns the events it led to. """
+        was_connected = [member.backend.connected for member in self.members]
+        for member in self.members:
+            member.backend._device_event(event)
+        if was_connected != [member.backend.connected for member in self.members]:
+            return self._refresh()
+        return []
+
+    def _retry_lost(self):
+        """ Gives members that aren't connected a chance to reopen. Returns the events that led to. """
+        lost = [member for member in self.members if not member.backend.connected]
+        for member in lost:
+            member.backend._retry_if_due()
+        if any(member.backend.connected for member in lost):
+            return self._refresh()
+        return []
+
+    def start_events(self):
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(PYGAME_EVENT_TYPES)
+
+    def pump(self):
+        for event in pygame.event.get(DEVICE_EVENT_TYPES):
+            self._device_event(event)
+        self._retry_lost()
+        self._refresh()
+
+    def wait_events(self, timeout_ms):
+        retries = [member.backend._retry_at for member in self.members if not member.backend.connected]
+        if retries:
+            timeout_ms = max(1, min(timeout_ms, round((min(retries) - time.monotonic()) * 1000)))
+        event = pygame.event.wait(timeout_ms)
+        if event.type == pygame.NOEVENT:
+            return self._retry_lost()
+        events = []
+        for event in [event] + pygame.event.get():
+            if event.type in DEVICE_EVENT_TYPES:
+                events.extend(self._device_event(event))
+                continue
+            member = self._by_instance.get(getattr(event, 'instance_id', None))
+            if member is None:
+                continue
+            if event.type == pygame.JOYAXISMOTION:
+                logical = member.axes.get(event.axis)
+                if logical is not None:
+                    self.axes[logical] = event.value
+                    events.append(InputEvent(AXIS_MOTION, logical, event.value))
+            elif event.type == pygame.JOYBUTTONDOWN:
+                logical = member.buttons.get(event.button)
+                if logical is not None and event.button not in member.down:
+                    member.down.add(event.button)
+                    self.button_counts[logical] += 1
+                    if self.button_counts[logical] == 1:
+                        events.append(InputEvent(BUTTON_DOWN, logical, 1))
+            elif event.type == pygame.JOYBUTTONUP:
+                logical = member.buttons.get(event.button)
+                if logical is not None and event.button in member.down:
+                    member.down.discard(event.button)
+                    self.button_counts[logical] -= 1
+                    if self.button_counts[logical] == 0:
+                        events.append(InputEvent(BUTTON_UP, logical, 0))
+            elif event.type == pygame.JOYHATMOTION:
+                logical = member.hats.get(event.hat)
+                if logical is not None:
+                    self.hats[logical] = event.value
+                    events.append(InputEvent(HAT_MOTION, logical, event.value))
+        return events
+
+    def close(self):
+        if pygame.joystick.get_init():
+            pygame.joystick.quit()
+
+
+class SampleBackend(JoystickBackend):
+    """ A device whose state comes in as whole samples (timestamp, button mask, hat x, hat y,
+        axes...) rather than events. Needs `info`, a TraceInfo. """
+    def __init__(self):
+        self.axes = [0.0] * self.info.num_axes
+        self.button_mask = 0
+        self.hat = (0, 0)
+
+    def get_numaxes(self):
+        return self.info.num_axes
+
+    def get_numbuttons(self):
+        return self.info.num_buttons
+
+    def get_numhats(self):
+        return self.info.num_hats
+
+    def get_axis(self, i):
+        return self.axes[i]
+
+    def get_button(self, i):
+        return (self.button_mask >> i) & 1
+
+    def get_hat(self, i):
+        if i >= self.info.num_hats:
+            raise IndexError(i)
+        return self.hat
+
+    def _apply(self, sample):
+        """ Makes `sample` the current state and returns the events that lead to it. """
+        _, button_mask, hat_x, hat_y = sample[:4]
+        events = []
+
+        changed = button_mask ^ self.button_mask
+        while changed:
+            bit = changed & -changed
+            index = bit.bit_length() - 1
+            events.append(InputEvent(BUTTON_DOWN if button_mask & bit else BUTTON_UP, index, 1 if button_mask & bit else 0))
+            changed ^= bit
+        self.button_mask = button_mask
+
+        axes = self.axes
+        for i, value in enumerate(sample[4:]):
+            if value != axes[i]:
+                axes[i] = value
+                events.append(InputEvent(AXIS_MOTION, i, value))
+
+        if (hat_x, hat_y) != self.hat:
+            self.hat = (hat_x, hat_y)
+            events.append(InputEvent(HAT_MOTION, 0, self.hat))
+        return events
+
+
+class ReplayBackend(SampleBackend):
+    """ Plays back a recorded trace as if it were a device.
+
+    speed scales the trace's timing (2.0 plays twice as fast). speed=0 plays samples back to
+    back as fast as they are consumed, for benchmarks. Each wait_events() call applies one
+    sample and returns the events it implies, the same as a burst from pygame.
+    """
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.finished = False
+        self._open()
+        super().__init__()
+        print(f"Replaying {path} ({self.info.name or 'unnamed device'}) at {f'{speed}x' if speed > 0 else 'full'} speed")
+
+    def _open(self):
+        self.info, self._samples = open_trace(self.path)
+        self._pending = next(self._samples, None)
+        self._trace_start = self._pending[0] if self._pending else 0.0
+        self._wall_start = None
+
+    def get_name(self):
+        return f"Replay: {self.info.name}"
+
+    def _due_in(self, sample):
+        """ Seconds until `sample` should be played. """
+        if self.speed <= 0:
+            return 0.0
+        if self._wall_start is None:
+            self._wall_start = time.monotonic()
+        return self._wall_start + (sample[0] - self._trace_start) / self.speed - time.monotonic()
+
+    def _next(self):
+        sample = self._pending
+        self._pending = next(self._samples, None)
+        if self._pending is None and self.loop:
+            self._open()
+        elif self._pending is None:
+            self.finished = True
+        return sample
+
+    def pump(self):
+        if self.speed <= 0:
+            # Flat out: every poll consumes exactly one sample
+            if self._pending is not None:
+                self._apply(self._next())
+            return
+        while self._pending is not None and self._due_in(self._pending) <= 0:
+            self._apply(self._next())
+
+    def wait_events(self, timeout_ms):
+        if self._pending is None:
+            time.sleep(timeout_ms / 1000)
+            return []
+        delay = self._due_in(self._pending)
+        if delay > timeout_ms / 1000:
+            time.sleep(timeout_ms / 1000)
+            return []
+        if delay > 0:
+            time.sleep(delay)
+        return self._apply(self._next())
+
+
+class TelemetryBackend(SampleBackend):
+    """ Reads the device state another process publishes on a telemetry bus, so a second
+        script can follow the wheel without opening it. The bus has no event queue:
+        wait_events() checks its sequence every BUS_POLL_INTERVAL and returns the events
+        between the last snapshot and the newest one. """
+    def __init__(self, path):
+        self.reader = TelemetryReader(path)
+        self.info = self.reader.info
+        self.snapshot = None  # Newest Snapshot read, with the publisher's derived values
+        super().__init__()
+        print(f"Following telemetry bus {path} ({self.info.name or 'unnamed device'})")
+
+    def get_name(self):
+        return f"Telemetry: {self.info.name}"
+
+    def _update(self):
+        snapshot = self.reader.read()
+        if snapshot is None or snapshot is self.snapshot:
+            return []
+        self.snapshot = snapshot
+        return self._apply((snapshot.timestamp, snapshot.button_mask, *snapshot.hat, *snapshot.axes))
+
+    def pump(self):
+        self._update()
+
+    def wait_events(self, timeout_ms):
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            events = self._update()
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            time.sleep(min(BUS_POLL_INTERVAL, remaining))
+
+    def close(self):
+        self.reader.close()
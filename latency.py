@@ -0,0 +1,139 @@
+"""
+Input latency instrumentation.
+
+The input thread stamps each burst of joystick input with a monotonic clock when it is read,
+and records how long it took from there to the mapping decision, to the injected key/mouse
+events and to the Tk thread showing the result. Loop jitter is how late the loop wakes up
+compared to the timeout it asked for (the poll sleep or the next timer deadline).
+
+Each figure goes into a LatencyHistogram: fixed log-scaled buckets, so recording is a few
+integer operations and memory stays constant. Histograms roll over every `window` seconds and
+report the last one to two windows, so the numbers follow what the mapper is doing now
+rather than averaging in the start of the session. The maximum is kept for the whole session.
+"""
+import json
+
+SUB_BUCKET_BITS = 5                  # 32 buckets per power of two, about 3% resolution
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 26                    # Values above ~2^31 us (36 minutes) share the last bucket
+NUM_BUCKETS = SUB_BUCKETS * (MAX_EXPONENT + 2)
+LATENCY_WINDOW = 10.0                # Seconds per histogram generation
+
+
+def bucket_index(us):
+    """ Bucket for a value in whole microseconds. Exact below 64 us, log-linear above. """
+    if us < 2 * SUB_BUCKETS:
+        return us if us > 0 else 0
+    exponent = us.bit_length() - SUB_BUCKET_BITS - 1
+    if exponent > MAX_EXPONENT:
+        return NUM_BUCKETS - 1
+    return SUB_BUCKETS * (exponent + 1) + (us >> exponent) - SUB_BUCKETS
+
+
+def bucket_value(index):
+    """ Middle of a bucket's range, in microseconds. """
+    if index < 2 * SUB_BUCKETS:
+        return index
+    exponent = index // SUB_BUCKETS - 1
+    low = (index % SUB_BUCKETS + SUB_BUCKETS) << exponent
+    return low + ((1 << exponent) - 1) / 2
+
+
+class LatencyHistogram:
+    """ Rolling latency histogram. record() must only be called from one thread. """
+    def __init__(self, name, window=LATENCY_WINDOW):
+        self.name = name
+        self.window = window
+        self.counts = [0] * NUM_BUCKETS     # Current generation
+        self.previous = [0] * NUM_BUCKETS   # The one before, still reported
+        self.window_end = None
+        self.total = 0                      # Whole session
+        self.max = 0.0                      # Whole session, in seconds
+
+    def record(self, seconds, now):
+        if self.window_end is None:
+            self.window_end = now + self.window
+        elif now >= self.window_end:
+            self._roll(now)
+        if seconds < 0.0:
+            seconds = 0.0
+        self.counts[bucket_index(int(seconds * 1000000))] += 1
+        self.total += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def _roll(self, now):
+        # Reuse the old list instead of allocating, this runs on the input thread
+        previous = self.previous
+        for i in range(NUM_BUCKETS):
+            previous[i] = 0
+        self.previous, self.counts = self.counts, previous
+        if now >= self.window_end + self.window:
+            # Nothing recorded for a whole window, the previous generation is stale too
+            for i in range(NUM_BUCKETS):
+                self.previous[i] = 0
+        self.window_end = now + self.window
+
+    def percentiles(self, *fractions):
+        """ Returns the given percentiles (0.5 for p50) of the recent windows, in seconds. """
+        counts = [a + b for a, b in zip(self.counts, self.previous)]
+        count = sum(counts)
+        if not count:
+            return [None] * len(fractions)
+        results = []
+        for fraction in fractions:
+            target = max(1, fraction * count)
+            seen = 0
+            for index, bucket_count in enumerate(counts):
+                seen += bucket_count
+                if seen >= target:
+                    results.append(min(bucket_value(index) / 1000000, self.max))
+                    break
+        return results
+
+    def summary(self):
+        p50, p99 = self.percentiles(0.5, 0.99)
+        return {'count': self.total, 'p50': p50, 'p99': p99, 'max': self.max if self.total else None}
+
+
+def _ms(seconds):
+    return '-' if seconds is None else f"{seconds * 1000:.2f}"
+
+
+class LatencyMonitor:
+    """ The mapper's latency histograms, one per stage.
+
+    decision:  input read -> bindings and axis handlers done
+    injection: input read -> key/mouse events injected (only bursts that injected something)
+    ui:        input read -> Tk thread applied the change (recorded on the Tk thread)
+    loop:      how late the input loop woke up after its timeout
+    """
+    def __init__(self, window=LATENCY_WINDOW):
+        self.decision = LatencyHistogram('read -> decision', window)
+        self.injection = LatencyHistogram('read -> injection', window)
+        self.ui = LatencyHistogram('read -> UI update', window)
+        self.loop = LatencyHistogram('loop jitter', window)
+        self.histograms = [self.decision, self.injection, self.ui, self.loop]
+
+    def report(self):
+        lines = [f"{'stage':<20}{'count':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for histogram in self.histograms:
+            stats = histogram.summary()
+            lines.append(f"{histogram.name:<20}{stats['count']:>9}{_ms(stats['p50']):>10}"
+                         f"{_ms(stats['p99']):>10}{_ms(stats['max']):>10}")
+        return "\n".join(lines)
+
+    def readout(self):
+        """ Compact text for the on-screen readout. """
+        lines = []
+        for histogram in self.histograms:
+            stats = histogram.summary()
+            lines.append(f"{histogram.name}: p50 {_ms(stats['p50'])}  p99 {_ms(stats['p99'])}  max {_ms(stats['max'])} ms")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {histogram.name: histogram.summary() for histogram in self.histograms}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
@@ -0,0 +1,121 @@
+"""
+Macros: timed key sequences bound to a button or chord.
+
+A macro binding in a mapping file lists its steps in order:
+
+    {"type": "macro", "name": "exit and re-enter",
+     "steps": [{"tap": "e"}, {"wait_ms": 400}, {"tap": "e"}]}
+
+    {"press": "ctrl_l"}              holds an output until a later release (or the macro ends)
+    {"release": "ctrl_l"}
+    {"tap": "q", "hold_ms": 50}      press, hold, release
+    {"wait_ms": 100}
+
+Outputs are key names, as for key bindings, or mouse_left / mouse_right / mouse_middle.
+"repeat" runs the steps that many times, or "held" to keep repeating while the button is down.
+By default letting go of the button stops the macro ("cancel_on_release": false lets it run to
+the end). Whatever a macro still holds when it stops or ends is let go. A repeating macro
+should end on a wait, otherwise its last release and the next run's first press land in the
+same frame and the game never sees the key come up.
+
+MacroPlayer runs a macro on the input thread's TimerQueue: the steps up to the next wait run
+at once, then a timer picks up after the wait. Nothing sleeps, so a long macro never holds up
+steering and pedal handling.
+"""
+PRESS = 0
+RELEASE = 1
+WAIT = 2
+
+
+class Macro:
+    """ A macro binding compiled to a flat list of (action, output, seconds) steps. `parse_output`
+        turns an output name into something the OutputReconciler can hold. """
+    def __init__(self, binding, parse_output, tap_hold):
+        self.name = binding.get('name', 'macro')
+        self.steps = []
+        self.written_steps = len(binding['steps'])
+        for step in binding['steps']:
+            if 'press' in step:
+                self.steps.append((PRESS, parse_output(step['press']), 0.0))
+            elif 'release' in step:
+                self.steps.append((RELEASE, parse_output(step['release']), 0.0))
+            elif 'tap' in step:
+                output = parse_output(step['tap'])
+                self.steps.append((PRESS, output, 0.0))
+                self.steps.append((WAIT, None, step.get('hold_ms', tap_hold * 1000) / 1000))
+                self.steps.append((RELEASE, output, 0.0))
+            elif 'wait_ms' in step:
+                self.steps.append((WAIT, None, step['wait_ms'] / 1000))
+            else:
+                raise ValueError(f"unknown macro step {step}")
+        repeat = binding.get('repeat', 1)
+        self.while_held = repeat == 'held'
+        self.runs = 0 if self.while_held else int(repeat)
+        self.cancel_on_release = binding.get('cancel_on_release', True)
+        self.duration = sum(seconds for action, _, seconds in self.steps if action == WAIT)
+        if not self.steps:
+            raise ValueError("a macro needs at least one step")
+        if (self.while_held or self.runs > 1) and self.duration <= 0:
+            raise ValueError("a repeating macro needs a wait or tap step")
+        if self.while_held and not self.cancel_on_release:
+            raise ValueError("repeat 'held' stops on release, cancel_on_release can't be false")
+
+    def describe(self):
+        repeat = ', while held' if self.while_held else f', {self.runs} times' if self.runs > 1 else ''
+        return f"Macro '{self.name}' ({self.written_steps} steps, {self.duration * 1000:.0f} ms{repeat})"
+
+
+class MacroPlayer:
+    """ Plays one Macro into an OutputReconciler, holding its outputs under `source`. Pressing
+        the binding again while the macro runs starts it over. """
+    def __init__(self, macro, outputs, timers, source):
+        self.macro = macro
+        self.outputs = outputs
+        self.source = source
+        self.clock = timers.clock
+        self.timer = timers.timer(self._advance)
+        self.position = None  # Index of the next step, None while idle
+        self.runs_left = 0
+        self.held = False
+
+    def press(self):
+        self.held = True
+        if self.position is not None:
+            self.stop()
+        self.position = 0
+        self.runs_left = self.macro.runs
+        self._advance()
+
+    def release(self):
+        self.held = False
+        if self.macro.cancel_on_release and self.position is not None:
+            self.stop()
+
+    def stop(self):
+        """ Abandons the macro and lets go of everything it holds. """
+        self.timer.cancel()
+        self.position = None
+        self.outputs.drop_source(self.source)
+
+    def _advance(self):
+        """ Runs steps until the next wait, then arms the timer for the end of it. """
+        steps = self.macro.steps
+        outputs = self.outputs
+        position = self.position
+        while True:
+            if position == len(steps):
+                self.runs_left -= 1
+                if not (self.runs_left > 0 or (self.macro.while_held and self.held)):
+                    self.stop()
+                    return
+                position = 0
+            action, output, seconds = steps[position]
+            position += 1
+            if action == PRESS:
+                outputs.hold(self.source, output)
+            elif action == RELEASE:
+                outputs.drop(self.source, output)
+            elif seconds > 0:
+                self.position = position
+                self.timer.start(self.clock() + seconds)
+                return
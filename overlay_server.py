@@ -0,0 +1,191 @@
+"""
+Headless overlay server for OBS.
+
+Instead of capturing a chroma-keyed Tk window, add a Browser source pointing at
+http://localhost:8765/ and the gauge is drawn by overlay/gauge.html on a transparent
+background. The page opens a WebSocket back to this server and receives small JSON deltas,
+only the fields that changed, e.g. {"speed":12.3} or {"gear":"R","brake":true}.
+
+Everything runs on one asyncio loop. Each tick calls the state function the script passes in
+(it reads what the input thread published, the input thread itself is never waited on) and
+queues the delta for every client. A client keeps at most one pending message: if it hasn't
+taken the last one yet, the new delta is merged into it, so a slow client skips stale frames
+instead of building a backlog.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+
+OVERLAY_HOST = '127.0.0.1'
+OVERLAY_PORT = 8765
+OVERLAY_RATE = 30          # State ticks per second
+OVERLAY_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'overlay', 'gauge.html')
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_REQUEST_BYTES = 8192
+CLIENT_WRITE_BUFFER = 4096 # Bytes buffered per client before its frames start being merged
+
+# WebSocket opcodes
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def encode_frame(opcode, payload):
+    """ One unmasked, unfragmented server-to-client frame. """
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 1 << 16:
+        header += bytes([126]) + struct.pack('!H', length)
+    else:
+        header += bytes([127]) + struct.pack('!Q', length)
+    return header + payload
+
+
+async def read_frame(reader):
+    """ Reads one client-to-server frame. Returns (opcode, payload). """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    if length > MAX_REQUEST_BYTES:
+        raise ConnectionError("frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return first & 0x0F, payload
+
+
+class OverlayClient:
+    """ One connected browser source and its single pending message. """
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = None
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.merged = 0   # Deltas folded into a pending message instead of being sent on their own
+
+    def push(self, delta):
+        if self.pending is None:
+            self.pending = dict(delta)
+        else:
+            self.pending.update(delta)
+            self.merged += 1
+        self.ready.set()
+
+    async def send_loop(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                message, self.pending = self.pending, None
+                self.writer.write(encode_frame(OP_TEXT, json.dumps(message, separators=(',', ':')).encode()))
+                self.sent += 1
+                await self.writer.drain()
+        except ConnectionError:
+            pass  # The read side notices too and drops the client
+
+
+class OverlayServer:
+    """ Serves the overlay page and streams `read_state(now)` to it as deltas.
+
+    read_state returns a flat dict of JSON values. It is called on the server's thread
+    `rate` times per second and should only read state other threads have published.
+    """
+    def __init__(self, read_state, host=OVERLAY_HOST, port=OVERLAY_PORT, rate=OVERLAY_RATE):
+        self.read_state = read_state
+        self.host = host
+        self.port = port
+        self.period = 1.0 / rate
+        self.state = {}
+        self.clients = set()
+        with open(OVERLAY_PAGE, 'rb') as f:
+            self.page = f.read()
+
+    def run(self):
+        """ Serves until interrupted (Ctrl+C). """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self):
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"Overlay server on http://{self.host}:{self.port}/ (add it to OBS as a Browser source)")
+        async with server:
+            await self._tick_loop()
+
+    async def _tick_loop(self):
+        next_tick = time.monotonic()
+        while True:
+            now = time.monotonic()
+            state = self.read_state(now)
+            delta = {field: value for field, value in state.items() if self.state.get(field) != value}
+            if delta:
+                self.state.update(delta)
+                for client in self.clients:
+                    client.push(delta)
+            # Fixed schedule, but don't try to make up ticks after a stall
+            next_tick = max(next_tick + self.period, now)
+            await asyncio.sleep(next_tick - time.monotonic())
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        lines = request.decode('latin-1').split('\r\n')
+        parts = lines[0].split()
+        path = parts[1] if len(parts) > 1 else '/'
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+            await self._serve_websocket(reader, writer, headers)
+        elif path in ('/', '/gauge.html'):
+            self._respond(writer, '200 OK', 'text/html; charset=utf-8', self.page)
+        else:
+            self._respond(writer, '404 Not Found', 'text/plain', b'not found')
+
+    def _respond(self, writer, status, content_type, body):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     f"Cache-Control: no-cache\r\nConnection: close\r\n\r\n".encode() + body)
+        writer.close()
+
+    async def _serve_websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        writer.transport.set_write_buffer_limits(high=CLIENT_WRITE_BUFFER)
+
+        client = OverlayClient(writer)
+        client.push(self.state)  # New clients start from the full state
+        self.clients.add(client)
+        sender = asyncio.create_task(client.send_loop())
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(encode_frame(OP_CLOSE, payload[:2]))
+                    break
+                if opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(client)
+            sender.cancel()
+            writer.close()
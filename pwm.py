@@ -0,0 +1,248 @@
+"""
+Software PWM for keyboard outputs.
+
+A PwmChannel turns a duty cycle (0.0 - 1.0) into a key that is held for that fraction of
+every carrier period. PwmScheduler owns the channels and is serviced from the input loop:
+service() flips whatever edges are due and next_deadline() tells the loop how long it may
+block, so nothing here sleeps or spins.
+
+Run this file directly to measure the duty-cycle accuracy and edge jitter on this machine:
+
+    python pwm.py --carrier 10 --seconds 3 --load 2
+"""
+import argparse
+import math
+import sys
+import threading
+import time
+
+
+def enable_high_resolution_timer():
+    """ Windows rounds waits up to ~15.6 ms by default, which is most of a PWM period.
+        Ask for 1 ms resolution while PWM outputs are running. """
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            return ctypes.windll.winmm.timeBeginPeriod(1) == 0
+        except (AttributeError, OSError):
+            pass
+    return False
+
+
+def disable_high_resolution_timer():
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            ctypes.windll.winmm.timeEndPeriod(1)
+        except (AttributeError, OSError):
+            pass
+
+
+class PwmStats:
+    """ Running edge-lateness and duty-error figures for one channel. Constant memory. """
+    def __init__(self):
+        self.edges = 0
+        self.lateness_sum = 0.0
+        self.lateness_sq_sum = 0.0
+        self.lateness_max = 0.0
+        self.periods = 0
+        self.duty_error_sum = 0.0
+        self.duty_error_max = 0.0
+
+    def record_edge(self, lateness):
+        self.edges += 1
+        self.lateness_sum += lateness
+        self.lateness_sq_sum += lateness * lateness
+        if lateness > self.lateness_max:
+            self.lateness_max = lateness
+
+    def record_period(self, requested_duty, achieved_duty):
+        error = abs(achieved_duty - requested_duty)
+        self.periods += 1
+        self.duty_error_sum += error
+        if error > self.duty_error_max:
+            self.duty_error_max = error
+
+    def report(self, name):
+        if not self.edges:
+            return f"{name}: no edges"
+        mean = self.lateness_sum / self.edges
+        jitter = math.sqrt(max(0.0, self.lateness_sq_sum / self.edges - mean * mean))
+        line = (f"{name}: {self.edges} edges, lateness mean {mean * 1000:.2f} ms, "
+                f"jitter {jitter * 1000:.2f} ms, max {self.lateness_max * 1000:.2f} ms")
+        if self.periods:
+            line += (f", duty error mean {self.duty_error_sum / self.periods * 100:.2f}% "
+                     f"max {self.duty_error_max * 100:.2f}% over {self.periods} periods")
+        return line
+
+
+class PwmChannel:
+    """ One output held for `duty` of every carrier period.
+
+    Very short pulses or gaps are dropped (duty snaps to 0 or 1) when they would be shorter
+    than min_pulse, because the game can't see a key that is down for less than a frame.
+    on_change(channel, is_on) is called on every edge.
+    """
+    def __init__(self, name, carrier_hz, min_pulse=0.0, on_change=None):
+        self.name = name
+        self.period = 1.0 / carrier_hz
+        self.min_pulse = min_pulse
+        self.on_change = on_change
+        self.duty = 0.0
+        self.on = False
+        self.stats = PwmStats()
+        self.next_edge = None        # Monotonic time of the next scheduled edge, None when idle
+        self._on_time = 0.0
+        self._period_start = None    # Scheduled start of the current period
+        self._rise = None            # Actual time the output went on this period
+        self._fall = None            # Actual time it went off this period
+        self._duty_changed = False   # Period stats are only meaningful for a steady duty
+
+    def set_duty(self, duty, now):
+        duty = max(0.0, min(duty, 1.0))
+        on_time = duty * self.period
+        if on_time < self.min_pulse:
+            on_time = 0.0
+        elif self.period - on_time < self.min_pulse:
+            on_time = self.period
+        if on_time == self._on_time:
+            return
+        self.duty = duty
+        self._on_time = on_time
+        self._duty_changed = True
+
+        if self._period_start is None:
+            if on_time > 0.0:
+                self.next_edge = now  # Start a new period on the next service()
+        elif self.on:
+            self.next_edge = self._fall_deadline()
+
+    def advance(self, now):
+        """ Applies every edge that is due at `now`. """
+        while self.next_edge is not None and self.next_edge <= now:
+            edge = self.next_edge
+            if self._period_start is not None and self.on and edge < self._period_start + self.period:
+                self._set_output(False, edge, now)
+                self.next_edge = self._period_start + self.period
+            else:
+                # After a stall, restart from now instead of replaying every missed period
+                if self._period_start is not None and now - edge < self.period:
+                    self._period_start = edge
+                else:
+                    self._period_start = now
+                self._start_period(edge, now)
+
+    def _start_period(self, edge, now):
+        if self._rise is not None and not self._duty_changed:
+            measured_period = now - self._rise
+            measured_on = (self._fall if self._fall is not None else now) - self._rise
+            if measured_period > 0.0:
+                self.stats.record_period(self._on_time / self.period, measured_on / measured_period)
+        self._duty_changed = False
+        self._rise = None
+        self._fall = None
+
+        if self._on_time <= 0.0:
+            self._set_output(False, edge, now)
+            self._period_start = None
+            self.next_edge = None
+            return
+        self._set_output(True, edge, now)
+        self.next_edge = self._fall_deadline()
+
+    def _fall_deadline(self):
+        if self._on_time < self.period:
+            return self._period_start + self._on_time
+        return self._period_start + self.period  # Fully on, next edge is just the period boundary
+
+    def _set_output(self, on, edge, now):
+        if on:
+            self._rise = now
+        elif self._rise is not None:
+            self._fall = now
+        if on == self.on:
+            return
+        self.on = on
+        self.stats.record_edge(now - edge)
+        if self.on_change:
+            self.on_change(self, on)
+
+    def stop(self, now):
+        self.set_duty(0.0, now)
+        self.next_edge = None
+        self._period_start = None
+        if self.on:
+            self.on = False
+            if self.on_change:
+                self.on_change(self, False)
+
+
+class PwmScheduler:
+    """ Services every PWM channel from the thread that owns their outputs. """
+    def __init__(self):
+        self.channels = []
+
+    def add(self, channel):
+        self.channels.append(channel)
+        return channel
+
+    def service(self, now):
+        for channel in self.channels:
+            if channel.next_edge is not None and channel.next_edge <= now:
+                channel.advance(now)
+
+    def next_deadline(self):
+        deadline = None
+        for channel in self.channels:
+            if channel.next_edge is not None and (deadline is None or channel.next_edge < deadline):
+                deadline = channel.next_edge
+        return deadline
+
+    def stop(self, now):
+        for channel in self.channels:
+            channel.stop(now)
+
+    def report(self):
+        return "\n".join(channel.stats.report(channel.name) for channel in self.channels)
+
+
+def _burn_cpu(stop_event):
+    while not stop_event.is_set():
+        sum(i * i for i in range(1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure software PWM duty-cycle accuracy and jitter")
+    parser.add_argument('--carrier', type=float, default=10.0, help="carrier frequency in Hz")
+    parser.add_argument('--duties', default="0.1,0.25,0.5,0.75,0.9", help="comma separated duty cycles to test")
+    parser.add_argument('--seconds', type=float, default=3.0, help="how long to run each duty cycle")
+    parser.add_argument('--min-pulse', type=float, default=0.0, help="shortest pulse in seconds")
+    parser.add_argument('--load', type=int, default=0, help="number of busy Python threads running alongside")
+    parser.add_argument('--switch-interval', type=float, default=None,
+                        help="sys.setswitchinterval() value in seconds, to see how GIL hand-off affects jitter")
+    args = parser.parse_args()
+
+    if args.switch_interval:
+        sys.setswitchinterval(args.switch_interval)
+    enable_high_resolution_timer()
+    stop_load = threading.Event()
+    for _ in range(args.load):
+        threading.Thread(target=_burn_cpu, args=(stop_load,), daemon=True).start()
+
+    wake = threading.Event()  # Never set, only used for its timed wait
+    print(f"Carrier {args.carrier} Hz, {args.load} load thread(s), GIL switch interval {sys.getswitchinterval() * 1000:.1f} ms")
+    for duty in (float(d) for d in args.duties.split(',')):
+        scheduler = PwmScheduler()
+        channel = scheduler.add(PwmChannel(f"duty {duty:.2f}", args.carrier, args.min_pulse))
+        channel.set_duty(duty, time.monotonic())
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end:
+            deadline = scheduler.next_deadline()
+            if deadline is not None:
+                wake.wait(max(0.0, deadline - time.monotonic()))
+            scheduler.service(time.monotonic())
+        channel.stop(time.monotonic())
+        print("  " + channel.stats.report(channel.name))
+
+    stop_load.set()
+    disable_high_resolution_timer()
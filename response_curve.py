@@ -0,0 +1,210 @@
+"""
+Response curves for the wheel and pedal axes.
+
+A ResponseCurve shapes a raw axis value (-1.0 to 1.0) with a deadzone, a saturation point, a
+gamma and an optional S-curve, and can invert the axis. Steering-style axes are shaped
+symmetrically around center to -1.0 - 1.0. Pedals (pedal=True) are first turned into travel,
+0.0 at rest to 1.0 fully pressed, and shaped to 0.0 - 1.0. By default an axis is taken to span
+the whole raw range, centered on 0.0. A calibration profile (calibration.py) replaces that with
+the measured ends and center.
+
+The curve is worked out once, at start-up, into a fixed-size lookup table over the raw range.
+Shaping a sample is then one index into the table instead of the float math per sample.
+
+CurveView plots each curve, raw against shaped, with the live position of the axis on it.
+Run the mapper with --curves to open it for the wheel:
+
+    python foxhole_g920.py --curves
+"""
+import argparse
+import time
+import tkinter as tk
+from array import array
+
+CURVE_TABLE_SIZE = 2049  # Table entries over the raw range -1.0 - 1.0, odd so center has its own entry
+VIEW_PLOT_SIZE = 240     # Pixels per plot in CurveView
+VIEW_MARGIN = 24
+VIEW_UPDATE_MS = 16
+
+
+def response_curve(value, deadzone, saturation, gamma):
+    """ Maps an axis value (-1.0 to 1.0) to 0.0 - 1.0 from its distance from center: 0.0 inside
+        the deadzone, 1.0 past saturation and a gamma curve in between. """
+    magnitude = abs(value)
+    if magnitude <= deadzone:
+        return 0.0
+    if magnitude >= saturation:
+        return 1.0
+    return ((magnitude - deadzone) / (saturation - deadzone)) ** gamma
+
+
+class ResponseCurve:
+    """ Shapes raw axis values through a precomputed lookup table.
+
+    deadzone and saturation are in shaped units (distance from center, or pedal travel): values
+    inside the deadzone give 0.0, values past saturation the full output. gamma > 1.0 gives
+    finer control at the start of the travel. s_curve (0.0 - 1.0) blends the result toward a
+    smoothstep, which is gentle at both ends and steep in the middle. low, high and center are
+    the raw values at the ends of the axis and at its center (centered axes only).
+    """
+    def __init__(self, deadzone=0.0, saturation=1.0, gamma=1.0, s_curve=0.0, invert=False, pedal=False,
+                 low=-1.0, high=1.0, center=0.0, size=CURVE_TABLE_SIZE):
+        self.deadzone = deadzone
+        self.saturation = saturation
+        self.gamma = gamma
+        self.s_curve = s_curve
+        self.invert = invert
+        self.pedal = pedal
+        self.low = low
+        self.high = high
+        self.center = center
+        self.scale = (size - 1) / 2.0
+        self.last = size - 1
+        self.table = array('d', (self.shape(index / self.scale - 1.0) for index in range(size)))
+
+    def shape(self, raw):
+        """ The exact curve, used to build the table. """
+        if self.pedal:
+            travel = (raw - self.low) / (self.high - self.low)
+            if self.invert:
+                travel = 1.0 - travel
+            return self._magnitude(min(max(travel, 0.0), 1.0))
+        offset = raw - self.center
+        value = offset / (self.high - self.center) if offset >= 0 else offset / (self.center - self.low)
+        if self.invert:
+            value = -value
+        magnitude = self._magnitude(min(abs(value), 1.0))
+        return -magnitude if value < 0 else magnitude
+
+    def _magnitude(self, value):
+        shaped = response_curve(value, self.deadzone, self.saturation, self.gamma)
+        if self.s_curve:
+            shaped += self.s_curve * (shaped * shaped * (3.0 - 2.0 * shaped) - shaped)
+        return shaped
+
+    def __call__(self, raw):
+        index = int((raw + 1.0) * self.scale + 0.5)
+        if index < 0:
+            index = 0
+        elif index > self.last:
+            index = self.last
+        return self.table[index]
+
+    def describe(self):
+        parts = ['pedal' if self.pedal else 'centered']
+        if self.invert:
+            parts.append('inverted')
+        parts.append(f"deadzone {self.deadzone:.3g}, saturation {self.saturation}, gamma {self.gamma}")
+        if (self.low, self.high, self.center) != (-1.0, 1.0, 0.0):
+            parts.append(f"range {self.low:+.3f} to {self.high:+.3f}" + ('' if self.pedal else f" around {self.center:+.3f}"))
+        if self.s_curve:
+            parts.append(f"S-curve {self.s_curve}")
+        return ', '.join(parts)
+
+
+def compile_curves(settings):
+    """ A dict of axis -> ResponseCurve from `settings` (axis -> ResponseCurve keyword
+        arguments). Only the axes in `settings` get a table. """
+    return {axis: ResponseCurve(**axis_settings) for axis, axis_settings in settings.items()}
+
+
+class CurveView:
+    """ Plots raw against shaped values for a set of axes, with a marker at each axis' live position.
+
+    `axes` is a list of (axis index, name, ResponseCurve). The dashed line is the unshaped
+    response, for comparison.
+    """
+    def __init__(self, root, axes, size=VIEW_PLOT_SIZE):
+        self.root = root
+        self.size = size
+        self.plots = {}
+        for column, (axis, name, curve) in enumerate(axes):
+            frame = tk.Frame(root)
+            frame.grid(row=0, column=column, padx=4, pady=4)
+            tk.Label(frame, text=f"{name} (axis {axis})").pack()
+            canvas = tk.Canvas(frame, width=size + 2 * VIEW_MARGIN, height=size + 2 * VIEW_MARGIN, bg='white')
+            canvas.pack()
+            tk.Label(frame, text=curve.describe(), wraplength=size + 2 * VIEW_MARGIN).pack()
+            readout = tk.Label(frame, font=('Consolas', 10))
+            readout.pack()
+            self._draw_axes(canvas, curve)
+            marker = canvas.create_oval(0, 0, 0, 0, fill='#FF6600', outline='')
+            self.plots[axis] = (canvas, curve, marker, readout)
+
+    def _point(self, curve, raw, shaped):
+        """ Canvas coordinates of a (raw, shaped) pair. Pedal plots run 0.0 - 1.0 upward. """
+        x = VIEW_MARGIN + (raw + 1.0) / 2.0 * self.size
+        low = 0.0 if curve.pedal else -1.0
+        y = VIEW_MARGIN + (1.0 - (shaped - low) / (1.0 - low)) * self.size
+        return x, y
+
+    def _draw_axes(self, canvas, curve):
+        m, s = VIEW_MARGIN, self.size
+        canvas.create_rectangle(m, m, m + s, m + s, outline='#C0C0C0')
+        canvas.create_line(m + s / 2, m, m + s / 2, m + s, fill='#E0E0E0')
+        if not curve.pedal:
+            canvas.create_line(m, m + s / 2, m + s, m + s / 2, fill='#E0E0E0')
+        canvas.create_text(m, m + s + 12, text='-1', fill='#808080')
+        canvas.create_text(m + s, m + s + 12, text='+1', fill='#808080')
+        canvas.create_text(m + s / 2, m + s + 12, text='raw', fill='#808080')
+        linear = ResponseCurve(invert=curve.invert, pedal=curve.pedal, size=3)
+        canvas.create_line(*self._point(curve, -1.0, linear(-1.0)), *self._point(curve, 1.0, linear(1.0)),
+                           fill='#A0A0A0', dash=(4, 4))
+        if curve.pedal:
+            for raw in (curve.low, curve.high):
+                x, _ = self._point(curve, raw, 0.0)
+                canvas.create_line(x, m, x, m + s, fill='#C0C0C0', dash=(2, 4))
+        # One point per pixel column is plenty, the table has more entries than the plot is wide
+        step = max(1, len(curve.table) // s)
+        points = []
+        for index in range(0, len(curve.table), step):
+            points.extend(self._point(curve, index / curve.scale - 1.0, curve.table[index]))
+        points.extend(self._point(curve, 1.0, curve.table[-1]))
+        canvas.create_line(*points, fill='#803300', width=2)
+
+    def show(self, axis, raw):
+        canvas, curve, marker, readout = self.plots[axis]
+        shaped = curve(raw)
+        x, y = self._point(curve, max(-1.0, min(raw, 1.0)), shaped)
+        canvas.coords(marker, x - 4, y - 4, x + 4, y + 4)
+        readout.config(text=f"raw {raw:+.3f} -> {shaped:+.3f}")
+
+
+def run_curve_view(backend, axes, title="Response curves"):
+    """ Opens a CurveView for `axes` and follows the live values from a joystick backend. """
+    root = tk.Tk()
+    root.title(title)
+    view = CurveView(root, axes)
+
+    def update():
+        backend.pump()
+        if backend.connected:
+            for axis, _, _ in axes:
+                if axis < backend.get_numaxes():
+                    view.show(axis, backend.get_axis(axis))
+        root.after(VIEW_UPDATE_MS, update)
+
+    update()
+    try:
+        root.mainloop()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the cost of a table lookup with the direct curve math")
+    parser.add_argument('--samples', type=int, default=200000)
+    args = parser.parse_args()
+
+    curve = ResponseCurve(deadzone=0.05, saturation=0.9, gamma=1.5, s_curve=0.3)
+    values = [(i % 2001) / 1000.0 - 1.0 for i in range(args.samples)]
+    for label, function in (("direct", curve.shape), ("table", curve)):
+        start = time.perf_counter()
+        for value in values:
+            function(value)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>6}: {elapsed / args.samples * 1e9:7.1f} ns per sample")
+    error = max(abs(curve(value) - curve.shape(value)) for value in values)
+    print(f"Largest table error: {error:.5f}")
@@ -3,6 +3,13 @@ import math
 import pygame
 import threading
 import time
+import argparse
+from joystick_backend import PygameBackend, ReplayBackend, TelemetryBackend, FusedBackend
+from telemetry_bus import BUS_PATH
+from speed_physics import SpeedModel, MAX_SPEED
+from response_curve import ResponseCurve, run_curve_view
+from gauge_render import GaugeRenderer, SpriteGaugeRenderer, IDLE_UPDATE_MS
+from overlay_server import OverlayServer, OVERLAY_HOST, OVERLAY_PORT, OVERLAY_RATE
 
 CANVAS_SIZE = 500
 CENTER_X = CANVAS_SIZE / 2
@@ -10,9 +17,12 @@ CENTER_Y = CANVAS_SIZE / 2
 RADIUS = CANVAS_SIZE * 0.4
 ARC_WIDTH = 15
 # You can set your own max speed / acceleration rate etc. here
-MAX_SPEED = 17.4  # m/s
+# MAX_SPEED (m/s) is set in speed_physics.py, shared with the mapper's gauge
 UPDATE_MS = 16
-SPEED_STEP = 0.1
+SPEED_ACCELERATION = 6.25  # m/s^2
+SPEED_DECELERATION = 6.25  # m/s^2
+TRIGGER_AXIS = 5  # Stadia controller right trigger. Verify Axis!
+TRIGGER_CURVE = {'pedal': True}  # Response curve of the trigger (see response_curve.py), check it with --curves
 
 # Gauge Arc Geometry
 ARC_START_ANGLE = 225
@@ -36,6 +46,9 @@ NUMBER_COLOR = DEEP_ORANGE_MAIN
 # NEEDLE_COLOR = DEEP_ORANGE_BRIGHT # Not used
 # CENTER_BG_COLOR = DEEP_ORANGE_DARK # Not used
 DIGITAL_SPEED_COLOR = DEEP_ORANGE_BRIGHT
+GAUGE_COLORS = {'bg': BG_COLOR, 'arc_bg': ARC_BG_COLOR, 'tick': TICK_COLOR, 'number': NUMBER_COLOR,
+                'fill': ARC_MAIN_COLOR_START}
+GAUGE_RENDERER = 'canvas'  # 'canvas' draws Tk primitives, 'sprite' shows pre-rendered anti-aliased PIL frames
 # CLOCK_COLOR = DEEP_ORANGE_DIM # Not used
 
 # Fonts
@@ -45,8 +58,20 @@ DIGITAL_FONT_SIZE = 50
 NUMBER_FONT_SIZE = 12
 # CLOCK_FONT_SIZE = 14 # Not used
 
+def read_trigger(joystick, trigger_curve):
+    """ Shaped trigger position (0.0 - 1.0) and, when following a telemetry bus, the newest
+        snapshot. The bus carries the mapper's wheel, not a trigger, so its published target
+        speed stands in for the trigger there. A device without TRIGGER_AXIS reads as released. """
+    if isinstance(joystick, TelemetryBackend):
+        snapshot = joystick.snapshot
+        return (snapshot.target_speed / MAX_SPEED if snapshot else 0.0), snapshot
+    if TRIGGER_AXIS >= joystick.get_numaxes():
+        return 0.0, None
+    return trigger_curve(joystick.get_axis(TRIGGER_AXIS)), None
+
+
 class ModernSpeedometerApp:
-    def __init__(self, root):
+    def __init__(self, root, backend=None, gauge=GAUGE_RENDERER):
         self.root = root
         self.root.title("Modern Speedometer (m/s)")
         self.root.geometry(f'{CANVAS_SIZE + 20}x{CANVAS_SIZE + 100}')
@@ -55,6 +80,10 @@ class ModernSpeedometerApp:
         self.current_speed = 0.0
         self.target_speed = 0.0
         self.trigger_value = 0.0
+        self.trigger_curve = ResponseCurve(**TRIGGER_CURVE)
+        # A trigger below speed_physics.IDLE_TARGET counts as released, the needle then rolls out to zero
+        self.speed_model = SpeedModel(MAX_SPEED, SPEED_ACCELERATION, SPEED_DECELERATION)
+        self.clock = time.monotonic  # The benchmarks swap in simulated time
 
         # --- Center Digital Display Area ---
         self.digital_label = tk.Label(root, text="0.0 m/s",
@@ -69,31 +98,31 @@ class ModernSpeedometerApp:
 
         self.digital_label.lift()
 
-        # --- Draw static elements (background arc, line ticks, numbers) ---
-        self.draw_static_elements()
-
-        # --- Create the Dynamic Fill Arc ---
-        self.fill_arc = self.canvas.create_arc(
-            CENTER_X - RADIUS, CENTER_Y - RADIUS,
-            CENTER_X + RADIUS, CENTER_Y + RADIUS,
-            start=ARC_START_ANGLE,
-            extent=0,
-            outline=DEEP_ORANGE_MAIN,
-            width=ARC_WIDTH,
-            style=tk.ARC
-        )
-
-        # --- Pygame Controller Initialization ---
+        if gauge == 'sprite':
+            # --- Pre-rendered PIL gauge: one image item, swapped per fill level ---
+            self.fill_arc = None
+            self.renderer = SpriteGaugeRenderer(self.canvas, self.digital_label, MAX_SPEED, CANVAS_SIZE, RADIUS,
+                                                ARC_WIDTH, ARC_START_ANGLE, ARC_EXTENT, GAUGE_COLORS,
+                                                MAIN_FONT, NUMBER_FONT_SIZE)
+        else:
+            # --- Draw static elements (background arc, line ticks, numbers) ---
+            self.draw_static_elements()
+
+            # --- Create the Dynamic Fill Arc ---
+            self.fill_arc = self.canvas.create_arc(
+                CENTER_X - RADIUS, CENTER_Y - RADIUS,
+                CENTER_X + RADIUS, CENTER_Y + RADIUS,
+                start=ARC_START_ANGLE,
+                extent=0,
+                outline=DEEP_ORANGE_MAIN,
+                width=ARC_WIDTH,
+                style=tk.ARC
+            )
+            self.renderer = GaugeRenderer(self.canvas, self.fill_arc, self.digital_label, MAX_SPEED, RADIUS, ARC_EXTENT)
+
+        # --- Controller Initialization (a real controller unless a replay backend was given) ---
         try:
-            pygame.init()
-            pygame.joystick.init()
-            if pygame.joystick.get_count() > 0:
-                self.joystick = pygame.joystick.Joystick(0)
-                self.joystick.init()
-                print(f"Initialized Joystick: {self.joystick.get_name()}")
-            else:
-                print("Error: No joystick detected.")
-                self.joystick = None
+            self.joystick = backend if backend is not None else PygameBackend.open(0)
         except pygame.error as e:
             print(f"Pygame error: {e}")
             self.joystick = None
@@ -174,13 +203,15 @@ class ModernSpeedometerApp:
         while self.running:
             if self.joystick:
                 try:
-                    pygame.event.pump()
-                    raw_value = self.joystick.get_axis(5) # Verify Axis!
-                    self.trigger_value = max(0.0, min((raw_value + 1.0) / 2.0, 1.0))
+                    self.joystick.pump()  # Also reopens the controller after it was unplugged
+                    if self.joystick.connected:
+                        self.trigger_value, _ = read_trigger(self.joystick, self.trigger_curve)
+                    else:
+                        self.trigger_value = 0.0
                 except pygame.error as e:
                     print(f"Joystick error: {e}")
                     self.trigger_value = 0.0
-                    time.sleep(1)
+                    self.joystick.mark_lost()
             else:
                 self.trigger_value = 0.0
             time.sleep(0.01)
@@ -192,40 +223,105 @@ class ModernSpeedometerApp:
 
         self.target_speed = self.trigger_value * MAX_SPEED
 
-        # Speed smoothing logic
-        speed_diff = self.target_speed - self.current_speed
-        change = max(-SPEED_STEP, min(SPEED_STEP, speed_diff))
-        if abs(speed_diff) < SPEED_STEP / 2 and self.trigger_value < 0.05:
-             self.current_speed *= 0.95
-        else:
-             self.current_speed += change
-        self.current_speed = max(0.0, min(self.current_speed, MAX_SPEED))
+        # Speed smoothing, in fixed timesteps of real time rather than per frame
+        self.speed_model.target = self.target_speed
+        self.current_speed = self.speed_model.advance(self.clock())
 
-        # Update Digital Display
-        self.digital_label.config(text=f"{self.current_speed:.1f} m/s")
+        # Update the digital display and fill arc, only where the visible output changed
+        self.renderer.render(self.current_speed)
 
-        # --- Update the Fill Arc ---
-        speed_ratio = max(0, min(self.current_speed / MAX_SPEED, 1.0)) if MAX_SPEED > 0 else 0
-        new_extent = -speed_ratio * ARC_EXTENT
-        self.canvas.itemconfigure(self.fill_arc, extent=new_extent)
-
-        # Lift digital label
-        self.digital_label.lift()
-
-        # Schedule the next update
-        self.root.after(UPDATE_MS, self.update_speed)
+        # Schedule the next update, slower while the needle is at rest. A trigger press is
+        # picked up on the next idle tick at the latest.
+        self.root.after(IDLE_UPDATE_MS if self.speed_model.at_rest() else UPDATE_MS, self.update_speed)
 
     def stop(self):
         """ Stops the application gracefully. """
         print("Stopping application...")
         self.running = False
         if self.joystick:
+             self.joystick.close()
              pygame.quit()
         self.root.destroy()
 
 
+def run_headless(args, backend):
+    """ Serves the gauge as a browser overlay instead of a Tk window. """
+    try:
+        joystick = backend if backend is not None else PygameBackend.open(0)
+    except pygame.error as e:
+        print(f"Pygame error: {e}")
+        joystick = None
+    speed_model = SpeedModel(MAX_SPEED, SPEED_ACCELERATION, SPEED_DECELERATION)
+    trigger_curve = ResponseCurve(**TRIGGER_CURVE)
+
+    def read_state(now):
+        # Only the trigger is read, so it is polled right here on the overlay's tick
+        snapshot = None
+        if joystick:
+            try:
+                joystick.pump()
+                if joystick.connected:
+                    trigger_value, snapshot = read_trigger(joystick, trigger_curve)
+                    speed_model.target = trigger_value * MAX_SPEED
+                else:
+                    speed_model.target = 0.0
+            except pygame.error as e:
+                print(f"Joystick error: {e}")
+                speed_model.target = 0.0
+                joystick.mark_lost()
+        state = {'speed': round(speed_model.advance(now), 1), 'max_speed': MAX_SPEED}
+        if snapshot is not None:
+            state.update(gear='D' if snapshot.is_forward else 'R', brake=snapshot.brake)
+        return state
+
+    try:
+        OverlayServer(read_state, host=args.overlay_host, port=args.overlay_port, rate=args.overlay_rate).run()
+    finally:
+        print("Stopping application...")
+        if joystick:
+            joystick.close()
+            pygame.quit()
+
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = ModernSpeedometerApp(root)
-    root.protocol("WM_DELETE_WINDOW", app.stop)
-    root.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Speedometer overlay driven by a controller trigger")
+    parser.add_argument('--gauge', choices=['canvas', 'sprite'], default=GAUGE_RENDERER,
+                        help="'canvas' draws the gauge with Tk shapes, 'sprite' with pre-rendered anti-aliased images")
+    parser.add_argument('--devices', metavar='LAYOUT',
+                        help="read several controllers as one, routed by a device layout file (see mappings/devices.example.json)")
+    parser.add_argument('--replay', metavar='TRACE',
+                        help="read the trigger from a recorded trace file instead of the controller")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="trace playback speed, 0 plays it as fast as possible (default: 1.0)")
+    parser.add_argument('--telemetry', metavar='BUS', nargs='?', const=BUS_PATH,
+                        help=f"follow the controller through a telemetry bus another script publishes (default: {BUS_PATH})")
+    parser.add_argument('--headless', action='store_true',
+                        help="no Tk window, serve the gauge as a browser overlay for OBS instead")
+    parser.add_argument('--overlay-host', default=OVERLAY_HOST,
+                        help=f"address the overlay server listens on (default: {OVERLAY_HOST})")
+    parser.add_argument('--overlay-port', type=int, default=OVERLAY_PORT,
+                        help=f"overlay server port (default: {OVERLAY_PORT})")
+    parser.add_argument('--overlay-rate', type=float, default=OVERLAY_RATE,
+                        help=f"overlay updates per second (default: {OVERLAY_RATE})")
+    parser.add_argument('--curves', action='store_true',
+                        help="plot the trigger response curve with the live trigger position on it instead of the gauge")
+    args = parser.parse_args()
+
+    backend = None
+    if args.replay:
+        backend = ReplayBackend(args.replay, speed=args.replay_speed)
+    elif args.telemetry:
+        backend = TelemetryBackend(args.telemetry)
+    elif args.devices:
+        backend = FusedBackend.open(args.devices)
+    if args.curves:
+        backend = backend or PygameBackend.open(0)
+        if backend:
+            run_curve_view(backend, [(TRIGGER_AXIS, 'Trigger', ResponseCurve(**TRIGGER_CURVE))])
+    elif args.headless:
+        run_headless(args, backend)
+    else:
+        root = tk.Tk()
+        app = ModernSpeedometerApp(root, backend=backend, gauge=args.gauge)
+        root.protocol("WM_DELETE_WINDOW", app.stop)
+        root.mainloop()
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+Shared-memory telemetry bus.
+
+One process reads the wheel (the mapper, with --telemetry) and publishes the latest input
+snapshot plus the values derived from it into a small memory-mapped file. Any number of
+other processes, overlays, dashboards or a second speedometer, map the same file read-only
+and read the snapshot straight out of it. They never open the device themselves.
+
+    header:   the input trace header (input_trace.py) with magic 'FXTB'
+    sequence: uint64, odd while the writer is in the middle of an update
+    payload:  timestamp, button mask, hat x, hat y, one float32 per axis,
+              target speed (m/s), forward gear, brake
+
+The sequence works as a seqlock. The writer bumps it to odd, writes the payload and bumps it
+to even again. A reader reads the sequence, the payload and the sequence again, and retries
+if the two differ or the first one was odd. Readers never block the writer, and a reader that
+comes back with the same even sequence knows nothing changed without unpacking anything.
+
+Run this file directly to watch a bus, or to serve it as the browser overlay:
+
+    python telemetry_bus.py --overlay
+"""
+import argparse
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import namedtuple
+
+from input_trace import TRACE_HEADER, TraceInfo, pack_header, sample_struct
+
+BUS_MAGIC = b'FXTB'
+BUS_PATH = os.path.join(tempfile.gettempdir(), 'foxhole_telemetry.bus')
+BUS_SEQUENCE = struct.Struct('<Q')
+BUS_SEQUENCE_OFFSET = (TRACE_HEADER.size + 7) & ~7  # 8-byte aligned
+BUS_PAYLOAD_OFFSET = BUS_SEQUENCE_OFFSET + BUS_SEQUENCE.size
+BUS_READ_ATTEMPTS = 100  # Retries before a reader gives up on a torn snapshot and keeps its last one
+
+Snapshot = namedtuple('Snapshot', 'sequence timestamp button_mask hat axes target_speed is_forward brake')
+
+
+def payload_struct(num_axes):
+    """ Layout of the payload: a trace sample followed by the derived values. """
+    return struct.Struct(sample_struct(num_axes).format + 'f??')
+
+
+class TelemetryWriter:
+    """ Publishes snapshots into a bus file. There must be only one writer per file.
+
+    An existing bus file is reused in place rather than truncated, since readers may still
+    have it mapped (truncating it fails on Windows and raises SIGBUS in them elsewhere). It is
+    only grown if it is too small, and its sequence is reset to "nothing published".
+    """
+    def __init__(self, path, num_axes, num_buttons, num_hats, name=''):
+        self.path = path
+        self.payload = payload_struct(num_axes)
+        self.sequence = 0
+        size = BUS_PAYLOAD_OFFSET + self.payload.size
+        try:
+            f = open(path, 'r+b')
+        except FileNotFoundError:
+            f = open(path, 'w+b')
+        with f:
+            if os.fstat(f.fileno()).st_size < size:
+                f.truncate(size)
+            self.buffer = mmap.mmap(f.fileno(), size)
+        # Odd while the header is rewritten, so readers of the old bus wait it out
+        BUS_SEQUENCE.pack_into(self.buffer, BUS_SEQUENCE_OFFSET, 1)
+        self.buffer[:TRACE_HEADER.size] = pack_header(num_axes, num_buttons, num_hats, name, BUS_MAGIC)
+        BUS_SEQUENCE.pack_into(self.buffer, BUS_SEQUENCE_OFFSET, 0)
+        self._pack_payload = self.payload.pack_into
+        self._pack_sequence = BUS_SEQUENCE.pack_into
+
+    def publish(self, timestamp, button_mask, hat, axes, target_speed, is_forward, brake):
+        sequence = self.sequence
+        self._pack_sequence(self.buffer, BUS_SEQUENCE_OFFSET, sequence + 1)
+        self._pack_payload(self.buffer, BUS_PAYLOAD_OFFSET, timestamp, button_mask, hat[0], hat[1], *axes,
+                           target_speed, is_forward, brake)
+        self.sequence = sequence + 2
+        self._pack_sequence(self.buffer, BUS_SEQUENCE_OFFSET, sequence + 2)
+
+    def close(self):
+        if not self.buffer.closed:
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TelemetryReader:
+    """ Maps a bus file read-only and returns consistent snapshots from it. """
+    def __init__(self, path=BUS_PATH):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, num_axes, num_buttons, num_hats, name = TRACE_HEADER.unpack_from(self.buffer)
+        if magic != BUS_MAGIC:
+            raise ValueError("not a telemetry bus file")
+        self.info = TraceInfo(num_axes, num_buttons, num_hats, name.rstrip(b'\0').decode('utf-8', 'replace'))
+        self.payload = payload_struct(num_axes)
+        self.last = None
+        self.retries = 0  # Reads that overlapped an update and had to go again
+
+    def sequence(self):
+        """ Changes every time the writer publishes. 0 until it has published anything. """
+        return BUS_SEQUENCE.unpack_from(self.buffer, BUS_SEQUENCE_OFFSET)[0]
+
+    def read(self):
+        """ Returns the newest Snapshot, or None if nothing has been published yet. """
+        last = self.last
+        for _ in range(BUS_READ_ATTEMPTS):
+            before = self.sequence()
+            if last is not None and before == last.sequence:
+                return last
+            if before & 1:
+                self.retries += 1
+                continue
+            values = self.payload.unpack_from(self.buffer, BUS_PAYLOAD_OFFSET)
+            if self.sequence() != before:
+                self.retries += 1
+                continue
+            if before == 0:
+                self.last = None  # A new writer took the bus over, its sequence starts again
+                return None
+            timestamp, button_mask, hat_x, hat_y = values[:4]
+            target_speed, is_forward, brake = values[-3:]
+            self.last = Snapshot(before, timestamp, button_mask, (hat_x, hat_y), values[4:-3],
+                                 target_speed, is_forward, brake)
+            return self.last
+        return last
+
+    def close(self):
+        self.buffer.close()
+
+
+def _format_snapshot(snapshot):
+    axes = ' '.join(f'{value:+.3f}' for value in snapshot.axes)
+    return (f"#{snapshot.sequence // 2:<8d} {snapshot.target_speed:5.1f} m/s  {'D' if snapshot.is_forward else 'R'}"
+            f"  {'BRAKE' if snapshot.brake else '     '}  buttons {snapshot.button_mask:#06x}"
+            f"  hat ({snapshot.hat[0]:+d},{snapshot.hat[1]:+d})  axes {axes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a telemetry bus, or serve it as the browser overlay")
+    parser.add_argument('path', nargs='?', default=BUS_PATH, help=f"bus file (default: {BUS_PATH})")
+    parser.add_argument('--interval', type=float, default=0.1, help="seconds between checks when watching")
+    parser.add_argument('--overlay', action='store_true',
+                        help="serve the speedometer overlay from the bus instead of printing it")
+    args = parser.parse_args()
+
+    reader = TelemetryReader(args.path)
+    print(f"{reader.info.name}: {reader.info.num_axes} axes, {reader.info.num_buttons} buttons, "
+          f"{reader.info.num_hats} hats")
+    if args.overlay:
+        from overlay_server import OverlayServer
+        from speed_physics import SpeedModel, MAX_SPEED
+        speed_model = SpeedModel(MAX_SPEED)
+
+        def read_state(now):
+            snapshot = reader.read()
+            if snapshot is None:
+                return {'speed': 0.0, 'max_speed': speed_model.max_speed}
+            speed_model.target = snapshot.target_speed
+            return {'speed': round(speed_model.advance(now), 1), 'gear': 'D' if snapshot.is_forward else 'R',
+                    'brake': snapshot.brake, 'max_speed': speed_model.max_speed}
+
+        OverlayServer(read_state).run()
+    else:
+        try:
+            sequence = None
+            while True:
+                snapshot = reader.read()
+                if snapshot is not None and snapshot.sequence != sequence:
+                    sequence = snapshot.sequence
+                    print(_format_snapshot(snapshot))
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print(f"{reader.retries} reads overlapped an update and were retried")
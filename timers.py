@@ -0,0 +1,115 @@
+"""
+Deadline timers for the input thread.
+
+Timed key taps, repeats and cooldowns used to hang off their own little mechanisms (a single
+pending camera release, a press and release in the same frame for taps). TimerQueue runs them
+all from one heap keyed on deadlines. Like PwmScheduler and AxisFilter it never sleeps:
+next_deadline() tells the input loop how long it may block and service(now) fires whatever is
+due, on the input thread, between joystick events. Deadlines are on the queue's clock,
+time.monotonic unless the benchmark drives it from a trace.
+
+A Timer is created once per job and re-armed with start(), so a tap costs a heap entry, not a
+new closure. Re-arming or cancelling leaves the old heap entry behind, it is recognised as
+stale by its generation number and skipped when it comes up.
+"""
+import heapq
+import itertools
+import time
+
+
+class Timer:
+    """ Calls `callback(*args)` from TimerQueue.service() once its deadline has passed. With an
+        `interval` it re-arms itself for every interval after that until cancelled. """
+    __slots__ = ('queue', 'callback', 'args', 'interval', 'deadline', 'generation')
+
+    def __init__(self, queue, callback, args, interval=0.0):
+        self.queue = queue
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.deadline = None  # Clock time it fires next, None while not armed
+        self.generation = 0
+
+    @property
+    def active(self):
+        return self.deadline is not None
+
+    def start(self, deadline):
+        """ Arms the timer for `deadline`, replacing any deadline it already had. """
+        self.generation += 1
+        self.deadline = deadline
+        queue = self.queue
+        heapq.heappush(queue._heap, (deadline, next(queue._order), self.generation, self))
+
+    def cancel(self):
+        if self.deadline is not None:
+            self.generation += 1
+            self.deadline = None
+
+
+class TimerQueue:
+    """ The pending timers of one thread, ordered by deadline. """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock                 # What deadlines are measured against
+        self._heap = []                    # (deadline, insertion order, generation, timer)
+        self._order = itertools.count()    # Breaks deadline ties first-come first-served
+        self._timers = []
+        self.fired = 0
+        self.max_late = 0.0                # Seconds the latest timer fired after its deadline
+
+    def timer(self, callback, *args, interval=0.0):
+        """ A new, unarmed Timer on this queue. """
+        timer = Timer(self, callback, args, interval)
+        self._timers.append(timer)
+        return timer
+
+    def next_deadline(self):
+        """ Clock time the next timer is due, or None. """
+        heap = self._heap
+        while heap and heap[0][2] != heap[0][3].generation:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def service(self, now):
+        """ Fires every timer that is due at `now`. """
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, _, generation, timer = heapq.heappop(heap)
+            if generation != timer.generation:
+                continue
+            late = now - deadline
+            if late > self.max_late:
+                self.max_late = late
+            self.fired += 1
+            if timer.interval:
+                # Keep the rhythm, but don't fire a burst to make up for a stall
+                next_deadline = deadline + timer.interval
+                timer.start(next_deadline if next_deadline > now else now + timer.interval)
+            else:
+                timer.deadline = None
+            timer.callback(*timer.args)
+
+    def cancel_all(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._heap.clear()
+
+    def report(self):
+        return f"  {self.fired} timers fired, the latest {self.max_late * 1000:.2f} ms after its deadline"
+
+
+class Cooldown:
+    """ Lets an action through at most once every `seconds`. """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.ready_at = 0.0
+
+    def ready(self, now):
+        """ True, and starts the cooldown, if the last accepted action was long enough ago. """
+        if now < self.ready_at:
+            return False
+        self.ready_at = now + self.seconds
+        return True
+
+    def reset(self):
+        self.ready_at = 0.0